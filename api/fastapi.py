@@ -1,13 +1,324 @@
-from fastapi import FastAPI, File, UploadFile
-from scripts.infer import infer
-import os
+from fastapi import Body, FastAPI, File, Header, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List
+from urllib.parse import quote
+from scripts.infer import _get_model
+from scripts.tiled_infer import infer_tiled
+from utils.admission import AdmissionRejected, get_admission
+from utils.candidates import detect_candidates, plot_at, to_detections
+from utils.derivatives import VARIANTS, derivative_path, encode_derivatives, media_type, model_version
+from utils.image_store import get_image_store
+from utils.job_queue import JobQueue
+from utils.ingest import SERVING_IMGSZ, decode_scaled, prepare as prepare_upload, to_bgr
+from utils.model_registry import ModelWarming, get_router, resolve_weights, version_of
+from utils.metrics import (CACHE_LOOKUPS, CONTENT_TYPE, HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS,
+                           instrument_model, render as render_metrics, take_yolo_seconds)
+from utils.profiling import maybe_profile
+from utils.request_log import RequestTrace
+from utils.serialization import JSON, MSGPACK, RAW_IMAGE_TYPES, encode, msgpack, negotiate, orjson
+import math
+import re
+import time
+import uuid
 
-app = FastAPI()
+# orjson serializes the default JSON responses when installed
+app = FastAPI(default_response_class=ORJSONResponse if orjson is not None else JSONResponse)
+image_store = get_image_store()
+job_queue = JobQueue()
+admission = get_admission()
+router = get_router()  # registry versions, hot-swapped as routes change
+instrument_model(_get_model())
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    start = time.perf_counter()
+    status = 500
+    with HTTP_IN_FLIGHT.track():
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # the route template keeps label cardinality bounded (no hashes in paths)
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.labels(route=path, method=request.method, status=status).inc()
+            HTTP_LATENCY.labels(route=path).observe(time.perf_counter() - start)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+def _record_yolo(trace, infer_start):
+    # infer = YOLO forward + detection parsing and the parts-cost lookup
+    yolo = take_yolo_seconds()
+    trace.record("yolo", yolo)
+    trace.record("cost", max(0.0, time.perf_counter() - infer_start - yolo))
+
+def _infer(ingested, tiled, key=None):
+    """(detections, cost, model label): the routed registry version, else the default model.
+
+    Every version is priced by ``to_detections``, so A/B arms and the default
+    model share one severity/cost rule. Boxes come back in original pixels.
+    """
+    # the version is held until the call returns, so a swap only takes effect between requests
+    with router.acquire(key=key) as (label, routed):
+        model = routed or _get_model()
+        if tiled:
+            # tiled requests are decoded at full size, so boxes are already original pixels
+            detections, cost = infer_tiled(to_bgr(ingested.image), model=model)
+        else:
+            result = model.predict(ingested.image, save=False, verbose=False)[0].cpu()
+            detections = to_detections(result, ingested.scale)
+            cost = sum(d["cost"] for d in detections)
+        return detections, cost, label or model_version(model)
+
+def _predict(trace, data, filename, tiled, x_profile, headers, key=None):
+    """Shared body of /predict and /predict/raw: store, decode, infer; returns the payload.
+
+    Boxes are in the upload's own pixels (after EXIF orientation) whatever
+    resolution the model saw; ``scale`` only reports that downscale. Overlay
+    URLs name the model that answered, so they show these detections.
+    """
+    # nothing below awaits, so the profile sees only this request
+    profile = maybe_profile(trace.request_id, trace.source,
+                            forced=x_profile not in (None, "", "0", "false"))
+    try:
+        with trace.stage("decode"):
+            image_hash = image_store.put(data, claim_id=trace.request_id, filename=filename)
+            # DCT-scaled decode near the model input size, handed to the model as is.
+            # Tiling needs the full resolution, so tiled requests keep the original.
+            ingested = prepare_upload(data, imgsz=None if tiled else SERVING_IMGSZ)
+
+        take_yolo_seconds()
+        infer_start = time.perf_counter()
+        with trace.stage("infer"):
+            # tiles only when the image is large enough (AUTODAMAGE_TILE_MIN_PIXELS)
+            detections, cost, label = _infer(ingested, tiled, key)
+        _record_yolo(trace, infer_start)
+        trace.model = label
+    finally:
+        if profile is not None and profile.stop() is not None:
+            headers["X-Profile-Id"] = trace.request_id
+    trace.finish(detections=len(detections), cost=cost)
+    return {"request_id": trace.request_id, "detections": detections, "estimated_cost": cost,
+            "image_hash": image_hash, "image_size": ingested.orig_size, "scale": ingested.scale,
+            "overlays": {v: f"/derivatives/{image_hash}/{v}?model={quote(label)}" for v in VARIANTS}}
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    headers = {}
+    if exc.retry_after:
+        headers["Retry-After"] = str(min(3600, math.ceil(exc.retry_after)))
+    return JSONResponse({"detail": exc.reason, "lane": exc.lane}, status_code=exc.status,
+                        headers=headers)
+
+def _admit(request, x_api_key, x_priority):
+    """Rate limit by X-API-Key, then hold a model slot; interactive lanes are served first."""
+    return admission.admit(x_api_key, request.client.host if request.client else None, x_priority)
 
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
-    with open("temp.jpg", "wb") as f:
-        f.write(await file.read())
-    
-    detections, cost = infer("temp.jpg")
-    return {"detections": detections, "estimated_cost": cost}
\ No newline at end of file
+async def predict(request: Request, response: Response, file: UploadFile = File(...),
+                  tiled: bool = False, x_profile: str = Header(None), x_api_key: str = Header(None),
+                  x_priority: str = Header(None)):
+    async with _admit(request, x_api_key, x_priority):
+        with RequestTrace("api/predict", model=model_version(_get_model())) as trace:
+            with trace.stage("decode"):
+                data = await file.read()
+            # off the event loop, so requests keep being admitted and queued meanwhile
+            return await run_in_threadpool(_predict, trace, data, file.filename, tiled, x_profile,
+                                           response.headers, x_api_key)
+
+@app.post("/predict/raw")
+async def predict_raw(request: Request, tiled: bool = False, columnar: bool = None,
+                      x_profile: str = Header(None), x_filename: str = Header(None),
+                      x_api_key: str = Header(None), x_priority: str = Header(None)):
+    """/predict without multipart: the body is the image itself (``Content-Type: image/jpeg``).
+
+    ``Accept: application/msgpack`` returns MessagePack with detections as parallel
+    arrays (see ``utils.serialization.to_columnar``); ``?columnar=true`` does the same
+    for JSON.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in RAW_IMAGE_TYPES:
+        raise HTTPException(status_code=415, detail=f"expected an image body, got {content_type!r}")
+    media = negotiate(request.headers.get("accept"))
+    if media is None:
+        raise HTTPException(status_code=406, detail=f"supported: {JSON}"
+                            + (f", {MSGPACK}" if msgpack is not None else ""))
+    # read before admission: a slow upload must not hold a model slot
+    read_start = time.perf_counter()
+    data = await request.body()
+    read_seconds = time.perf_counter() - read_start
+    if not data:
+        raise HTTPException(status_code=400, detail="empty body")
+    headers = {}
+    async with _admit(request, x_api_key, x_priority):
+        model = _get_model()
+        with RequestTrace("api/predict_raw", model=model_version(model)) as trace:
+            trace.record("decode", read_seconds)
+            payload = await run_in_threadpool(_predict, trace, data, x_filename, tiled, x_profile,
+                                              headers, x_api_key)
+            with trace.stage("serialize"):
+                body = encode(payload, media, columnar,
+                              names=[model.names[i] for i in sorted(model.names)])
+    return Response(body, media_type=media, headers=headers)
+
+def _enqueue_job(job_id, uploads, conf):
+    """Hash and store the uploads, then queue the job; blocking, so run off the event loop."""
+    images = [(image_store.put(data, claim_id=job_id, filename=filename), filename)
+              for data, filename in uploads]
+    # workers read the images from disk, so they must be written before the job is visible
+    image_store.flush()
+    job_queue.submit(images, conf=conf, job_id=job_id)
+    return len(images)
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: Request, files: List[UploadFile] = File(...), conf: float = 0.25,
+                     x_api_key: str = Header(None)):
+    """Queue a batch of images for the job workers (scripts/job_worker.py); returns at once."""
+    # job workers are separate processes, so a job only counts against the rate limit
+    admission.limit(x_api_key, request.client.host if request.client else None, "bulk")
+    job_id = uuid.uuid4().hex
+    uploads = [(await file.read(), file.filename) for file in files]
+    count = await run_in_threadpool(_enqueue_job, job_id, uploads, conf)
+    return {"job_id": job_id, "status": "queued", "images": count, "url": f"/jobs/{job_id}"}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job")
+    return job
+
+def _render_derivative(image_hash, variant, conf, model, version):
+    source = image_store.find(image_hash)
+    if source is None:
+        image_store.flush()  # the upload may still be waiting in the writer queue
+        source = image_store.find(image_hash)
+    if source is None:
+        raise HTTPException(status_code=404, detail="unknown image")
+    data = source.read_bytes()
+    with RequestTrace("api/derivatives", model=version) as trace:
+        with trace.stage("decode"):
+            ingested = prepare_upload(data)
+        take_yolo_seconds()
+        with trace.stage("infer"):
+            candidates = detect_candidates(ingested.image, floor=conf, model=model,
+                                           scale=ingested.scale)
+        trace.record("yolo", take_yolo_seconds())
+        with trace.stage("overlay"):
+            # drawn on the full-resolution original; thumb and preview are resized from it
+            full, _ = decode_scaled(data, imgsz=None)
+            overlay = plot_at(to_bgr(full), candidates.boxes, candidates.names, conf)
+            path = encode_derivatives(overlay, image_hash, version, conf)[variant]
+        trace.finish(detections=len(candidates.detections))
+    return path
+
+def _check_label(label):
+    """404 unless ``label`` names the default model or a registry version; it becomes a path."""
+    if label and label != model_version(_get_model()) and version_of(label, router.name) is None:
+        raise HTTPException(status_code=404, detail="unknown model")
+
+@contextmanager
+def _overlay_model(image_hash, label):
+    """(label, model) for an overlay: the one named by ``label``, else routed by image."""
+    default = model_version(_get_model())
+    if label == default:
+        yield default, _get_model()
+        return
+    # keyed by image, so one image's overlays always come from the same routed version
+    version = version_of(label, router.name)
+    with ExitStack() as held:
+        try:
+            routed_label, routed = held.enter_context(router.acquire(key=image_hash, version=version))
+        except ModelWarming:
+            # loading on the router's thread; an overlay from other weights would not match
+            raise HTTPException(status_code=503, detail="model warming up",
+                                headers={"Retry-After": "5"})
+        except KeyError:
+            raise HTTPException(status_code=404, detail="unknown model")
+        if label and routed_label != label:
+            raise HTTPException(status_code=404, detail="unknown model")
+        yield routed_label or default, routed or _get_model()
+
+@app.get("/derivatives/{image_hash}/{variant}")
+async def derivative(request: Request, image_hash: str, variant: str, conf: float = 0.25,
+                     model: str = None, x_api_key: str = Header(None),
+                     x_priority: str = Header(None)):
+    """Annotated overlay of a stored image; rendered on first request, then served from cache.
+
+    ``model`` is the label /predict answered with (its overlay URLs carry it),
+    so the overlay shows the same detections; without it the image's routed
+    version draws.
+    """
+    if variant not in VARIANTS or not SHA256_RE.match(image_hash):
+        raise HTTPException(status_code=404, detail="unknown derivative")
+    _check_label(model)
+    if model:
+        path = derivative_path(image_hash, model, conf, variant)
+        if path.exists():  # served without touching the model
+            CACHE_LOOKUPS.labels(cache="derivatives", result="hit").inc()
+            return FileResponse(path, media_type=media_type(variant),
+                                headers={"Cache-Control": "public, max-age=31536000, immutable"})
+    with _overlay_model(image_hash, model) as (version, weights):
+        path = derivative_path(image_hash, version, conf, variant)
+        CACHE_LOOKUPS.labels(cache="derivatives", result="hit" if path.exists() else "miss").inc()
+        if not path.exists():
+            # a miss runs the model, so it queues for a slot like /predict
+            async with _admit(request, x_api_key, x_priority):
+                path = await run_in_threadpool(_render_derivative, image_hash, variant, conf, weights,
+                                               version)
+    # content is keyed by image, model and threshold, so it never changes
+    return FileResponse(path, media_type=media_type(variant),
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/models")
+def list_models():
+    """Registered versions, the current traffic split and what this process has loaded."""
+    return {"name": router.name, "models": router.registry.list(router.name), **router.status()}
+
+def _require_admin(x_api_key):
+    """Registry changes need a key marked ``"admin": true`` in api_keys.json."""
+    if not admission.limiter.is_admin(x_api_key):
+        raise HTTPException(status_code=403 if x_api_key else 401, detail="admin key required")
+
+@app.post("/models", status_code=201)
+def register_model(path: str = Body(..., embed=True), metrics: dict = Body(None, embed=True),
+                   x_api_key: str = Header(None)):
+    """Register a weights file as the next version; admin key only.
+
+    ``path`` must be a ``.pt`` file under runs/ or models/, e.g. ``runs/detect/train4/weights/best.pt``.
+    """
+    _require_admin(x_api_key)
+    try:
+        weights = resolve_weights(path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    version = router.registry.register(weights, router.name, metrics)
+    return router.registry.get(version, router.name)
+
+@app.put("/models/routes")
+def set_model_routes(weights: Dict[str, float] = Body(...), x_api_key: str = Header(None)):
+    """Replace the traffic split, e.g. ``{"3": 90, "4": 10}``; ``{}`` serves the default model.
+
+    New versions load and warm in the background and take traffic once ready;
+    every other serving process follows within AUTODAMAGE_ROUTES_POLL seconds.
+    Admin key only.
+    """
+    _require_admin(x_api_key)
+    try:
+        routes = router.registry.set_routes({k.lstrip("v"): w for k, w in weights.items()}, router.name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    router.wake()  # loads on the router's thread
+    return {"routes": {f"v{v}": w for v, w in sorted(routes.items())}, "status": "warming"}
@@ -1,18 +1,27 @@
 import os
+import re
 import sys
+import time
+from collections import deque
 from pathlib import Path
 import streamlit as st
 import pandas as pd
-import json
-import sqlite3
 import plotly.express as px
 
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.feedback_store import connect_reader
+from utils.analytics import latency_histogram, series as analytics_series, summary as analytics_summary
+from utils.csv_tail import CsvTail
+from utils.log_tail import LEVELS as LOG_LEVELS, follow, make_filter, tail
+from utils.profiling import list_profiles, profile_files
+from utils.request_log import log_files
+
 # Add project root
 PROJECT_ROOT = Path(__file__).parent.parent
 LOGS_DIR = PROJECT_ROOT / "logs"
 DB_PATH = PROJECT_ROOT / "database" / "feedback.db"
-ANALYTICS_FILE = LOGS_DIR / "analytics.json"
-REQUESTS_FILE = LOGS_DIR / "requests.csv"
+CACHE_TTL = 10  # seconds between re-reads of the log and the feedback table
+LOG_FOLLOW_INTERVAL = 2  # seconds between polls of error.log in live-follow mode
 
 # Page configuration
 st.set_page_config(
@@ -23,7 +32,7 @@ st.set_page_config(
 
 # Sidebar navigation
 st.sidebar.title("Admin Dashboard")
-pages = ["Overview", "Request Logs", "Request Analytics", "Feedback Analytics", "System Logs"]
+pages = ["Overview", "Request Logs", "Request Analytics", "Feedback Analytics", "System Logs", "Profiles"]
 page = st.sidebar.radio("Go to", pages)
 
 # Date range filter
@@ -40,38 +49,62 @@ if date_range != "All Time":
         start_date = today - pd.Timedelta(days=7)
     else:
         start_date = today - pd.Timedelta(days=30)
+    # minute resolution keeps cache keys stable across reruns
+    start_date = start_date.floor('min')
 else:
     start_date = None
 
 # Data loading functions
 def load_analytics():
-    if ANALYTICS_FILE.exists():
-        try:
-            return json.loads(ANALYTICS_FILE.read_text())
-        except json.JSONDecodeError:
-            st.warning("analytics.json is invalid.")
-    return {}
+    # pre-aggregated rollups; cost does not grow with log volume
+    return analytics_summary(since=start_date)
+
+@st.cache_resource
+def _requests_tail():
+    # one tail per logging process's file, shared by every session of this server
+    return {"tails": {}, "refreshed": 0.0}
 
 def load_requests():
-    if REQUESTS_FILE.exists():
-        df = pd.read_csv(REQUESTS_FILE)
-        if start_date is not None:
-            df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-            df = df[df['timestamp'] >= start_date]
-        return df
-    else:
-        st.warning("requests.csv not found.")
+    files = log_files("requests", LOGS_DIR)
+    if not files:
+        st.warning("No requests log found.")
+        return pd.DataFrame()
+    state = _requests_tail()
+    now = pd.Timestamp.now().timestamp()
+    if now - state["refreshed"] >= CACHE_TTL:
+        current = {str(p) for p in files}
+        for gone in set(state["tails"]) - current:  # pruned
+            del state["tails"][gone]
+        for path in current:
+            # parses only the bytes appended since the last read
+            state["tails"].setdefault(path, CsvTail(path)).refresh()
+        state["refreshed"] = now
+    frames = [t.since(start_date) for t in state["tails"].values()]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
         return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    return df.sort_values("timestamp", kind="stable", ignore_index=True) if "timestamp" in df else df
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _query_feedback(since):
+    conn = connect_reader(DB_PATH)
+    try:
+        if since is None:
+            df = pd.read_sql_query("SELECT * FROM feedback ORDER BY id DESC", conn)
+        else:
+            # served by idx_feedback_timestamp
+            df = pd.read_sql_query("SELECT * FROM feedback WHERE timestamp >= ? ORDER BY id DESC",
+                                   conn, params=(since,))
+    finally:
+        conn.close()
+    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    return df
 
 def load_feedback():
     if DB_PATH.exists():
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query("SELECT * FROM feedback ORDER BY id DESC", conn)
-        conn.close()
-        if start_date is not None:
-            df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-            df = df[df['timestamp'] >= start_date]
-        return df
+        since = start_date.strftime("%Y-%m-%d %H:%M:%S") if start_date is not None else None
+        return _query_feedback(since)
     else:
         st.warning("Feedback database not found.")
         return pd.DataFrame()
@@ -94,10 +127,11 @@ def show_overview():
     col3.metric("Avg. Response Time", f"{avg_time:.2f}s")
 
     st.subheader("Requests Over Time")
-    if not requests_df.empty and 'timestamp' in requests_df:
-        line = requests_df.copy()
-        line['hour'] = pd.to_datetime(line['timestamp']).dt.floor('h')
-        hourly = line.groupby('hour').size().reset_index(name='count')
+    rows = analytics_series("hour", since=start_date)
+    if rows:
+        hourly = pd.DataFrame(rows, columns=['hour', 'source', 'count', 'successes', 'errors', 'avg_latency'])
+        hourly = hourly.groupby('hour', as_index=False)['count'].sum()
+        hourly['hour'] = pd.to_datetime(hourly['hour'] + ":00")
         fig = px.line(hourly, x='hour', y='count', title='Requests / Hour')
         st.plotly_chart(fig, use_container_width=True)
 
@@ -113,8 +147,11 @@ def show_request_logs():
 def show_request_analytics():
     st.title("🔎 Request Analytics")
     st.subheader("Response Time Distribution")
-    if 'response_time' in requests_df:
-        fig = px.histogram(requests_df, x='response_time', nbins=20, title='Response Time Distribution')
+    hist = latency_histogram(since=start_date)
+    if hist:
+        df = pd.DataFrame(hist, columns=['le', 'count'])
+        df['bucket'] = df['le'].map(lambda le: f"≤ {le:g}s" if le != float('inf') else "> 30s")
+        fig = px.bar(df, x='bucket', y='count', title='Response Time Distribution')
         st.plotly_chart(fig, use_container_width=True)
     st.subheader("Top Models")
     if 'model' in requests_df:
@@ -142,15 +179,74 @@ def show_feedback_analytics():
         st.info("No feedback data available.")
 
 
+def _render_log(lines, height=300):
+    st.text_area("Recent Errors", "\n".join(lines), height=height)
+
+
+def _follow_log(error_file, n, levels, pattern):
+    # keeps the file offset and the visible window in session state;
+    # each tick reads only the bytes appended since the last one
+    state = st.session_state.setdefault("log_follow", {})
+    key = (str(error_file), n, tuple(levels), pattern)
+    keep = make_filter(levels, pattern)
+    if state.get("key") != key:
+        lines, offset = tail(error_file, n, keep)
+        state.update(key=key, lines=deque(lines, maxlen=n), offset=offset)
+    else:
+        lines, state["offset"] = follow(error_file, state["offset"], keep)
+        state["lines"].extend(lines)
+    _render_log(state["lines"])
+
+
 def show_system_logs():
     st.title("🛠 System Logs")
-    error_file = LOGS_DIR / "error.log"
-    if error_file.exists():
-        with open(error_file) as f:
-            lines = f.readlines()[-100:]
-        st.text_area("Recent Errors", "".join(lines), height=300)
+    files = log_files("error", LOGS_DIR)
+    if not files:
+        st.info("No error log found.")
+        return
+    # one file per process (Streamlit, each API worker, job workers), most recently written first
+    error_file = st.selectbox("Process log", files, format_func=lambda p: p.name)
+
+    c1, c2, c3 = st.columns([1, 2, 2])
+    n = c1.number_input("Lines", min_value=10, max_value=5000, value=100, step=50)
+    levels = c2.multiselect("Levels", LOG_LEVELS, default=[])
+    pattern = c3.text_input("Regex filter", "")
+    live = st.toggle("Live follow", value=False) if hasattr(st, "toggle") else st.checkbox("Live follow")
+    try:
+        keep = make_filter(levels, pattern)
+    except re.error as e:
+        st.error(f"Invalid regex: {e}")
+        return
+
+    if not live:
+        st.session_state.pop("log_follow", None)
+        lines, _ = tail(error_file, int(n), keep)
+        _render_log(lines)
+    elif hasattr(st, "fragment"):
+        st.fragment(run_every=LOG_FOLLOW_INTERVAL)(_follow_log)(error_file, int(n), levels, pattern)
     else:
-        st.info("error.log not found.")
+        _follow_log(error_file, int(n), levels, pattern)
+        time.sleep(LOG_FOLLOW_INTERVAL)
+        st.rerun()
+
+def show_profiles():
+    st.title("🔬 Request Profiles")
+    profiles = list_profiles()
+    if not profiles:
+        st.info("No profiles captured yet. Send `X-Profile: 1` to the API, open the UI with "
+                "`?debug=1`, or set PROFILE_SAMPLE_RATE.")
+        return
+    st.dataframe(pd.DataFrame(profiles), hide_index=True, use_container_width=True)
+    request_id = st.selectbox("Request", [p["request_id"] for p in profiles])
+    files = profile_files(request_id)
+    if ".html" in files:
+        import streamlit.components.v1 as components
+        components.html(files[".html"].read_text(encoding="utf-8"), height=700, scrolling=True)
+    elif ".txt" in files:
+        st.code(files[".txt"].read_text(encoding="utf-8"), language="text")
+    for suffix, path in sorted(files.items()):
+        st.download_button(f"Download {path.name}", path.read_bytes(), file_name=path.name,
+                           key=f"dl{suffix}")
 
 # Display based on navigation
 if page == "Overview":
@@ -163,3 +259,5 @@ elif page == "Feedback Analytics":
     show_feedback_analytics()
 elif page == "System Logs":
     show_system_logs()
+elif page == "Profiles":
+    show_profiles()
@@ -3,35 +3,30 @@ import os
 import uuid
 import csv
 import time
-import sqlite3
-
-# ── set up feedback database ─────────────────────────────────────────
-DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
-                                       "..", "database", "feedback.db"))
-os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-
-_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-_cursor = _conn.cursor()
-_cursor.execute("""
-CREATE TABLE IF NOT EXISTS feedback (
-    id        INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp TEXT    NOT NULL,
-    rating    TEXT    NOT NULL
-);
-""")
-_conn.commit()
+import subprocess
+from contextlib import ExitStack, contextmanager, nullcontext
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
-from scripts.infer import _get_model, infer, _get_llm
+from scripts.infer import _get_llm, _get_model
 from langchain.prompts import PromptTemplate
-import cv2
 from streamlit_extras.switch_page_button import switch_page
 import pandas as pd
 from PIL import Image
 import io
-from scripts.infer import infer, _get_llm, _get_model   # ← add _get_model
+from scripts.finetune_hitl import (FINETUNE_LOG, collect_new_samples, load_state as load_finetune_state,
+                                   save_label)
+from utils.feedback_store import get_store as get_feedback_store
+from utils.image_store import content_hash, get_image_store
+from utils.log_tail import tail
+from utils.ingest import decode_scaled, prepare as prepare_upload, to_bgr
+from utils.model_registry import ModelWarming, get_router
+from utils.candidates import apply_threshold, detect_candidates, plot_at
+from utils.derivatives import cached_derivatives, encode_derivatives, model_version
+from utils.profiling import maybe_profile
+from utils.request_log import RequestTrace
+from utils.video import VIDEO_TYPES, analyze_video
 
 # Page configuration
 st.set_page_config(
@@ -140,23 +135,135 @@ if 'feedback_submitted' not in st.session_state:
     st.session_state.feedback_submitted = False
 if 'pending_feedback' not in st.session_state:
     st.session_state.pending_feedback = []
+MAX_SESSION_ANALYSES = 8  # analyses kept per session for rehydration on rerun
 
 # Define storage paths
-processed_images_dir = "/Users/rajeevbarnwal/Desktop/Codes/AutoDamageEstimator/database/processed_images"
 feedback_file = "/Users/rajeevbarnwal/Desktop/Codes/AutoDamageEstimator/database/feedback/ratings.csv"
 os.makedirs(os.path.dirname(feedback_file), exist_ok=True)
-os.makedirs(processed_images_dir, exist_ok=True)
+image_store = get_image_store()
 
 def save_feedback(rating: str):
-    ts = time.strftime("%F %T")
-    _cursor.execute(
-        "INSERT INTO feedback (timestamp, rating) VALUES (?, ?)",
-        (ts, rating),
-    )
-    _conn.commit()
+    # queued; the store's writer thread batches the commit off the click path
+    get_feedback_store().submit(rating, request_id=st.session_state.get("request_id"))
     st.session_state.feedback_submitted = True
     st.session_state.feedback = rating
 
+@contextmanager
+def serving_model(trace=None):
+    """(version, model) for this session: the "Select Model" pick, else the routed version.
+
+    ``model`` is None when nothing is routed, meaning the default model (``scripts.infer._get_model``).
+    Held for one analysis, so a hot swap never changes weights halfway through.
+    A pick that is still loading is said so, and the routed version answers.
+    """
+    # sticky per session, so A/B routing shows one user one version
+    key = st.session_state.setdefault("routing_key", uuid.uuid4().hex)
+    pinned = st.session_state.get("pinned_model")
+    router = get_router()
+    with ExitStack() as held:
+        try:
+            version, model = held.enter_context(router.acquire(key=key, version=pinned))
+        except ModelWarming:
+            st.info(f"v{pinned} is still loading; this analysis uses the routed model. "
+                    "Submit again in a few seconds to use it.")
+            version, model = held.enter_context(router.acquire(key=key))
+        version = version or model_version(_get_model())
+        if trace is not None:
+            trace.model = version
+        yield version, model
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def load_candidates(image_hash, version, _ingested, _model=None):
+    # one model pass per image and weights; threshold changes only re-filter.
+    # Holds detection dicts and box arrays only, never the image.
+    return detect_candidates(_ingested.image, model=_model, scale=_ingested.scale)
+
+def analyze(image_hash, conf, trace=None, data=None, ingested=None):
+    """Detections, cost and overlay files at ``conf``, from the cached candidate set.
+
+    ``data``/``ingested`` are the upload and its model-sized decode; on reruns
+    both come from the image store, and only when the candidates or overlay
+    are not cached.
+    """
+    stage = trace.stage if trace is not None else (lambda name: nullcontext())
+
+    def upload():
+        nonlocal data
+        if data is None:
+            path = image_store.find(image_hash)
+            if path is None:  # the write may still be queued
+                image_store.flush()
+                path = image_store.find(image_hash)
+            if path is None:  # the writer dropped it (see error.log)
+                raise FileNotFoundError(f"image {image_hash} is not in the image store")
+            data = path.read_bytes()
+        return data
+
+    def decoded():
+        nonlocal ingested
+        if ingested is None:
+            ingested = prepare_upload(upload())
+        return ingested
+
+    with stage("infer"), serving_model(trace) as (version, model):
+        candidates = load_candidates(image_hash, version, decoded(), model)
+        detections, cost = apply_threshold(candidates.detections, conf)
+    with stage("overlay"):
+        overlay = cached_derivatives(image_hash, version, conf)
+        if overlay is None:
+            # drawn on the full-resolution upload, so the "full" variant is full size
+            full, _ = decode_scaled(upload(), imgsz=None)
+            overlay = encode_derivatives(plot_at(to_bgr(full), candidates.boxes, candidates.names, conf),
+                                         image_hash, version, conf)
+    return detections, cost, overlay
+
+def analyze_walkaround(name, data, conf, trace):
+    """One result card per keyframe that best shows at least one merged damage."""
+    video_hash = content_hash(data)
+    temp_path = os.path.join(os.path.dirname(__file__), f"temp_{uuid.uuid4()}{os.path.splitext(name)[1]}")
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    try:
+        start_time = time.time()
+        with trace.stage("infer"), serving_model(trace) as (version, model):
+            walk = analyze_video(temp_path, model or _get_model(), conf=conf)
+        total_time = time.time() - start_time
+    finally:
+        os.remove(temp_path)
+    results = []
+    for k, (_, seconds, yolo_result) in enumerate(walk["keyframes"]):
+        detections = [d for d in walk["detections"] if d["best_keyframe"] == k]
+        if not detections:
+            continue
+        frame_hash = f"{video_hash}-k{k:02d}"
+        with trace.stage("overlay"):
+            overlay = (cached_derivatives(frame_hash, version, conf)
+                       or encode_derivatives(yolo_result.plot(), frame_hash, version, conf))
+        results.append({"file": f"{name} @ {seconds:.1f}s", "detections": detections,
+                        "cost": sum(d["cost"] for d in detections),
+                        "time": total_time / len(walk["keyframes"]),
+                        "image_hash": frame_hash, "overlay": overlay, "video": True})
+    stats = walk["stats"]
+    st.caption(f"🎞 {stats['frames_scored']} frames scored, {stats['keyframes']} keyframes "
+               f"(selection {stats['select_ms']:.0f} ms, YOLO {stats['infer_ms']:.0f} ms)")
+    return results
+
+def summarize(results):
+    """(parts identified, parts to repair, parts to replace) over ``results``."""
+    total_parts = sum(len(r["detections"]) for r in results)
+    repair_parts = sum(1 for r in results for d in r["detections"] if d["severity"] == "moderate")
+    return total_parts, repair_parts, total_parts - repair_parts
+
+def llm_summary(results, total_cost):
+    """Human-like write-up of ``results`` by the LLM."""
+    _, repair_parts, replace_parts = summarize(results)
+    prompt = PromptTemplate(
+        input_variables=["damages", "repair_parts", "replace_parts", "total_cost"],
+        template="Greetings! We're so sorry to hear your car has been in an accident—let’s get it back on the road.\nAnswer: The vehicle has the following key damages: {damages}. It requires repair for {repair_parts} parts and replacement of {replace_parts} parts. The tentative cost to repair the vehicle is ₹{total_cost}. Offer a warm, empathetic tone, acknowledge the user's likely frustration, and suggest next steps like contacting a mechanic or scheduling a detailed inspection."
+    )
+    damages_list = ", ".join(f"{d['class']} ({d['severity']})" for r in results for d in r["detections"])
+    return _get_llm().invoke(prompt.format(damages=damages_list, repair_parts=repair_parts, replace_parts=replace_parts, total_cost=total_cost)).strip()
+
 # Sidebar
 st.sidebar.title("AutoDamageEstimator")
 logo_path = "/Users/rajeevbarnwal/Desktop/Codes/AutoDamageEstimator/app/static/Auto_Damage.png"
@@ -170,14 +277,50 @@ else:
     st.markdown('<body>', unsafe_allow_html=True)
 
 st.sidebar.header("Settings")
-model_options = ["Default (YOLOv8)", "Custom Model"]
-selected_model = st.sidebar.selectbox("Select Model", model_options, index=0)
+# registered versions (scripts/registry.py); the default follows the registry's routes
+registered_models = {m["version"]: m for m in get_router().registry.list()}
+
+def _model_label(version):
+    if version is None:
+        return "Default (routed)"
+    m = registered_models[version]
+    score = (m["metrics"] or {}).get("mAP50-95")
+    return (f"v{version} · {os.path.basename(os.path.dirname(os.path.dirname(m['path'])))}"
+            + (f" · mAP50-95 {score:.3f}" if score is not None else ""))
+
+selected_model = st.sidebar.selectbox("Select Model", [None] + list(registered_models),
+                                      format_func=_model_label, key="pinned_model")
 confidence_threshold = st.sidebar.slider("Confidence Threshold", 0.0, 1.0, 0.25, 0.05)
 advanced_options = st.sidebar.expander("Advanced Options", expanded=False)
 with advanced_options:
     enable_learning = st.toggle("Enable Automatic Learning", value=False)
     if enable_learning:
-        st.warning("Automatic Learning is not implemented yet. Contact admin for setup.")
+        pending = len(collect_new_samples())
+        last_run = load_finetune_state()["last_run"]
+        st.caption(f"{pending} newly labelled image(s) waiting for fine-tuning.")
+        if last_run:
+            verdict = "promoted" if last_run["promoted"] else "kept previous weights"
+            st.caption(f"Last run {last_run['finished']}: {verdict} "
+                       f"(mAP50-95 {last_run['baseline']['mAP50-95']:.3f} → "
+                       f"{last_run['candidate']['mAP50-95']:.3f})")
+        proc = st.session_state.get("finetune_proc")
+        if proc is not None and proc.poll() is None:
+            st.info("Fine-tuning is running in the background…")
+        else:
+            if proc is not None and proc.returncode == 0:
+                st.success("Last fine-tune finished.")
+            elif proc is not None:
+                st.error(f"Fine-tuning failed (exit status {proc.returncode}); log: {FINETUNE_LOG}")
+                st.code("\n".join(tail(FINETUNE_LOG, n=20)[0]) if FINETUNE_LOG.exists() else "(no log)")
+            if st.button("Fine-tune now", disabled=pending == 0):
+                FINETUNE_LOG.parent.mkdir(parents=True, exist_ok=True)
+                with open(FINETUNE_LOG, "wb") as log:  # the child keeps its own handle
+                    st.session_state.finetune_proc = subprocess.Popen(
+                        [sys.executable, "-m", "scripts.finetune_hitl", "--min-new", "1"],
+                        cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
+                        stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+                    )
+                st.info("Fine-tuning started in the background.")
     show_context = st.toggle("Show Context", value=False)
     if show_context:
         with st.expander("Context (Placeholder)"):
@@ -185,11 +328,16 @@ with advanced_options:
 
 st.sidebar.button("Admin Dashboard", on_click=lambda: switch_page("admin_dashboard"))
 
+# hidden unless the page is opened with ?debug=1
+profile_next = False
+if st.query_params.get("debug") == "1":
+    profile_next = st.sidebar.toggle("Profile next analysis", value=False)
+
 # Main content
 st.markdown('<div class="main">', unsafe_allow_html=True)
 
 # Input options: File upload or Camera
-input_method = st.radio("Select Input Method", ["Upload Images", "Camera Capture"], horizontal=True)
+input_method = st.radio("Select Input Method", ["Upload Images", "Camera Capture", "Upload Video"], horizontal=True)
 if input_method == "Upload Images":
     st.markdown('<div class="card"><h2>Upload Your Images</h2>', unsafe_allow_html=True)
     uploaded_files = st.file_uploader("Choose images...", type=["jpg", "png"], accept_multiple_files=True, key="image_uploader")
@@ -198,61 +346,86 @@ elif input_method == "Camera Capture":
     st.markdown('<div class="card"><h2>Camera Capture</h2>', unsafe_allow_html=True)
     camera_image = st.camera_input("Take a picture", key="camera_input")
     submit_button = st.button("Submit", key="camera_submit")
+elif input_method == "Upload Video":
+    st.markdown('<div class="card"><h2>Upload a Walk-around Video</h2>', unsafe_allow_html=True)
+    video_file = st.file_uploader("Choose a video...", type=VIDEO_TYPES, key="video_uploader")
+    submit_button = st.button("Submit", key="video_submit")
 
-results = []
-total_cost = 0
-saved_image_paths = []
+# (display name, stored filename, bytes) of the current inputs
+if input_method == "Upload Images":
+    inputs = [(f.name, f.name, f.getbuffer()) for f in uploaded_files or []]
+elif input_method == "Upload Video":
+    inputs = [(video_file.name, video_file.name, video_file.getbuffer())] if video_file else []
+else:
+    inputs = [("Camera Capture", "camera_capture.jpg", camera_image.getbuffer())] if camera_image else []
+# analyses survive reruns (feedback clicks, widget changes) keyed by the uploads' content hashes
+input_hashes = tuple(content_hash(data) for _, _, data in inputs)
+analyses = st.session_state.setdefault("analyses", {})
+analysis = analyses.get(input_hashes) if input_hashes else None
+profiled = False
 
-if submit_button:
-    if input_method == "Upload Images" and uploaded_files:
-        for uploaded_file in uploaded_files:
-            temp_path = os.path.join(os.path.dirname(__file__), f"temp_{uuid.uuid4()}.jpg")
-            with open(temp_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            
-            with st.spinner(f"Analyzing {uploaded_file.name}..."):
-                start_time = time.time()
-                detections, cost = infer(temp_path, conf=confidence_threshold)
-                
-                # ---------- NEW: render YOLO annotations ---------------
-                yolo_res      = _get_model().predict(temp_path,
-                                                     conf=confidence_threshold,
-                                                     save=False)
-                plotted_rgb   = cv2.cvtColor(yolo_res[0].plot(), cv2.COLOR_BGR2RGB)
-                # -------------------------------------------------------
-
-                total_time = time.time() - start_time
-            
-            # Save to processed_images directory
-            saved_path = os.path.join(processed_images_dir, f"processed_{uuid.uuid4()}.jpg")
-            with open(saved_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            saved_image_paths.append(saved_path)
-
-            results.append({"file": uploaded_file.name, "detections": detections,
-                            "cost": cost, "time": total_time,
-                            "plotted": plotted_rgb})
-            total_cost += cost
-            os.remove(temp_path)
-    elif input_method == "Camera Capture" and camera_image:
-        temp_path = os.path.join(os.path.dirname(__file__), f"temp_{uuid.uuid4()}.jpg")
-        with open(temp_path, "wb") as f:
-            f.write(camera_image.getbuffer())
-        
-        with st.spinner("Analyzing camera image..."):
-            start_time = time.time()
-            detections, cost = infer(temp_path, conf=confidence_threshold)
-            total_time = time.time() - start_time
-        
-        # Save to processed_images directory
-        saved_path = os.path.join(processed_images_dir, f"processed_{uuid.uuid4()}.jpg")
-        with open(saved_path, "wb") as f:
-            f.write(camera_image.getbuffer())
-        saved_image_paths.append(saved_path)
-
-        results.append({"file": "Camera Capture", "detections": detections, "cost": cost, "time": total_time, "plotted": plotted_rgb})
-        total_cost += cost
-        os.remove(temp_path)
+if submit_button and inputs:
+    # one id per analysis; feedback given on it is stored against this id. An
+    # exception anywhere below logs the request as an error before it surfaces.
+    with RequestTrace("streamlit", model=model_version(_get_model())) as trace:
+        st.session_state.request_id = trace.request_id
+        st.session_state.feedback_submitted = False
+        # covers decode, infer, overlay and the LLM call
+        profile = maybe_profile(trace.request_id, "streamlit", forced=profile_next)
+        try:
+            results = []
+            for name, filename, data in inputs:
+                if input_method == "Upload Video":
+                    with st.spinner(f"Analyzing {name}..."):
+                        results.extend(analyze_walkaround(name, data, confidence_threshold, trace))
+                    continue
+                # Persisted off the request path, deduplicated by content hash
+                image_hash = image_store.put(data, claim_id=st.session_state.request_id, filename=filename)
+
+                with trace.stage("decode"):
+                    # header-sized read, then one DCT-scaled decode near the model input size
+                    ingested = prepare_upload(data)
+
+                with st.spinner(f"Analyzing {name}..."):
+                    start_time = time.time()
+                    detections, cost, overlay = analyze(image_hash, confidence_threshold, trace, bytes(data), ingested)
+                    total_time = time.time() - start_time
+
+                results.append({"file": name, "detections": detections, "cost": cost,
+                                "time": total_time, "image_hash": image_hash, "overlay": overlay,
+                                "orig_size": ingested.orig_size, "scale": ingested.scale})
+            total_cost = sum(r["cost"] for r in results)
+            # generated once per analysis; reruns show the stored text
+            llm_response = None
+            if total_cost > 0 and _get_llm() is not None:
+                with st.spinner("Processing LLM analysis..."), trace.stage("llm"):
+                    llm_response = llm_summary(results, total_cost)
+            analysis = {"request_id": trace.request_id, "conf": confidence_threshold, "results": results,
+                        "llm_response": llm_response, "llm_conf": confidence_threshold}
+            analyses.pop(input_hashes, None)
+            analyses[input_hashes] = analysis
+            while len(analyses) > MAX_SESSION_ANALYSES:
+                analyses.pop(next(iter(analyses)))
+        finally:
+            # stopped even when the analysis fails, or this session's thread stays profiled
+            profiled = profile is not None and profile.stop() is not None
+        trace.finish(status="ok" if results else "empty", detections=summarize(results)[0], cost=total_cost)
+elif analysis is not None:
+    # rerun: show the stored analysis; feedback still belongs to it
+    st.session_state.request_id = analysis["request_id"]
+    if analysis["conf"] != confidence_threshold:
+        # a new threshold only re-filters the cached candidates; no model call
+        for result in analysis["results"]:
+            if result.get("video"):
+                continue  # keyframe results keep the threshold they were submitted with
+            result["detections"], result["cost"], result["overlay"] = analyze(
+                result["image_hash"], confidence_threshold)
+        analysis["conf"] = confidence_threshold
+
+results = analysis["results"] if analysis is not None else []
+total_cost = sum(r["cost"] for r in results)
+
+if analysis is not None:
 
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -261,9 +434,9 @@ if submit_button:
         st.markdown(f'<div class="result-card"><h3>Result #{i}</h3>', unsafe_allow_html=True)
         col1, col2 = st.columns(2)
         with col1:
-            # use YOLO’s own plotted result (already has coloured boxes)
-            plotted = results[i-1]["plotted"]
-            st.image(plotted, caption="Detected damage", use_container_width=True)
+            # compact WebP preview of YOLO’s own plot (already has coloured boxes)
+            st.image(str(result["overlay"]["preview"]), caption="Detected damage",
+                     use_container_width=True)
             
         with col2:
             st.markdown('<h4>Detected damage</h4>', unsafe_allow_html=True)
@@ -278,34 +451,39 @@ if submit_button:
             else:
                 st.write("❌ No detections with the current threshold.")
             st.markdown(f'**Tentative Repair Cost:** ₹{result["cost"]:.2f}')
+            if not result.get("video"):
+                # confirmed boxes become this image's label file for the next fine-tune
+                with st.expander("Confirm labels for fine-tuning"):
+                    keep = [st.checkbox(f"{d['class']} ({d['confidence']:.2f})", value=True,
+                                        key=f"label_{result['image_hash']}_{j}")
+                            for j, d in enumerate(result["detections"])]
+                    if st.button("Save labels", key=f"save_labels_{result['image_hash']}"):
+                        confirmed = [d for d, k in zip(result["detections"], keep) if k]
+                        save_label(result["image_hash"], confirmed, result["orig_size"])
+                        st.success(f"Saved {len(confirmed)} label(s) for the next fine-tune.")
         st.markdown('</div>', unsafe_allow_html=True)
 
     # Summary card
     st.markdown('<div class="summary-card">', unsafe_allow_html=True)
     st.markdown('<h2>Repair Summary</h2>', unsafe_allow_html=True)
-    total_parts = sum(len(r["detections"]) for r in results)
-    repair_parts = sum(1 for r in results for d in r["detections"] if d["severity"] == "moderate")
-    replace_parts = total_parts - repair_parts
+    total_parts, repair_parts, replace_parts = summarize(results)
     st.markdown(f"**Total Parts Identified:** {total_parts}")
     st.markdown(f"**Parts to Repair:** {repair_parts}")
     st.markdown(f"**Parts to Replace:** {replace_parts}")
     st.markdown(f"**Total Cost of Repair:** ₹{total_cost:.2f} (Sum of individual costs: ₹{sum(r['cost'] for r in results):.2f})")
     st.markdown('</div>', unsafe_allow_html=True)
 
-    # Human-like prompt with LLM
-    if total_cost > 0 and _get_llm() is not None:
-        llm = _get_llm()
-        prompt = PromptTemplate(
-            input_variables=["damages", "repair_parts", "replace_parts", "total_cost"],
-            template="Greetings! We're so sorry to hear your car has been in an accident—let’s get it back on the road.\nAnswer: The vehicle has the following key damages: {damages}. It requires repair for {repair_parts} parts and replacement of {replace_parts} parts. The tentative cost to repair the vehicle is ₹{total_cost}. Offer a warm, empathetic tone, acknowledge the user's likely frustration, and suggest next steps like contacting a mechanic or scheduling a detailed inspection."
-        )
-        damages_list = ", ".join(f"{d['class']} ({d['severity']})" for r in results for d in r["detections"])
-        with st.spinner("Processing LLM analysis..."):
-            response = llm.invoke(prompt.format(damages=damages_list, repair_parts=repair_parts, replace_parts=replace_parts, total_cost=total_cost)).strip()
+    if analysis["llm_response"]:
         st.markdown('<div class="card"><h3>Auto Damage Estimator Analysis</h3>', unsafe_allow_html=True)
-        st.write(response)
+        st.write(analysis["llm_response"])
+        if analysis["llm_conf"] != confidence_threshold:
+            st.caption(f"Written for a confidence threshold of {analysis['llm_conf']:.2f}; "
+                       "submit again to refresh it.")
         st.markdown('</div>', unsafe_allow_html=True)
 
+    if profiled:
+        st.caption(f"🔬 Profile saved as {trace.request_id} (Admin Dashboard → Profiles)")
+
 st.markdown('<div class="card"><h3>Feedback</h3>', unsafe_allow_html=True)
 
 # … your "upload + infer" logic that populates results …
@@ -0,0 +1,137 @@
+"""Per-request overhead of request parsing and response serialization in the API.
+
+    python -m scripts.bench_serialization
+    python -m scripts.bench_serialization --detections 5 20 80 --image photo.jpg --repeat 2000
+
+Times, per request and without the model:
+  * parsing an upload: multipart (what ``POST /predict`` pays) vs. the raw body
+    of ``POST /predict/raw``;
+  * encoding the response: stdlib json, orjson, and MessagePack with
+    per-detection dicts and with the columnar layout.
+Encoders whose package is not installed are skipped. Payloads are synthetic
+but shaped like real ``/predict`` responses.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+from utils.serialization import JSON, MSGPACK, encode, msgpack, orjson
+
+CLASSES = ["Dent", "Scratch", "Cracked", "Broken part", "Missing part", "Paint chip", "Flaking",
+           "Corrosion", "hood", "front_bumper", "rear_bumper", "door", "fender", "headlight"]
+
+
+def sample_payload(n_detections, seed=0):
+    rng = random.Random(seed)
+    detections = []
+    for _ in range(n_detections):
+        x, y = rng.uniform(0, 3000), rng.uniform(0, 2000)
+        detections.append({"class": rng.choice(CLASSES), "severity": rng.choice(["moderate", "severe"]),
+                           "confidence": round(rng.uniform(0.25, 1.0), 3),
+                           "cost": float(rng.choice([1500, 3200, 8000, 12500])),
+                           "box": [round(v, 1) for v in (x, y, x + rng.uniform(20, 900),
+                                                         y + rng.uniform(20, 600))]})
+    image_hash = "%064x" % rng.getrandbits(256)
+    return {"request_id": "%032x" % rng.getrandbits(128), "detections": detections,
+            "estimated_cost": sum(d["cost"] for d in detections), "image_hash": image_hash,
+            "image_size": [4032, 3024], "scale": [3.15, 3.15],
+            "overlays": {v: f"/derivatives/{image_hash}/{v}?model=autodamage-v3-{image_hash[:12]}"
+                         for v in ("thumb", "preview", "full")}}
+
+
+def _time(fn, repeat):
+    """Median microseconds per call, over ``repeat`` calls after a short warm-up."""
+    for _ in range(min(50, repeat)):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e6
+
+
+def encoders():
+    out = {"json (stdlib)": lambda p: json.dumps(p).encode("utf-8")}
+    if orjson is not None:
+        out["orjson"] = lambda p: encode(p, JSON)
+    out["json columnar"] = lambda p: encode(p, JSON, columnar=True)
+    if msgpack is not None:
+        out["msgpack rows"] = lambda p: encode(p, MSGPACK, columnar=False)
+        out["msgpack columnar"] = lambda p: encode(p, MSGPACK)
+    return out
+
+
+def bench_encoding(sizes, repeat):
+    print(f"📦 response encoding (median of {repeat})")
+    print(f"   {'encoder':<18}" + "".join(f"{f'{n} dets':>22}" for n in sizes))
+    for name, fn in encoders().items():
+        cells = []
+        for n in sizes:
+            payload = sample_payload(n)
+            cells.append(f"{_time(lambda: fn(payload), repeat):8.1f} µs {len(fn(payload)):7d} B")
+        print(f"   {name:<18}" + "".join(f"{c:>22}" for c in cells))
+
+
+def _multipart_body(data, boundary="----autodamagebench"):
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"car.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode()
+    return head + data + f"\r\n--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+def bench_parsing(data, repeat):
+    try:
+        from starlette.datastructures import Headers
+        from starlette.formparsers import MultiPartParser
+    except ImportError:
+        print("⚠  starlette / python-multipart not installed; skipping upload parsing")
+        return
+    body, content_type = _multipart_body(data)
+    headers = Headers({"content-type": content_type, "content-length": str(len(body))})
+    chunk = 64 * 1024  # what uvicorn hands to the app per receive()
+
+    async def stream():
+        for i in range(0, len(body), chunk):
+            yield body[i:i + chunk]
+        yield b""
+
+    async def multipart():
+        form = await MultiPartParser(headers, stream()).parse()
+        upload = form["file"]
+        await upload.read()
+        await upload.close()
+
+    async def raw():
+        return b"".join([part async for part in stream()])
+
+    loop = asyncio.new_event_loop()
+    try:
+        print(f"📨 upload parsing, {len(data) / 1024:.0f} KiB image (median of {repeat})")
+        for name, fn in (("multipart /predict", multipart), ("raw /predict/raw", raw)):
+            print(f"   {name:<18}{_time(lambda: loop.run_until_complete(fn()), repeat):10.1f} µs")
+    finally:
+        loop.close()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--detections", type=int, nargs="+", default=[3, 15, 60])
+    p.add_argument("--image", default=None, help="upload body to parse (default: 1.5 MiB of random bytes)")
+    p.add_argument("--repeat", type=int, default=1000)
+    args = p.parse_args(argv)
+
+    bench_encoding(args.detections, args.repeat)
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+    else:
+        data = os.urandom(int(1.5 * 2**20))
+    bench_parsing(data, max(10, args.repeat // 10))
+
+
+if __name__ == "__main__":
+    main()
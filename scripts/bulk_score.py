@@ -0,0 +1,204 @@
+"""Score a directory (or list) of images offline, on every core, resumably.
+
+    python -m scripts.bulk_score database/processed_images -o runs/score/archive.jsonl
+    python -m scripts.bulk_score @partner_files.txt -o runs/score/partner.parquet --workers 6
+
+Images are split into chunks that worker processes score as one YOLO batch,
+priced like every serving path (``utils.candidates.to_detections``).
+Results are written as each chunk finishes: appended to a JSONL file, or as
+one Parquet part file per chunk in ``<output>.parquet/``. The paths of every
+written chunk go to ``<output>.done``, so a killed run started again with the
+same arguments skips what is already scored (a chunk cut off between the two
+writes is scored, and written, again). Throughput is reported in
+images/sec, excluding each worker's first (warm-up) chunk.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from scripts.train import probe_machine
+from utils.helper import IMAGE_EXTS
+
+_model = None
+
+
+def list_images(inputs):
+    """Image paths from directories (recursive), single files and ``@listfile``s, sorted."""
+    paths = []
+    for item in inputs:
+        if item.startswith("@"):
+            with open(item[1:]) as f:
+                paths.extend(line.strip() for line in f if line.strip())
+        elif os.path.isdir(item):
+            for dirpath, _, files in os.walk(item):
+                paths.extend(os.path.join(dirpath, name) for name in files
+                             if name.lower().endswith(IMAGE_EXTS))
+        else:
+            paths.append(item)
+    return sorted(set(paths))
+
+
+def _init_worker(threads, weights):
+    global _model
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import torch
+
+    torch.set_num_threads(threads)
+    if weights:
+        from ultralytics import YOLO
+        _model = YOLO(weights)
+    else:
+        from scripts.infer import _get_model
+        _model = _get_model()
+
+
+def score_chunk(paths, conf):
+    """[(path, detections, cost, error)] for one chunk, plus the seconds it took."""
+    from utils.candidates import to_detections
+    from utils.ingest import decode_scaled
+
+    start = time.perf_counter()
+    rows = []
+    images, scales, ok = [], [], []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                image, (w, h) = decode_scaled(f.read())
+            images.append(image)
+            scales.append((w / image.size[0], h / image.size[1]))
+            ok.append(path)
+        except Exception as e:
+            rows.append((path, [], 0.0, f"{type(e).__name__}: {e}"))
+    if images:
+        for path, scale, result in zip(ok, scales, _model.predict(images, conf=conf, save=False,
+                                                                   verbose=False)):
+            detections = to_detections(result.cpu(), scale)
+            rows.append((path, detections, sum(d["cost"] for d in detections), None))
+    return rows, time.perf_counter() - start
+
+
+class ResultWriter:
+    """Appends scored chunks to JSONL or Parquet parts and records them in ``<output>.done``."""
+
+    def __init__(self, output):
+        self.output = Path(output)
+        self.parquet = self.output.suffix == ".parquet"
+        self.done_file = self.output.with_name(self.output.name + ".done")
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        if self.parquet:
+            self.output.mkdir(exist_ok=True)
+            self._part = len(list(self.output.glob("part-*.parquet")))
+        self._done = open(self.done_file, "a", encoding="utf-8")
+
+    def done_paths(self):
+        if not self.done_file.exists():
+            return set()
+        with open(self.done_file, encoding="utf-8") as f:
+            return {line.rstrip("\n") for line in f}
+
+    def write(self, rows):
+        stamp = time.strftime("%F %T")
+        records = [{"path": p, "detections": d, "n_detections": len(d), "cost": round(c, 2),
+                    "error": e, "scored_at": stamp} for p, d, c, e in rows]
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            for r in records:
+                r["detections"] = json.dumps(r["detections"])
+            tmp = self.output / f".part-{self._part:06d}.tmp"
+            pq.write_table(pa.Table.from_pylist(records), tmp)
+            os.replace(tmp, self.output / f"part-{self._part:06d}.parquet")
+            self._part += 1
+        else:
+            with open(self.output, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(r) + "\n" for r in records)
+                f.flush()
+                os.fsync(f.fileno())
+        # only now is the chunk safe to skip on resume
+        self._done.writelines(p + "\n" for p, *_ in rows)
+        self._done.flush()
+        os.fsync(self._done.fileno())
+
+    def close(self):
+        self._done.close()
+
+
+def _steady_rate(scored, warm_images, warm_start):
+    now = time.perf_counter()
+    if warm_start is None or scored <= warm_images or now <= warm_start:
+        return None
+    return (scored - warm_images) / (now - warm_start)
+
+
+def bulk_score(inputs, output, workers=None, threads=None, chunk=16, conf=0.25, weights=None,
+               report_every=30.0):
+    paths = list_images(inputs)
+    writer = ResultWriter(output)
+    done = writer.done_paths()
+    todo = [p for p in paths if p not in done]
+    print(f"🗂  {len(paths)} images, {len(paths) - len(todo)} already scored, {len(todo)} to go")
+    if not todo:
+        writer.close()
+        return {"images": 0, "images_per_sec": None}
+
+    cpus = probe_machine()["cpus"]
+    workers = workers or max(1, min(cpus // 2, len(todo) // chunk + 1))
+    threads = threads or max(1, cpus // workers)
+    chunks = [todo[i:i + chunk] for i in range(0, len(todo), chunk)]
+    print(f"⚙  {workers} workers × {threads} threads, {len(chunks)} chunks of {chunk}")
+
+    scored, warm_images, warm_start = 0, 0, None
+    start = last_report = time.perf_counter()
+    # spawn: every worker sets its own thread budget before importing torch
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=(threads, weights)) as pool:
+        futures = [pool.submit(score_chunk, c, conf) for c in chunks]
+        try:
+            for n, future in enumerate(as_completed(futures), 1):
+                rows, _ = future.result()
+                writer.write(rows)
+                scored += len(rows)
+                if n == workers:  # every worker has loaded its model
+                    warm_start, warm_images = time.perf_counter(), scored
+                if time.perf_counter() - last_report >= report_every:
+                    last_report = time.perf_counter()
+                    rate = _steady_rate(scored, warm_images, warm_start)
+                    print(f"   {scored}/{len(todo)} scored"
+                          + (f", {rate:.1f} img/s" if rate else ", warming up"))
+        except KeyboardInterrupt:
+            print("⏹  interrupted; rerun the same command to resume")
+            for f in futures:
+                f.cancel()
+            raise
+        finally:
+            writer.close()
+
+    elapsed = time.perf_counter() - start
+    steady = _steady_rate(scored, warm_images, warm_start)
+    print(f"✅ {scored} images in {elapsed:.1f}s — "
+          f"{scored / elapsed:.1f} img/s overall"
+          + (f", {steady:.1f} img/s steady-state" if steady else ""))
+    return {"images": scored, "seconds": round(elapsed, 2), "images_per_sec": steady}
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("inputs", nargs="+", help="directories, image files or @listfile")
+    p.add_argument("-o", "--output", required=True, help="*.jsonl or *.parquet")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--threads", type=int, default=None, help="torch threads per worker")
+    p.add_argument("--chunk", type=int, default=16, help="images per batch / checkpoint unit")
+    p.add_argument("--conf", type=float, default=0.25)
+    p.add_argument("--weights", default=None, help="defaults to the serving model")
+    args = p.parse_args(argv)
+    bulk_score(args.inputs, args.output, args.workers, args.threads, args.chunk, args.conf,
+               args.weights)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Distil the best trained detector into a smaller, faster CPU student.
+
+The teacher's confident predictions on the training images are merged with the
+ground-truth labels (response-based distillation through pseudo-labels), and a
+small student is trained on that set at a lower input size. Optionally the
+student is channel-pruned (needs ``torch-pruning``) and briefly fine-tuned.
+Teacher, student and pruned student are evaluated on the same val split and
+written to ``runs/distill/<name>/report.csv``.
+
+    python -m scripts.distill --student yolov8n.pt --student-imgsz 480 --slo-ms 120
+    python -m scripts.distill --prune 0.3
+"""
+import argparse
+import csv
+import glob
+import os
+from pathlib import Path
+
+from scripts.train import DATA_YAML, IMAGE_EXTS, PROJECT_ROOT, RUNS_DIR, ensure_data_yaml
+
+DISTILL_DIR = PROJECT_ROOT / "runs" / "distill"
+TRAIN_DIR = PROJECT_ROOT / "data" / "processed" / "train"
+REPORT_FIELDS = ["model", "weights", "imgsz", "params_m", "mAP50", "mAP50-95",
+                 "latency_p50_ms", "latency_p95_ms", "meets_slo"]
+
+
+def find_best_weights(runs_dir=RUNS_DIR):
+    """The ``best.pt`` of the run with the highest final val mAP50-95 in results.csv."""
+    best, best_map = None, -1.0
+    for results in glob.glob(os.path.join(runs_dir, "*", "results.csv")):
+        weights = Path(results).parent / "weights" / "best.pt"
+        if not weights.exists():
+            continue
+        with open(results) as f:
+            rows = [{k.strip(): v for k, v in r.items()} for r in csv.DictReader(f)]
+        score = max((float(r["metrics/mAP50-95(B)"]) for r in rows), default=-1.0)
+        if score > best_map:
+            best, best_map = weights, score
+    return best
+
+
+def _iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _xywh_to_xyxy(x, y, w, h):
+    return (x - w / 2, y - h / 2, x + w / 2, y + h / 2)
+
+
+def build_distill_dataset(teacher, out_dir, conf=0.4, iou_dup=0.5, imgsz=640, batch=16):
+    """Write ground truth + non-duplicate teacher boxes as YOLO labels for every train image."""
+    images_out, labels_out = out_dir / "train" / "images", out_dir / "train" / "labels"
+    images_out.mkdir(parents=True, exist_ok=True)
+    labels_out.mkdir(parents=True, exist_ok=True)
+
+    images = sorted(p for p in (TRAIN_DIR / "images").iterdir() if p.suffix.lower() in IMAGE_EXTS)
+    added = 0
+    for start in range(0, len(images), batch):
+        chunk = images[start:start + batch]
+        results = teacher.predict([str(p) for p in chunk], imgsz=imgsz, conf=conf,
+                                  device="cpu", verbose=False)
+        for image, res in zip(chunk, results):
+            gt_file = TRAIN_DIR / "labels" / f"{image.stem}.txt"
+            lines = gt_file.read_text().splitlines() if gt_file.exists() else []
+            gt = [(int(l.split()[0]), _xywh_to_xyxy(*map(float, l.split()[1:5])))
+                  for l in lines if l.strip()]
+            for cls, box in zip(res.boxes.cls.tolist(), res.boxes.xywhn.tolist()):
+                xyxy = _xywh_to_xyxy(*box)
+                if any(int(cls) == g_cls and _iou(xyxy, g_box) >= iou_dup for g_cls, g_box in gt):
+                    continue
+                lines.append(f"{int(cls)} {box[0]:.6f} {box[1]:.6f} {box[2]:.6f} {box[3]:.6f}")
+                added += 1
+            dst = images_out / image.name
+            if not dst.exists():
+                os.symlink(image.resolve(), dst)
+            (labels_out / f"{image.stem}.txt").write_text("\n".join(lines))
+
+    import yaml
+    base = yaml.safe_load(Path(DATA_YAML).read_text())
+    data_yaml = out_dir / "data.yaml"
+    data_yaml.write_text(yaml.safe_dump({
+        "train": str((out_dir / "train").resolve()),
+        "val": str((PROJECT_ROOT / "data" / "processed" / "val").resolve()),
+        "nc": base["nc"],
+        "names": base["names"],
+    }, sort_keys=False))
+    print(f"🧪 {len(images)} images, {added} teacher boxes added to ground truth")
+    return data_yaml
+
+
+def prune_channels(weights, ratio, example_imgsz=640):
+    """Structurally remove ``ratio`` of the channels (by L2 norm) outside the Detect head."""
+    try:
+        import torch_pruning as tp
+    except ImportError:
+        print("⚠  torch-pruning is not installed; skipping structured pruning.")
+        return None
+    import torch
+    from ultralytics import YOLO
+
+    model = YOLO(str(weights)).model.float()
+    for p in model.parameters():
+        p.requires_grad = True
+    example = torch.zeros(1, 3, example_imgsz, example_imgsz)
+    head = model.model[-1]
+    pruner = tp.pruner.MagnitudePruner(
+        model, example, importance=tp.importance.MagnitudeImportance(p=2),
+        pruning_ratio=ratio, ignored_layers=[head],
+    )
+    base_ops, base_params = tp.utils.count_ops_and_params(model, example)
+    pruner.step()
+    ops, params = tp.utils.count_ops_and_params(model, example)
+    print(f"✂  params {base_params / 1e6:.2f}M → {params / 1e6:.2f}M, "
+          f"MACs {base_ops / 1e9:.2f}G → {ops / 1e9:.2f}G")
+    return model
+
+
+def _pruned_trainer(pruned_model):
+    """DetectionTrainer that fine-tunes the given (pruned) module instead of rebuilding from yaml."""
+    from ultralytics.models.yolo.detect import DetectionTrainer
+
+    class PrunedDetectionTrainer(DetectionTrainer):
+        def get_model(self, cfg=None, weights=None, verbose=True):
+            return pruned_model
+
+    return PrunedDetectionTrainer
+
+
+def _evaluate(label, weights, data_yaml, imgsz, slo_ms, latency_images):
+    from ultralytics import YOLO
+
+    from utils.helper import measure_latency, split_images, val_metrics
+
+    model = YOLO(str(weights))
+    metrics = val_metrics(model, data_yaml, imgsz=imgsz)
+    latency = measure_latency(model, split_images(data_yaml, "val", limit=latency_images), imgsz=imgsz)
+    meets_slo = ""
+    if slo_ms is not None:
+        meets_slo = latency["p95_ms"] is not None and latency["p95_ms"] <= slo_ms
+    return {
+        "model": label,
+        "weights": str(weights),
+        "imgsz": imgsz,
+        "params_m": round(sum(p.numel() for p in model.model.parameters()) / 1e6, 2),
+        "mAP50": metrics["mAP50"],
+        "mAP50-95": metrics["mAP50-95"],
+        "latency_p50_ms": latency["p50_ms"],
+        "latency_p95_ms": latency["p95_ms"],
+        "meets_slo": meets_slo,
+    }
+
+
+def distill(teacher=None, student="yolov8n.pt", teacher_imgsz=640, student_imgsz=480, epochs=30,
+            batch=16, pseudo_conf=0.4, prune=0.0, prune_epochs=5, slo_ms=None, name="distill",
+            latency_images=100):
+    from ultralytics import YOLO
+
+    ensure_data_yaml()
+    teacher = Path(teacher) if teacher else find_best_weights()
+    if teacher is None or not teacher.exists():
+        raise FileNotFoundError("no teacher weights found under runs/detect/*/weights/best.pt")
+    out_dir = DISTILL_DIR / name
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    data_yaml = build_distill_dataset(YOLO(str(teacher)), out_dir / "dataset", conf=pseudo_conf,
+                                      imgsz=teacher_imgsz)
+    student_model = YOLO(student)
+    student_model.train(data=str(data_yaml), epochs=epochs, imgsz=student_imgsz, batch=batch,
+                        device="cpu", project=str(out_dir), name="student", exist_ok=True)
+    student_best = Path(student_model.trainer.best)
+
+    rows = [
+        _evaluate("teacher", teacher, data_yaml, teacher_imgsz, slo_ms, latency_images),
+        _evaluate("student", student_best, data_yaml, student_imgsz, slo_ms, latency_images),
+    ]
+    if prune > 0:
+        pruned = prune_channels(student_best, prune, example_imgsz=student_imgsz)
+        if pruned is not None:
+            recover = YOLO(str(student_best))
+            recover.train(data=str(data_yaml), epochs=prune_epochs, imgsz=student_imgsz,
+                          batch=batch, device="cpu", project=str(out_dir), name="pruned",
+                          exist_ok=True, trainer=_pruned_trainer(pruned))
+            rows.append(_evaluate(f"student-pruned-{prune:g}", recover.trainer.best, data_yaml,
+                                  student_imgsz, slo_ms, latency_images))
+
+    report = out_dir / "report.csv"
+    with open(report, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print("\n| model | imgsz | params (M) | mAP50-95 | p50 ms | p95 ms | SLO |")
+    print("|---|---|---|---|---|---|---|")
+    for r in rows:
+        print(f"| {r['model']} | {r['imgsz']} | {r['params_m']} | {r['mAP50-95']} | "
+              f"{r['latency_p50_ms']} | {r['latency_p95_ms']} | {r['meets_slo']} |")
+    print(f"\n📄 {report}")
+    return rows
+
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Distil (and optionally prune) a faster CPU student model.")
+    p.add_argument("--teacher", help="teacher weights (default: best run under runs/detect)")
+    p.add_argument("--student", default="yolov8n.pt")
+    p.add_argument("--teacher-imgsz", type=int, default=640)
+    p.add_argument("--student-imgsz", type=int, default=480)
+    p.add_argument("--epochs", type=int, default=30)
+    p.add_argument("--batch", type=int, default=16)
+    p.add_argument("--pseudo-conf", type=float, default=0.4, help="teacher confidence for pseudo-labels")
+    p.add_argument("--prune", type=float, default=0.0, help="channel pruning ratio (0: off)")
+    p.add_argument("--prune-epochs", type=int, default=5, help="recovery epochs after pruning")
+    p.add_argument("--slo-ms", type=float, help="per-image CPU p95 latency SLO")
+    p.add_argument("--latency-images", type=int, default=100)
+    p.add_argument("--name", default="distill")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    distill(teacher=args.teacher, student=args.student, teacher_imgsz=args.teacher_imgsz,
+            student_imgsz=args.student_imgsz, epochs=args.epochs, batch=args.batch,
+            pseudo_conf=args.pseudo_conf, prune=args.prune, prune_epochs=args.prune_epochs,
+            slo_ms=args.slo_ms, name=args.name, latency_images=args.latency_images)
@@ -0,0 +1,197 @@
+"""Evaluate every candidate weight file and gate regressions against production.
+
+    python -m scripts.evaluate                       # all runs/detect/*/weights/best.pt
+    python -m scripts.evaluate --weights runs/distill/distill/student/weights/best.pt
+    python -m scripts.evaluate --max-map-drop 0.005 --max-latency-increase 0.10
+
+Val/test mAP is computed in parallel worker processes. CPU latency is measured
+afterwards, one model at a time, at serving settings (batch 1, imgsz 640,
+conf 0.25) so the timings are not skewed by the parallel validation. Every run
+is appended to ``runs/eval/history.jsonl``. The exit status is 1 when any
+candidate regresses mAP or latency beyond the thresholds versus production,
+and 2 when there are no production weights to compare against (unless
+``--allow-missing-production``) or the gated split was not evaluated.
+"""
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from scripts.finetune_hitl import production_weights
+from scripts.train import DATA_YAML, PROJECT_ROOT, RUNS_DIR, ensure_data_yaml, probe_machine
+
+EVAL_DIR = PROJECT_ROOT / "runs" / "eval"
+HISTORY_FILE = EVAL_DIR / "history.jsonl"
+SERVING_IMGSZ = 640
+SERVING_CONF = 0.25
+
+
+def find_candidates(runs_dir=RUNS_DIR):
+    return sorted(Path(p) for p in glob.glob(os.path.join(runs_dir, "*", "weights", "best.pt")))
+
+
+def _dataset_splits(data_yaml, requested):
+    from ultralytics.data.utils import check_det_dataset
+
+    data = check_det_dataset(str(data_yaml))
+    return [s for s in requested if data.get(s)]
+
+
+def _val_worker(weights, data_yaml, splits, imgsz, threads):
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import torch
+
+    from utils.helper import val_metrics
+
+    torch.set_num_threads(threads)
+    return {split: val_metrics(str(weights), data_yaml, imgsz=imgsz, split=split) for split in splits}
+
+
+def evaluate(candidates, production=None, data=DATA_YAML, splits=("val", "test"),
+             parallel=None, latency_images=100, latency_threads=None):
+    """Return one result dict per weights file (production first, if present).
+
+    ``production`` defaults to the weights the model registry routes most traffic to.
+    """
+    import torch
+
+    from utils.helper import file_sha256, measure_latency, split_images
+
+    data_yaml = ensure_data_yaml(data)
+    splits = _dataset_splits(data_yaml, splits)
+    production = Path(production or production_weights())
+    weights = ([production] if production.exists() else []) + \
+              [c for c in candidates if Path(c).resolve() != production.resolve()]
+    if not weights:
+        return []
+
+    cpus = probe_machine()["cpus"]
+    parallel = parallel or max(1, min(len(weights), cpus // 2))
+    threads = max(1, cpus // parallel)
+    print(f"📏 validating {len(weights)} models on {', '.join(splits)} ({parallel} in parallel)")
+
+    # spawn: every worker sets its own thread budget before importing torch
+    with ProcessPoolExecutor(max_workers=parallel, mp_context=mp.get_context("spawn")) as pool:
+        futures = [pool.submit(_val_worker, w, data_yaml, splits, SERVING_IMGSZ, threads)
+                   for w in weights]
+        metrics = [f.result() for f in futures]
+
+    torch.set_num_threads(latency_threads or cpus)
+    images = split_images(data_yaml, "val", limit=latency_images)
+    stamp = time.strftime("%F %T")
+    results = []
+    for w, m in zip(weights, metrics):
+        latency = measure_latency(str(w), images, imgsz=SERVING_IMGSZ, conf=SERVING_CONF)
+        results.append({
+            "timestamp": stamp,
+            "weights": str(w),
+            "sha256": file_sha256(w),
+            "production": w == production,
+            "metrics": m,
+            "latency": latency,
+        })
+    return results
+
+
+class GateError(Exception):
+    """The gate cannot compare candidates with production."""
+
+
+def gate(results, max_map_drop=0.0, max_latency_increase=0.10, split="val",
+         allow_missing_production=False):
+    """Mark each candidate's regressions versus production; return True if any regressed.
+
+    Raises GateError when there is no production result (unless
+    ``allow_missing_production``) or ``split`` was not evaluated.
+    """
+    prod = next((r for r in results if r["production"]), None)
+    if prod is None:
+        if not allow_missing_production:
+            raise GateError("no production weights to compare against "
+                            "(pass --allow-missing-production to skip the gate)")
+        print("⚠  no production weights to compare against; gate skipped.")
+        return False
+    missing = [r["weights"] for r in results if split not in r["metrics"]]
+    if missing:
+        raise GateError(f"split {split!r} was not evaluated for {len(missing)} weights (check "
+                        f"--splits and the dataset's {split!r} entry): {', '.join(missing)}")
+    base_map = prod["metrics"][split]["mAP50-95"]
+    base_lat = prod["latency"]["p50_ms"]
+    regressed = False
+    for r in results:
+        if r["production"]:
+            r["regressions"] = []
+            continue
+        problems = []
+        cand_map = r["metrics"][split]["mAP50-95"]
+        if cand_map < base_map - max_map_drop:
+            problems.append(f"mAP50-95 {cand_map:.4f} < {base_map:.4f} - {max_map_drop}")
+        cand_lat = r["latency"]["p50_ms"]
+        if base_lat and cand_lat and cand_lat > base_lat * (1 + max_latency_increase):
+            problems.append(f"p50 {cand_lat:.1f} ms > {base_lat:.1f} ms + {max_latency_increase:.0%}")
+        r["regressions"] = problems
+        regressed |= bool(problems)
+    return regressed
+
+
+def _print_table(results, split="val"):
+    print(f"\n{'weights':<55} {'mAP50':>7} {'mAP50-95':>9} {'p50 ms':>8} {'p95 ms':>8}  status")
+    for r in results:
+        m, lat = r["metrics"].get(split, {}), r["latency"]
+        status = "production" if r["production"] else ("REGRESSED: " + "; ".join(r["regressions"])
+                                                        if r.get("regressions") else "ok")
+        print(f"{r['weights'][-55:]:<55} {m.get('mAP50', 0):>7.4f} {m.get('mAP50-95', 0):>9.4f} "
+              f"{lat['p50_ms'] or 0:>8.1f} {lat['p95_ms'] or 0:>8.1f}  {status}")
+
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Evaluate candidate weights in parallel and gate regressions.")
+    p.add_argument("--weights", nargs="*", help="candidate weights (default: runs/detect/*/weights/best.pt)")
+    p.add_argument("--production", help="production weights (default: the registry's routed version)")
+    p.add_argument("--data", default=str(DATA_YAML))
+    p.add_argument("--splits", nargs="+", default=["val", "test"])
+    p.add_argument("--parallel", type=int, help="validation processes (default: cores / 2)")
+    p.add_argument("--latency-images", type=int, default=100)
+    p.add_argument("--max-map-drop", type=float, default=0.0, help="allowed absolute mAP50-95 drop")
+    p.add_argument("--max-latency-increase", type=float, default=0.10,
+                   help="allowed relative p50 latency increase")
+    p.add_argument("--gate-split", default="val", help="split whose mAP50-95 is gated")
+    p.add_argument("--allow-missing-production", action="store_true",
+                   help="exit 0 instead of 2 when there are no production weights")
+    return p.parse_args()
+
+
+def main():
+    args = _parse_args()
+    candidates = [Path(w) for w in args.weights] if args.weights else find_candidates()
+    results = evaluate(candidates, production=args.production, data=args.data,
+                       splits=args.splits, parallel=args.parallel,
+                       latency_images=args.latency_images)
+    if not results:
+        print("no weights to evaluate")
+        return 0
+    error = None
+    try:
+        regressed = gate(results, args.max_map_drop, args.max_latency_increase, args.gate_split,
+                         args.allow_missing_production)
+    except GateError as e:
+        error, regressed = e, False
+    _print_table(results, args.gate_split)
+
+    EVAL_DIR.mkdir(parents=True, exist_ok=True)
+    with open(HISTORY_FILE, "a") as f:
+        for r in results:
+            f.write(json.dumps(r) + "\n")
+    print(f"\n📄 appended {len(results)} results to {HISTORY_FILE}")
+    if error is not None:
+        print(f"❌ gate failed: {error}")
+        return 2
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
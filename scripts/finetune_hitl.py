@@ -0,0 +1,272 @@
+"""Incremental fine-tuning from human-in-the-loop labels.
+
+Claim images land in ``database/processed_images``; once an adjuster confirms
+or corrects the detections in the UI, its YOLO label file is saved under
+``database/labels`` named by the image's content hash (or, for older flat
+files, its stem). This job fine-tunes the production weights (the version the
+model registry routes most traffic to) on the labels added since the last
+promotion plus a replay sample of the original training set, and only promotes
+the result if val mAP does not regress. Promoting registers the new weights and
+routes all traffic to them; serving processes swap without a restart.
+
+    python -m scripts.finetune_hitl               # run if enough new labels
+    python -m scripts.finetune_hitl --min-new 1 --epochs 3
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import time
+from pathlib import Path
+
+from scripts.train import DATA_YAML, IMAGE_EXTS, PROJECT_ROOT
+
+PROCESSED_IMAGES_DIR = PROJECT_ROOT / "database" / "processed_images"
+HITL_LABELS_DIR = PROJECT_ROOT / "database" / "labels"
+STATE_FILE = PROJECT_ROOT / "database" / "finetune_state.json"
+FINETUNE_DIR = PROJECT_ROOT / "runs" / "finetune"
+TRAIN_DIR = PROJECT_ROOT / "data" / "processed" / "train"
+VAL_DIR = PROJECT_ROOT / "data" / "processed" / "val"
+FINETUNE_LOG = PROJECT_ROOT / "logs" / "finetune.log"
+# baseline while nothing is routed in the model registry
+PRODUCTION_WEIGHTS = Path(os.environ.get("AUTODAMAGE_WEIGHTS",
+                                         PROJECT_ROOT / "models" / "production.pt"))
+
+
+def production_weights():
+    """Weights serving production: the registry version with the largest traffic share,
+    else ``PRODUCTION_WEIGHTS``."""
+    from utils.model_registry import ModelRegistry
+
+    registry = ModelRegistry()
+    try:
+        routes = registry.routes()
+        if routes:
+            return Path(registry.get(max(routes, key=routes.get))["path"])
+    finally:
+        registry.close()
+    return PRODUCTION_WEIGHTS
+
+
+# ── state ────────────────────────────────────────────────────────────
+def load_state():
+    if STATE_FILE.exists():
+        return json.loads(STATE_FILE.read_text())
+    return {"labels_since": 0.0, "last_run": None}
+
+
+def _save_state(state):
+    tmp = STATE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, STATE_FILE)
+
+
+# ── labels ───────────────────────────────────────────────────────────
+def class_names(data_yaml=DATA_YAML):
+    import yaml
+
+    return yaml.safe_load(Path(data_yaml).read_text())["names"]
+
+
+def save_label(image_hash, detections, image_size, names=None):
+    """Write the confirmed ``detections`` of a stored image as its YOLO label file.
+
+    Boxes are ``[x1, y1, x2, y2]`` in original pixels and ``image_size`` is its
+    (w, h); an empty list records an image with no damage. Returns the path.
+    """
+    ids = {n: i for i, n in enumerate(names or class_names())}
+    w, h = image_size
+    lines = []
+    for d in detections:
+        if d["class"] not in ids:
+            raise KeyError(f"class not in {DATA_YAML}: {d['class']}")
+        x1, y1, x2, y2 = d["box"]
+        lines.append(f"{ids[d['class']]} {(x1 + x2) / 2 / w:.6f} {(y1 + y2) / 2 / h:.6f} "
+                     f"{(x2 - x1) / w:.6f} {(y2 - y1) / h:.6f}")
+    HITL_LABELS_DIR.mkdir(parents=True, exist_ok=True)
+    path = HITL_LABELS_DIR / f"{image_hash}.txt"
+    tmp = path.with_suffix(".txt.tmp")
+    tmp.write_text("".join(line + "\n" for line in lines))
+    os.replace(tmp, path)
+    return path
+
+
+# ── sample selection ─────────────────────────────────────────────────
+def _image_for(stem, image_dir):
+    """Find a labelled image: content-addressed (label named by sha256) or legacy flat file."""
+    from utils.image_store import find_stored
+
+    if len(stem) == 64:
+        path = find_stored(stem)
+        if path is not None:
+            return path
+    for ext in IMAGE_EXTS:
+        path = Path(image_dir) / f"{stem}{ext}"
+        if path.exists():
+            return path
+    return None
+
+
+def collect_new_samples(since=None):
+    """(image, label) pairs whose label was written or corrected after ``since``."""
+    since = load_state()["labels_since"] if since is None else since
+    if not HITL_LABELS_DIR.is_dir():
+        return []
+    samples = []
+    for label in HITL_LABELS_DIR.glob("*.txt"):
+        if label.stat().st_mtime <= since:
+            continue
+        image = _image_for(label.stem, PROCESSED_IMAGES_DIR)
+        if image is not None:
+            samples.append((image, label))
+    return sorted(samples)
+
+
+def sample_replay(n, seed=0):
+    """Random labelled images from the original training split."""
+    images_dir, labels_dir = TRAIN_DIR / "images", TRAIN_DIR / "labels"
+    if not images_dir.is_dir():
+        return []
+    pool = []
+    for image in images_dir.iterdir():
+        label = labels_dir / f"{image.stem}.txt"
+        if image.suffix.lower() in IMAGE_EXTS and label.exists():
+            pool.append((image, label))
+    pool.sort()
+    random.Random(seed).shuffle(pool)
+    return pool[:n]
+
+
+def _link(src, dst):
+    try:
+        os.symlink(os.path.abspath(src), dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def build_dataset(run_dir, new_samples, replay_samples):
+    """Lay out a YOLO dataset of new + replay samples validated on the standard val split."""
+    import yaml
+
+    images_dir = run_dir / "dataset" / "train" / "images"
+    labels_dir = run_dir / "dataset" / "train" / "labels"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    labels_dir.mkdir(parents=True, exist_ok=True)
+    for prefix, samples in (("new", new_samples), ("replay", replay_samples)):
+        for image, label in samples:
+            stem = f"{prefix}_{image.stem}"
+            _link(image, images_dir / f"{stem}{image.suffix.lower()}")
+            _link(label, labels_dir / f"{stem}.txt")
+
+    base = yaml.safe_load(Path(DATA_YAML).read_text())
+    data_yaml = run_dir / "data.yaml"
+    data_yaml.write_text(yaml.safe_dump({
+        "train": str(images_dir.parent.resolve()),
+        "val": str(VAL_DIR.resolve()),
+        "nc": base["nc"],
+        "names": base["names"],
+    }, sort_keys=False))
+    return data_yaml
+
+
+# ── promotion ────────────────────────────────────────────────────────
+def promote(weights, metrics=None):
+    """Register ``weights`` and route all traffic to it; returns the new version.
+
+    Earlier versions stay registered, so rolling back is one ``scripts.registry
+    route`` away.
+    """
+    from utils.model_registry import ModelRegistry
+
+    registry = ModelRegistry()
+    try:
+        version = registry.register(weights, metrics=metrics)
+        registry.set_routes({version: 100})
+    finally:
+        registry.close()
+    return version
+
+
+def finetune(min_new=20, replay_ratio=2.0, min_replay=50, epochs=5, imgsz=640, batch=8,
+             freeze=10, lr0=0.002, tolerance=0.0, seed=0):
+    """Fine-tune on new labels + replay and promote if val mAP50-95 does not drop."""
+    from ultralytics import YOLO
+
+    from utils.helper import val_metrics
+
+    production = production_weights()
+    if not production.exists():
+        raise FileNotFoundError(f"production weights not found: {production}")
+
+    state = load_state()
+    started = time.time()
+    new_samples = collect_new_samples(state["labels_since"])
+    if len(new_samples) < min_new:
+        print(f"⏭  {len(new_samples)} new labelled images (< {min_new}); nothing to do.")
+        return None
+    watermark = max(label.stat().st_mtime for _, label in new_samples)
+    replay = sample_replay(max(min_replay, int(len(new_samples) * replay_ratio)), seed=seed)
+
+    run_dir = FINETUNE_DIR / time.strftime("%Y%m%d_%H%M%S")
+    run_dir.mkdir(parents=True)
+    data_yaml = build_dataset(run_dir, new_samples, replay)
+    print(f"🧩 fine-tuning on {len(new_samples)} new + {len(replay)} replay images → {run_dir}")
+
+    baseline = val_metrics(str(production), data_yaml, imgsz=imgsz)
+    model = YOLO(str(production))
+    # short schedule from the current weights: frozen backbone, no warmup, low lr
+    model.train(data=str(data_yaml), epochs=epochs, imgsz=imgsz, batch=batch, freeze=freeze,
+                lr0=lr0, warmup_epochs=0, device="cpu", project=str(run_dir), name="train",
+                seed=seed, plots=False)
+    best = Path(model.trainer.best)
+    candidate = val_metrics(str(best), data_yaml, imgsz=imgsz)
+
+    promoted = candidate["mAP50-95"] >= baseline["mAP50-95"] - tolerance
+    version = None
+    if promoted:
+        version = promote(best, metrics=candidate)
+        state["labels_since"] = watermark
+    report = {
+        "run_dir": str(run_dir),
+        "production": str(production),
+        "new_images": len(new_samples),
+        "replay_images": len(replay),
+        "baseline": baseline,
+        "candidate": candidate,
+        "promoted": promoted,
+        "version": version,
+        "duration_s": round(time.time() - started, 1),
+        "finished": time.strftime("%F %T"),
+    }
+    state["last_run"] = report
+    _save_state(state)
+    (run_dir / "report.json").write_text(json.dumps(report, indent=2))
+    with open(FINETUNE_DIR / "history.jsonl", "a") as f:
+        f.write(json.dumps(report) + "\n")
+
+    verdict = f"✅ promoted as v{version}" if promoted else "❌ kept production (val mAP regressed)"
+    print(f"{verdict}: mAP50-95 {baseline['mAP50-95']:.4f} → {candidate['mAP50-95']:.4f}")
+    return report
+
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Fine-tune production weights on new HITL labels.")
+    p.add_argument("--min-new", type=int, default=20, help="minimum new labelled images to run")
+    p.add_argument("--replay-ratio", type=float, default=2.0, help="replay images per new image")
+    p.add_argument("--min-replay", type=int, default=50)
+    p.add_argument("--epochs", type=int, default=5)
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--batch", type=int, default=8)
+    p.add_argument("--freeze", type=int, default=10, help="number of backbone layers to freeze")
+    p.add_argument("--lr0", type=float, default=0.002)
+    p.add_argument("--tolerance", type=float, default=0.0, help="allowed mAP50-95 drop")
+    p.add_argument("--seed", type=int, default=0)
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    finetune(min_new=args.min_new, replay_ratio=args.replay_ratio, min_replay=args.min_replay,
+             epochs=args.epochs, imgsz=args.imgsz, batch=args.batch, freeze=args.freeze,
+             lr0=args.lr0, tolerance=args.tolerance, seed=args.seed)
@@ -0,0 +1,133 @@
+"""Worker processes for the ``POST /jobs`` queue.
+
+    python -m scripts.job_worker                     # one worker per 4 cores
+    python -m scripts.job_worker --workers 2 --batch 16
+
+Each worker leases up to ``batch`` queued images, decodes them at reduced
+resolution, runs them through YOLO as one batch and writes the priced
+detections back to ``database/jobs.db``. An image that fails is retried with
+backoff; a worker that dies simply lets its leases expire, after which other
+workers pick the images up. Throughput scales with ``--workers``; the API only
+ever inserts rows.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import socket
+import time
+import traceback
+
+from scripts.train import probe_machine
+from utils.job_queue import JOBS_DB, VISIBILITY_TIMEOUT, JobQueue
+
+
+def _decode(image_hash):
+    from utils.image_store import find_stored
+    from utils.ingest import decode_scaled
+
+    source = find_stored(image_hash)
+    if source is None:
+        raise FileNotFoundError(f"image {image_hash} is not in the image store")
+    image, (w, h) = decode_scaled(source.read_bytes())
+    return image, (w / image.size[0], h / image.size[1])
+
+
+def process_batch(queue, worker, model, items):
+    """Score one leased batch; returns the number of images completed."""
+    from utils.candidates import to_detections
+
+    decoded = []
+    for job_id, idx, image_hash, _, conf in items:
+        try:
+            decoded.append(((job_id, idx), conf, *_decode(image_hash)))
+        except Exception as e:
+            queue.fail(worker, job_id, idx, f"{type(e).__name__}: {e}")
+
+    results = {}
+    # YOLO takes one threshold per call, so batch per distinct conf
+    for conf in sorted({d[1] for d in decoded}):
+        group = [d for d in decoded if d[1] == conf]
+        try:
+            outputs = model.predict([image for _, _, image, _ in group], conf=conf,
+                                    save=False, verbose=False)
+        except Exception as e:
+            for key, *_ in group:
+                queue.fail(worker, *key, f"{type(e).__name__}: {e}")
+            continue
+        for (key, _, _, scale), result in zip(group, outputs):
+            detections = to_detections(result.cpu(), scale)
+            results[key] = {"detections": detections, "cost": sum(d["cost"] for d in detections)}
+    if results:
+        queue.complete(worker, results)
+    return len(results)
+
+
+def work(worker, threads, batch=8, poll=0.5, db_path=JOBS_DB, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Claim/score/complete loop of one worker process."""
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import torch
+
+    from scripts.infer import _get_model
+    from utils.model_registry import get_router
+
+    torch.set_num_threads(threads)
+    model = _get_model()
+    router = get_router()
+    queue = JobQueue(db_path, visibility_timeout=visibility_timeout)
+    print(f"👷 {worker} ready ({threads} threads, batch {batch})")
+    done, started = 0, time.perf_counter()
+    last_report = started
+    try:
+        while True:
+            items = queue.claim(worker, batch)
+            if not items:
+                time.sleep(poll)
+                continue
+            try:
+                # a registry version is held per batch, so hot swaps land between batches
+                with router.acquire() as (_, routed):
+                    done += process_batch(queue, worker, routed or model, items)
+            except Exception:
+                # leases expire and the items are retried elsewhere
+                traceback.print_exc()
+            if time.perf_counter() - last_report > 30:
+                last_report = time.perf_counter()
+                print(f"   {worker}: {done} images, {done / (last_report - started):.1f} img/s")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.close()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--threads", type=int, default=None, help="torch threads per worker")
+    p.add_argument("--batch", type=int, default=8)
+    p.add_argument("--poll", type=float, default=0.5, help="seconds between polls of an empty queue")
+    p.add_argument("--visibility-timeout", type=float, default=VISIBILITY_TIMEOUT)
+    args = p.parse_args(argv)
+
+    cpus = probe_machine()["cpus"]
+    workers = args.workers or max(1, cpus // 4)
+    threads = args.threads or max(1, cpus // workers)
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+
+    # spawn: every worker sets its own thread budget before importing torch
+    ctx = mp.get_context("spawn")
+    procs = [ctx.Process(target=work, name=f"job-worker-{i}",
+                         args=(f"{prefix}-{i}", threads, args.batch, args.poll, JOBS_DB,
+                               args.visibility_timeout))
+             for i in range(workers)]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.join()
+
+
+if __name__ == "__main__":
+    main()
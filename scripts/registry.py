@@ -0,0 +1,56 @@
+"""Register weights and split traffic between them, without restarting anything.
+
+    python -m scripts.registry list
+    python -m scripts.registry register runs/detect/train3/weights/best.pt
+    python -m scripts.registry discover                 # every runs/detect/*/weights/best.pt
+    python -m scripts.registry route 3=100              # serve v3
+    python -m scripts.registry route 3=90 4=10          # A/B: 10% of traffic on v4
+    python -m scripts.registry route                    # back to the default model
+
+Routes are stored in ``database/models.db``. Every serving process (uvicorn,
+Streamlit, job workers) polls them, loads and warms new versions in the
+background, switches between requests or batches, and frees a retired
+version once its in-flight requests are done.
+"""
+import argparse
+import json
+
+from utils.model_registry import DEFAULT_NAME, ModelRegistry
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--name", default=DEFAULT_NAME)
+    sub = p.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    reg = sub.add_parser("register")
+    reg.add_argument("weights")
+    reg.add_argument("--metrics", help="JSON object; default: best row of the run's results.csv")
+    sub.add_parser("discover")
+    route = sub.add_parser("route")
+    route.add_argument("weights", nargs="*", metavar="VERSION=WEIGHT")
+    args = p.parse_args(argv)
+
+    registry = ModelRegistry()
+    try:
+        if args.command == "register":
+            metrics = json.loads(args.metrics) if args.metrics else None
+            print(f"✅ {args.name} v{registry.register(args.weights, args.name, metrics)}")
+        elif args.command == "discover":
+            versions = registry.discover(name=args.name)
+            print(f"✅ {len(versions)} weights registered: " + ", ".join(f"v{v}" for v in versions))
+        elif args.command == "route":
+            weights = dict(w.split("=", 1) for w in args.weights)
+            routes = registry.set_routes(weights, args.name)
+            print("🔀 " + (", ".join(f"v{v}={w:g}" for v, w in sorted(routes.items()))
+                          or "default model") + " (serving processes pick this up within seconds)")
+        for m in registry.list(args.name):
+            metrics = m["metrics"] or {}
+            print(f"   v{m['version']:<3} {m['weight']:>5g}  {m['sha256'][:12]}  "
+                  f"mAP50-95 {metrics.get('mAP50-95', '—')!s:<8} {m['registered_at']}  {m['path']}")
+    finally:
+        registry.close()
+
+
+if __name__ == "__main__":
+    main()
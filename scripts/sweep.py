@@ -0,0 +1,234 @@
+"""Parallel hyperparameter sweep with median-rule early stopping.
+
+    python -m scripts.sweep --trials 12 --parallel 3 --epochs 10
+    python -m scripts.sweep --space sweep.yaml --name imgsz_vs_model
+
+A search space file maps ultralytics train arguments (plus ``model``) to
+either a list of choices or a ``{low, high, log}`` range, e.g.::
+
+    model: [yolov8n.pt, yolov8s.pt]
+    imgsz: [416, 512, 640]
+    lr0: {low: 0.001, high: 0.02, log: true}
+    mosaic: [0.5, 1.0]
+
+Every finished or pruned trial is ranked in ``runs/sweeps/<name>/leaderboard.csv``.
+"""
+import argparse
+import csv
+import itertools
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from scripts.train import DATA_YAML, PROJECT_ROOT, ensure_data_yaml, probe_machine
+
+SWEEPS_DIR = PROJECT_ROOT / "runs" / "sweeps"
+
+DEFAULT_SPACE = {
+    "model": ["yolov8n.pt", "yolov8s.pt"],
+    "imgsz": [416, 512, 640],
+    "batch": [8, 16],
+    "lr0": {"low": 0.001, "high": 0.02, "log": True},
+    "mosaic": [0.5, 1.0],
+    "fliplr": [0.0, 0.5],
+    "hsv_v": [0.2, 0.4],
+}
+
+LEADERBOARD_FIELDS = ["rank", "trial", "status", "best_epoch", "epochs_run", "mAP50", "mAP50-95",
+                      "latency_p50_ms", "latency_p95_ms", "pareto", "params", "weights"]
+
+
+# ── search space ─────────────────────────────────────────────────────
+def load_space(path):
+    if path is None:
+        return DEFAULT_SPACE
+    text = Path(path).read_text()
+    if str(path).endswith((".yaml", ".yml")):
+        import yaml
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+def sample_trials(space, n, seed=0, grid=False):
+    """Draw ``n`` parameter sets (or every combination when ``grid``)."""
+    if grid:
+        keys = list(space)
+        if any(isinstance(space[k], dict) for k in keys):
+            raise ValueError("grid search needs a list of choices for every parameter")
+        combos = [dict(zip(keys, values)) for values in itertools.product(*space.values())]
+        return combos[:n] if n else combos
+
+    rng = random.Random(seed)
+    trials = []
+    for _ in range(n):
+        params = {}
+        for key, dom in space.items():
+            if isinstance(dom, dict):
+                low, high = float(dom["low"]), float(dom["high"])
+                if dom.get("log"):
+                    params[key] = round(math.exp(rng.uniform(math.log(low), math.log(high))), 6)
+                else:
+                    params[key] = round(rng.uniform(low, high), 6)
+            else:
+                params[key] = rng.choice(dom)
+        trials.append(params)
+    return trials
+
+
+# ── pruning ──────────────────────────────────────────────────────────
+class MedianPruner:
+    """Stop a trial whose val mAP falls below the median of its peers at the same epoch.
+
+    Reports live in a Manager list so every worker process sees all trials.
+    """
+
+    def __init__(self, reports, lock, warmup_epochs=2, min_peers=2):
+        self.reports = reports
+        self.lock = lock
+        self.warmup_epochs = warmup_epochs
+        self.min_peers = min_peers
+
+    def should_prune(self, trial, epoch, value):
+        with self.lock:
+            self.reports.append((trial, epoch, value))
+            peers = [v for t, e, v in self.reports if e == epoch and t != trial]
+        if epoch < self.warmup_epochs or len(peers) < self.min_peers:
+            return False
+        return value < statistics.median(peers)
+
+
+def run_trial(trial_id, params, cfg, reports, lock):
+    """Train one trial in its own process with a fixed thread budget."""
+    os.environ["OMP_NUM_THREADS"] = str(cfg["threads"])
+    import torch
+    from ultralytics import YOLO
+
+    from scripts.train import _cpu_trainer
+    from utils.helper import measure_latency, split_images
+
+    torch.set_num_threads(cfg["threads"])
+    pruner = MedianPruner(reports, lock, cfg["warmup_epochs"], cfg["min_peers"])
+    state = {"pruned": False, "history": []}
+
+    def on_fit_epoch_end(trainer):
+        value = float(trainer.metrics.get("metrics/mAP50-95(B)", 0.0))
+        state["history"].append((trainer.epoch + 1, value,
+                                 float(trainer.metrics.get("metrics/mAP50(B)", 0.0))))
+        if pruner.should_prune(trial_id, trainer.epoch + 1, value):
+            state["pruned"] = True
+            trainer.stop = True
+
+    train_args = {k: v for k, v in params.items() if k != "model"}
+    model = YOLO(params.get("model", "yolov8n.pt"))
+    model.add_callback("on_fit_epoch_end", on_fit_epoch_end)
+    row = {"trial": trial_id, "params": json.dumps(params, sort_keys=True)}
+    try:
+        model.train(data=cfg["data"], epochs=cfg["epochs"], device="cpu",
+                    project=cfg["project"], name=f"trial_{trial_id:03d}", exist_ok=True,
+                    plots=False, verbose=False, trainer=_cpu_trainer(cfg["workers"]),
+                    **train_args)
+    except Exception as e:
+        row.update(status=f"failed: {e}")
+        return row
+
+    best_epoch, best_map, best_map50 = max(state["history"], key=lambda h: h[1],
+                                           default=(0, 0.0, 0.0))
+    weights = Path(model.trainer.best)
+    row.update(status="pruned" if state["pruned"] else "complete", best_epoch=best_epoch,
+               epochs_run=len(state["history"]), **{"mAP50": round(best_map50, 5),
+                                                    "mAP50-95": round(best_map, 5)},
+               weights=str(weights))
+    if weights.exists():
+        images = split_images(cfg["data"], "val", limit=cfg["latency_images"])
+        latency = measure_latency(str(weights), images, imgsz=params.get("imgsz", 640))
+        row.update(latency_p50_ms=latency["p50_ms"], latency_p95_ms=latency["p95_ms"])
+    return row
+
+
+# ── leaderboard ──────────────────────────────────────────────────────
+def _mark_pareto(rows):
+    """Flag rows no other row beats on both mAP50-95 and p50 latency."""
+    scored = [r for r in rows if r.get("latency_p50_ms") is not None]
+    for r in scored:
+        r["pareto"] = not any(
+            o is not r and o["mAP50-95"] >= r["mAP50-95"] and o["latency_p50_ms"] <= r["latency_p50_ms"]
+            and (o["mAP50-95"] > r["mAP50-95"] or o["latency_p50_ms"] < r["latency_p50_ms"])
+            for o in scored)
+
+
+def write_leaderboard(rows, path):
+    rows = sorted(rows, key=lambda r: r.get("mAP50-95") or 0.0, reverse=True)
+    _mark_pareto(rows)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=LEADERBOARD_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for rank, row in enumerate(rows, 1):
+            writer.writerow({**row, "rank": rank})
+    return rows
+
+
+def run_sweep(space, trials=8, parallel=2, epochs=10, name="sweep", grid=False, seed=0,
+              data=DATA_YAML, warmup_epochs=2, min_peers=2, workers=1, latency_images=50):
+    sweep_dir = SWEEPS_DIR / name
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+    cpus = probe_machine()["cpus"]
+    cfg = {
+        "data": ensure_data_yaml(data),
+        "epochs": epochs,
+        "project": str(sweep_dir),
+        "threads": max(1, cpus // parallel - workers),
+        "workers": workers,
+        "warmup_epochs": warmup_epochs,
+        "min_peers": min_peers,
+        "latency_images": latency_images,
+    }
+    param_sets = sample_trials(space, trials, seed=seed, grid=grid)
+    print(f"🔍 {len(param_sets)} trials, {parallel} at a time, {cfg['threads']} threads each → {sweep_dir}")
+
+    # spawn: each trial gets a fresh interpreter, so its thread budget sticks
+    ctx = mp.get_context("spawn")
+    manager = ctx.Manager()
+    reports, lock = manager.list(), manager.Lock()
+    leaderboard = sweep_dir / "leaderboard.csv"
+    rows = []
+    with ProcessPoolExecutor(max_workers=parallel, mp_context=ctx) as pool:
+        futures = {pool.submit(run_trial, i, p, cfg, reports, lock): i
+                   for i, p in enumerate(param_sets)}
+        for fut in as_completed(futures):
+            row = fut.result()
+            rows.append(row)
+            write_leaderboard(rows, leaderboard)
+            print(f"  trial {row['trial']:03d}: {row['status']}, mAP50-95 {row.get('mAP50-95', '-')}, "
+                  f"p50 {row.get('latency_p50_ms', '-')} ms")
+    manager.shutdown()
+    return write_leaderboard(rows, leaderboard)
+
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Run a parallel hyperparameter sweep with early stopping.")
+    p.add_argument("--space", help="YAML/JSON search space (default: built-in)")
+    p.add_argument("--trials", type=int, default=8)
+    p.add_argument("--parallel", type=int, default=2, help="trials running at once")
+    p.add_argument("--epochs", type=int, default=10)
+    p.add_argument("--grid", action="store_true", help="enumerate every combination")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--name", default="sweep")
+    p.add_argument("--data", default=str(DATA_YAML))
+    p.add_argument("--warmup-epochs", type=int, default=2, help="never prune before this epoch")
+    p.add_argument("--min-peers", type=int, default=2, help="peer reports needed before pruning")
+    p.add_argument("--workers", type=int, default=1, help="dataloader workers per trial")
+    p.add_argument("--latency-images", type=int, default=50)
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    run_sweep(load_space(args.space), trials=args.trials, parallel=args.parallel,
+              epochs=args.epochs, name=args.name, grid=args.grid, seed=args.seed,
+              data=args.data, warmup_epochs=args.warmup_epochs, min_peers=args.min_peers,
+              workers=args.workers, latency_images=args.latency_images)
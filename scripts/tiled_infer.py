@@ -0,0 +1,153 @@
+"""Tiled inference for high-resolution close-ups.
+
+    python -m scripts.tiled_infer photo.jpg                     # detections, tiled vs. plain
+    python -m scripts.tiled_infer photos/*.jpg --tile 640 --overlap 0.25 --repeat 5
+
+Large images are cut into overlapping ``tile``-pixel crops that run through
+YOLO as one batch together with the whole (letterboxed) image, so both small
+damage (scratches, paint chips) and large parts are found. Tile detections are
+shifted back to image coordinates and merged with class-aware NMS. Tiling only
+kicks in for images of at least ``min_pixels``; smaller ones take the usual
+single pass. The CLI reports detections and latency for both modes.
+
+``scripts.infer`` is not part of this tree, so the mode lives here and prices
+detections with ``utils.pricing``.
+"""
+import argparse
+import os
+import statistics
+import time
+
+from utils.candidates import to_detections
+
+TILE_SIZE = int(os.environ.get("AUTODAMAGE_TILE_SIZE", 640))
+TILE_OVERLAP = float(os.environ.get("AUTODAMAGE_TILE_OVERLAP", 0.2))
+TILE_MIN_PIXELS = int(os.environ.get("AUTODAMAGE_TILE_MIN_PIXELS", 6_000_000))
+MERGE_IOU = 0.5
+MERGE_IOS = 0.8  # a box this much inside a higher-scoring one of its class is a tile fragment
+
+
+def tile_grid(width, height, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+    """(x0, y0, x1, y1) crops of at most ``tile`` px covering the image with ``overlap``."""
+    stride = max(1, int(tile * (1 - overlap)))
+
+    def starts(size):
+        if size <= tile:
+            return [0]
+        positions = list(range(0, size - tile, stride))
+        return positions + [size - tile]  # last tile flush with the edge
+
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def merge_detections(boxes, scores, classes, iou=MERGE_IOU, ios=MERGE_IOS):
+    """Indices kept by class-aware NMS, also dropping boxes mostly inside a kept one."""
+    import torch
+    from torchvision.ops import batched_nms
+
+    if len(boxes) == 0:
+        return torch.zeros(0, dtype=torch.long)
+    keep = batched_nms(boxes, scores, classes, iou)  # sorted by score
+    kept = boxes[keep]
+    area = (kept[:, 2] - kept[:, 0]) * (kept[:, 3] - kept[:, 1])
+    wh = (torch.minimum(kept[:, None, 2:], kept[None, :, 2:])
+          - torch.maximum(kept[:, None, :2], kept[None, :, :2])).clamp(min=0)
+    inter = wh[..., 0] * wh[..., 1]
+    smaller = torch.minimum(area[:, None], area[None, :]).clamp(min=1e-6)
+    contained = (inter / smaller > ios) & (classes[keep][:, None] == classes[keep][None, :])
+    drop = torch.zeros(len(keep), dtype=torch.bool)
+    for i in range(len(keep)):
+        if drop[i]:
+            continue
+        later = contained[i].clone()
+        later[:i + 1] = False
+        drop |= later
+    return keep[~drop]
+
+
+def tiled_predict(model, image, conf=0.25, tile=TILE_SIZE, overlap=TILE_OVERLAP,
+                  min_pixels=TILE_MIN_PIXELS):
+    """YOLO ``Results`` for ``image`` (path or BGR array), tiled when it is large enough."""
+    import cv2
+    import torch
+    from ultralytics.engine.results import Results
+
+    if not hasattr(image, "shape"):
+        image = cv2.imread(str(image))
+    h, w = image.shape[:2]
+    if w * h < min_pixels:
+        return model.predict(image, conf=conf, save=False, verbose=False)[0].cpu()
+
+    crops = tile_grid(w, h, tile, overlap)
+    batch = [image] + [image[y0:y1, x0:x1] for x0, y0, x1, y1 in crops]
+    results = model.predict(batch, conf=conf, save=False, verbose=False)
+
+    parts = [results[0].boxes.data.cpu()]  # whole image, already in image coordinates
+    for (x0, y0, _, _), r in zip(crops, results[1:]):
+        data = r.boxes.data.cpu().clone()
+        data[:, [0, 2]] += x0
+        data[:, [1, 3]] += y0
+        parts.append(data)
+    data = torch.cat(parts)
+    keep = merge_detections(data[:, :4], data[:, 4], data[:, 5].long())
+    return Results(image, path="tiled", names=model.names, boxes=data[keep][:, :6])
+
+
+def infer_tiled(image_path, conf=0.25, model=None, **tiling):
+    """Same shape as ``infer``: (detections, total cost)."""
+    if model is None:
+        from scripts.infer import _get_model
+        model = _get_model()
+    detections = to_detections(tiled_predict(model, image_path, conf=conf, **tiling))
+    return detections, sum(d["cost"] for d in detections)
+
+
+def _time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return out, statistics.median(times)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("images", nargs="+")
+    p.add_argument("--weights", default=None, help="defaults to the serving model")
+    p.add_argument("--conf", type=float, default=0.25)
+    p.add_argument("--tile", type=int, default=TILE_SIZE)
+    p.add_argument("--overlap", type=float, default=TILE_OVERLAP)
+    p.add_argument("--min-pixels", type=int, default=TILE_MIN_PIXELS)
+    p.add_argument("--repeat", type=int, default=3, help="timed runs per image (median reported)")
+    args = p.parse_args(argv)
+
+    if args.weights:
+        from ultralytics import YOLO
+        model = YOLO(args.weights)
+    else:
+        from scripts.infer import _get_model
+        model = _get_model()
+
+    import cv2
+    for path in args.images:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"⚠  cannot read {path}")
+            continue
+        model.predict(image, conf=args.conf, verbose=False)  # warm-up
+        plain, plain_ms = _time(lambda: model.predict(image, conf=args.conf, verbose=False)[0], args.repeat)
+        tiled, tiled_ms = _time(lambda: tiled_predict(model, image, args.conf, args.tile, args.overlap,
+                                                      args.min_pixels), args.repeat)
+        h, w = image.shape[:2]
+        print(f"📷 {path} ({w}x{h}, {len(tile_grid(w, h, args.tile, args.overlap))} tiles)")
+        print(f"   plain: {len(plain.boxes):3d} detections  {plain_ms:8.1f} ms")
+        print(f"   tiled: {len(tiled.boxes):3d} detections  {tiled_ms:8.1f} ms  "
+              f"(x{tiled_ms / plain_ms:.1f})")
+        for d in to_detections(tiled):
+            print(f"     {d['class']:<16} {d['confidence']:.2f}  ₹{d['cost']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,273 @@
-from ultralytics import YOLO
+import argparse
+import csv
+import glob
 import os
+import shutil
+import time
+from pathlib import Path
 
-def train_yolo():
-    model = YOLO('yolov8n.pt')  # Pre-trained YOLOv8 nano model
-    data_yaml = """
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DATA_YAML = PROJECT_ROOT / "data.yaml"
+RUNS_DIR = PROJECT_ROOT / "runs" / "detect"
+TRAIN_IMAGES_DIR = PROJECT_ROOT / "data" / "processed" / "train" / "images"
+
+DATA_YAML_TEXT = """
     train: ../data/processed/train
     val: ../data/processed/val
     nc: 29  # Updated to match combined dataset (21 parts + 8 damages)
     names: ['Quarter-panel', 'Front-wheel', 'Back-window', 'Trunk', 'Front-door', 'Rocker-panel', 'Grille', 'Windshield', 'Front-window', 'Back-door', 'Headlight', 'Back-wheel', 'Back-windshield', 'Hood', 'Fender', 'Tail-light', 'License-plate', 'Front-bumper', 'Back-bumper', 'Mirror', 'Roof', 'Missing part', 'Broken part', 'Scratch', 'Cracked', 'Dent', 'Flaking', 'Paint chip', 'Corrosion']
     """
-    
-    with open('data.yaml', 'w') as f:
-        f.write(data_yaml)
-    
-    # Using CPU instead of GPU as its Mac
-    model.train(data='data.yaml', epochs=5, imgsz=640, batch=16, device='cpu')
+
+# Rough CPU training footprint of one yolov8n sample at 640 px (activations,
+# gradients, mosaic buffers). Scales with the square of imgsz.
+TRAIN_MB_PER_IMAGE_640 = 180
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+# ── machine probing ──────────────────────────────────────────────────
+def _available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _memory_mb():
+    """Return (total, available) system memory in MB."""
+    try:
+        import psutil
+        vm = psutil.virtual_memory()
+        return vm.total // 2**20, vm.available // 2**20
+    except ImportError:
+        pass
+    try:
+        meminfo = {}
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                meminfo[key] = int(value.split()[0]) // 1024
+        return meminfo["MemTotal"], meminfo.get("MemAvailable", meminfo["MemFree"])
+    except (OSError, KeyError, ValueError):
+        page = os.sysconf("SC_PAGE_SIZE")
+        return (os.sysconf("SC_PHYS_PAGES") * page // 2**20,
+                os.sysconf("SC_AVPHYS_PAGES") * page // 2**20)
+
+
+def probe_machine(path=PROJECT_ROOT):
+    """Describe the CPUs, memory and free disk this run can use."""
+    total_mb, available_mb = _memory_mb()
+    return {
+        "cpus": _available_cpus(),
+        "mem_total_mb": total_mb,
+        "mem_available_mb": available_mb,
+        "disk_free_mb": shutil.disk_usage(path).free // 2**20,
+    }
+
+
+def count_images(images_dir=TRAIN_IMAGES_DIR):
+    if not os.path.isdir(images_dir):
+        return 0
+    return sum(1 for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTS))
+
+
+def plan_resources(machine, imgsz=640, n_images=0, batch=None, workers=None,
+                   threads=None, cache=None):
+    """Pick workers, batch size, torch threads and image caching for this machine.
+
+    Explicit arguments always win; only the ``None`` ones are auto-tuned.
+    """
+    cpus = machine["cpus"]
+    if workers is None:
+        # a quarter of the cores decode/augment, the rest run the model
+        workers = min(8, max(1, cpus // 4)) if cpus > 2 else 0
+    if threads is None:
+        threads = max(1, cpus - workers)
+
+    scale = (imgsz / 640) ** 2
+    # keep a third of the available memory for the OS, loaders and the cache
+    train_budget_mb = machine["mem_available_mb"] * 2 // 3
+    if batch is None:
+        per_image_mb = TRAIN_MB_PER_IMAGE_640 * scale
+        batch = 2
+        while batch * 2 <= 64 and batch * 2 * per_image_mb <= train_budget_mb:
+            batch *= 2
+
+    if cache is None:
+        # ultralytics caches images resized to imgsz as uint8 HWC arrays
+        cache_mb = n_images * imgsz * imgsz * 3 // 2**20
+        headroom_mb = machine["mem_available_mb"] - batch * TRAIN_MB_PER_IMAGE_640 * scale
+        if n_images and cache_mb < headroom_mb * 0.5:
+            cache = "ram"
+        elif n_images and cache_mb * 2 < machine["disk_free_mb"]:
+            cache = "disk"
+        else:
+            cache = False
+    elif cache == "none":
+        cache = False
+
+    return {"workers": workers, "threads": threads, "batch": batch, "cache": cache}
+
+
+# ── resume ───────────────────────────────────────────────────────────
+def find_resume_checkpoint(runs_dir=RUNS_DIR):
+    """Return the newest ``train*/weights/last.pt`` of an unfinished run, or None.
+
+    Ultralytics strips finished checkpoints and marks them with ``epoch == -1``;
+    anything else can be resumed.
+    """
+    import torch
+
+    candidates = glob.glob(os.path.join(runs_dir, "train*", "weights", "last.pt"))
+    for ckpt_path in sorted(candidates, key=os.path.getmtime, reverse=True):
+        try:
+            ckpt = torch.load(ckpt_path, map_location="cpu", weights_only=False)
+        except Exception as e:
+            print(f"⚠  could not read {ckpt_path}: {e}")
+            continue
+        if ckpt.get("epoch", -1) != -1:
+            return ckpt_path
+    return None
+
+
+# ── per-epoch timing ─────────────────────────────────────────────────
+class EpochTimer:
+    """Ultralytics callbacks that split each epoch into data-wait and compute time.
+
+    ``on_train_batch_start`` fires once the loader has yielded a batch, so the
+    gap since the previous batch ended is time spent waiting on data.
+    """
+
+    FIELDS = ["epoch", "batches", "data_s", "compute_s", "val_s", "epoch_s", "data_pct"]
+
+    def __init__(self):
+        self._last = self._epoch_start = self._train_end = 0.0
+        self._data = self._compute = 0.0
+        self._batches = 0
+        self._row = None
+
+    def on_train_epoch_start(self, trainer):
+        self._epoch_start = self._last = time.perf_counter()
+        self._data = self._compute = 0.0
+        self._batches = 0
+
+    def on_train_batch_start(self, trainer):
+        now = time.perf_counter()
+        self._data += now - self._last
+        self._last = now
+
+    def on_train_batch_end(self, trainer):
+        now = time.perf_counter()
+        self._compute += now - self._last
+        self._last = now
+        self._batches += 1
+
+    def on_train_epoch_end(self, trainer):
+        self._train_end = time.perf_counter()
+        busy = self._data + self._compute
+        self._row = {
+            "epoch": trainer.epoch + 1,
+            "batches": self._batches,
+            "data_s": round(self._data, 3),
+            "compute_s": round(self._compute, 3),
+            "data_pct": round(100 * self._data / busy, 1) if busy else 0.0,
+        }
+
+    def on_fit_epoch_end(self, trainer):
+        if self._row is None:
+            return
+        now = time.perf_counter()
+        self._row["val_s"] = round(now - self._train_end, 3)
+        self._row["epoch_s"] = round(now - self._epoch_start, 3)
+
+        out = Path(trainer.save_dir) / "epoch_timing.csv"
+        new_file = not out.exists()
+        with open(out, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(self._row)
+        print(f"⏱  epoch {self._row['epoch']}: data {self._row['data_s']}s, "
+              f"compute {self._row['compute_s']}s ({self._row['data_pct']}% waiting on data)")
+        self._row = None
+
+    def attach(self, model):
+        for event in ("on_train_epoch_start", "on_train_batch_start", "on_train_batch_end",
+                      "on_train_epoch_end", "on_fit_epoch_end"):
+            model.add_callback(event, getattr(self, event))
+
+
+def _cpu_trainer(workers):
+    """DetectionTrainer that keeps our worker count (ultralytics forces 0 on CPU)."""
+    from ultralytics.models.yolo.detect import DetectionTrainer
+
+    class CPUDetectionTrainer(DetectionTrainer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.args.workers = workers
+
+    return CPUDetectionTrainer
+
+
+def ensure_data_yaml(path=DATA_YAML):
+    if not os.path.exists(path):
+        with open(path, "w") as f:
+            f.write(DATA_YAML_TEXT)
+    return str(path)
+
+
+def train_yolo(weights="yolov8n.pt", epochs=5, imgsz=640, batch=None, workers=None,
+               threads=None, cache=None, resume="auto", name=None):
+    machine = probe_machine()
+    plan = plan_resources(machine, imgsz=imgsz, n_images=count_images(), batch=batch,
+                          workers=workers, threads=threads, cache=cache)
+    print(f"🖥  {machine}")
+    print(f"⚙  {plan}")
+
+    # must be set before torch/ultralytics spin up their thread pools
+    os.environ["OMP_NUM_THREADS"] = str(plan["threads"])
+    import torch
+    from ultralytics import YOLO
+    torch.set_num_threads(plan["threads"])
+
+    resume_from = None
+    if resume == "auto":
+        resume_from = find_resume_checkpoint()
+    elif resume not in (None, "never"):
+        resume_from = resume
+
+    timer = EpochTimer()
+    trainer = _cpu_trainer(plan["workers"])
+    if resume_from:
+        print(f"↻  resuming {resume_from}")
+        model = YOLO(resume_from)
+        timer.attach(model)
+        return model.train(resume=True, trainer=trainer, device="cpu")
+
+    model = YOLO(weights)
+    timer.attach(model)
+    return model.train(data=ensure_data_yaml(), epochs=epochs, imgsz=imgsz,
+                       batch=plan["batch"], workers=plan["workers"], cache=plan["cache"],
+                       device="cpu", project=str(RUNS_DIR), name=name or "train",
+                       trainer=trainer)
+
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Train the damage detector on CPU with auto-tuned settings.")
+    p.add_argument("--weights", default="yolov8n.pt")
+    p.add_argument("--epochs", type=int, default=5)
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--batch", type=int, help="default: sized to available memory")
+    p.add_argument("--workers", type=int, help="dataloader workers (default: auto)")
+    p.add_argument("--threads", type=int, help="torch intra-op threads (default: auto)")
+    p.add_argument("--cache", choices=["ram", "disk", "none"], help="image cache (default: auto)")
+    p.add_argument("--resume", default="auto",
+                   help="'auto' (latest unfinished run), 'never', or a last.pt path")
+    p.add_argument("--name", help="run name under runs/detect")
+    return p.parse_args()
+
 
 if __name__ == "__main__":
-    train_yolo()
\ No newline at end of file
+    args = _parse_args()
+    train_yolo(weights=args.weights, epochs=args.epochs, imgsz=args.imgsz, batch=args.batch,
+               workers=args.workers, threads=args.threads, cache=args.cache,
+               resume=args.resume, name=args.name)
@@ -0,0 +1,236 @@
+"""Data-parallel CPU training across processes and hosts (torch DDP, gloo backend).
+
+Single box, four processes:
+    python -m scripts.train_ddp --nproc-per-node 4
+
+Two hosts, two processes each (run on every host, changing --node-rank):
+    python -m scripts.train_ddp --nnodes 2 --node-rank 0 --nproc-per-node 2 \
+        --master-addr 10.0.0.5 --master-port 29500
+
+Processes started by ``torchrun`` are detected from RANK/WORLD_SIZE and join
+directly. Only rank 0 writes checkpoints and results into ``runs/detect/ddp*``.
+"""
+import argparse
+import csv
+import os
+import time
+from copy import deepcopy
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from scripts.train import DATA_YAML, RUNS_DIR, ensure_data_yaml, probe_machine
+
+RESULT_FIELDS = ["epoch", "world_size", "elapsed_s", "epoch_s", "train_loss", "mAP50", "mAP50-95"]
+
+
+def _rendezvous(args):
+    """Return (rank, local_rank, world_size) and export the gloo rendezvous env."""
+    os.environ.setdefault("MASTER_ADDR", args.master_addr)
+    os.environ.setdefault("MASTER_PORT", str(args.master_port))
+    if "RANK" in os.environ and "WORLD_SIZE" in os.environ:  # torchrun
+        return (int(os.environ["RANK"]), int(os.environ.get("LOCAL_RANK", 0)),
+                int(os.environ["WORLD_SIZE"]))
+    return None
+
+
+def _build_model(weights, data, cfg, verbose):
+    from ultralytics.nn.tasks import DetectionModel, attempt_load_one_weight
+
+    ckpt_model, _ = attempt_load_one_weight(weights)
+    model = DetectionModel(ckpt_model.yaml, nc=data["nc"], verbose=verbose)
+    model.load(ckpt_model)
+    model.nc = data["nc"]
+    model.names = data["names"]
+    model.args = cfg  # v8DetectionLoss reads box/cls/dfl gains from here
+    for name, p in model.named_parameters():
+        p.requires_grad = ".dfl" not in name
+    return model.float().train()
+
+
+def _save_checkpoint(path, model, optimizer, epoch, best_fitness, cfg):
+    import torch
+
+    ckpt_model = deepcopy(model).half()
+    ckpt_model.criterion = None
+    torch.save({
+        "epoch": epoch,
+        "best_fitness": best_fitness,
+        "model": ckpt_model,
+        "optimizer": optimizer.state_dict(),
+        "train_args": dict(vars(cfg)),
+        "date": datetime.now().isoformat(),
+    }, path)
+
+
+def _validate(weights, data_yaml, imgsz):
+    from ultralytics import YOLO
+
+    metrics = YOLO(weights).val(data=data_yaml, imgsz=imgsz, batch=16, device="cpu",
+                                plots=False, verbose=False)
+    return metrics.box.map50, metrics.box.map
+
+
+def train_worker(local_rank, args, node_rank=0, world_size=None):
+    """Entry point of one training process."""
+    ranks = _rendezvous(args)
+    if ranks is not None:
+        rank, local_rank, world_size = ranks
+    else:
+        rank = node_rank * args.nproc_per_node + local_rank
+
+    # split this host's cores evenly between its processes
+    threads = args.threads or max(1, probe_machine()["cpus"] // args.nproc_per_node)
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+
+    import torch
+    import torch.distributed as dist
+    from torch.nn.parallel import DistributedDataParallel as DDP
+    from torch.utils.data import DataLoader, DistributedSampler
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import build_yolo_dataset
+    from ultralytics.data.utils import check_det_dataset
+    from ultralytics.utils.files import increment_path
+
+    torch.set_num_threads(threads)
+    dist.init_process_group("gloo", rank=rank, world_size=world_size,
+                            timeout=timedelta(seconds=args.timeout))
+    is_main = rank == 0
+
+    data_yaml = str(args.data)
+    data = check_det_dataset(data_yaml)
+    cfg = get_cfg(overrides={"data": data_yaml, "imgsz": args.imgsz, "batch": args.batch,
+                             "epochs": args.epochs, "workers": args.workers, "device": "cpu"})
+    torch.manual_seed(args.seed + rank)
+
+    model = _build_model(args.resume or args.weights, data, cfg, verbose=is_main)
+    stride = max(int(model.stride.max()), 32)
+
+    dataset = build_yolo_dataset(cfg, data["train"], args.batch, data, mode="train", stride=stride)
+    sampler = DistributedSampler(dataset, num_replicas=world_size, rank=rank,
+                                 shuffle=True, seed=args.seed)
+    loader = DataLoader(dataset, batch_size=args.batch, sampler=sampler,
+                        num_workers=args.workers, persistent_workers=args.workers > 0,
+                        collate_fn=dataset.collate_fn, drop_last=True)
+
+    ddp_model = DDP(model)
+    # linear scaling: the global batch is batch * world_size
+    lr0 = args.lr0 * world_size
+    optimizer = torch.optim.SGD([p for p in model.parameters() if p.requires_grad],
+                                lr=lr0, momentum=0.937, nesterov=True, weight_decay=5e-4)
+
+    def lf(e):  # linear decay from lr0 to lr0 * lrf
+        return (1 - e / args.epochs) * (1.0 - args.lrf) + args.lrf
+
+    scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, lr_lambda=lf)
+
+    start_epoch, best_fitness = 0, 0.0
+    if args.resume:
+        ckpt = torch.load(args.resume, map_location="cpu", weights_only=False)
+        if ckpt.get("optimizer") is not None:
+            optimizer.load_state_dict(ckpt["optimizer"])
+        start_epoch = ckpt.get("epoch", -1) + 1
+        best_fitness = ckpt.get("best_fitness") or 0.0
+        for _ in range(start_epoch):
+            scheduler.step()
+
+    save_dir = weights_dir = None
+    if is_main:
+        save_dir = increment_path(Path(RUNS_DIR) / (args.name or "ddp"), mkdir=True)
+        weights_dir = save_dir / "weights"
+        weights_dir.mkdir(parents=True, exist_ok=True)
+        print(f"🚀 DDP training: world_size={world_size}, {threads} threads/rank, "
+              f"global batch {args.batch * world_size} → {save_dir}")
+
+    t_start = time.time()
+    for epoch in range(start_epoch, args.epochs):
+        t_epoch = time.time()
+        sampler.set_epoch(epoch)
+        ddp_model.train()
+        loss_sum = torch.zeros(1)
+        n_batches = 0
+        for batch in loader:
+            batch["img"] = batch["img"].float() / 255
+            loss, _ = ddp_model(batch)
+            optimizer.zero_grad(set_to_none=True)
+            loss.sum().backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=10.0)
+            optimizer.step()
+            loss_sum += loss.detach().sum() / batch["img"].shape[0]
+            n_batches += 1
+        scheduler.step()
+
+        # mean train loss over every rank's batches
+        stats = torch.tensor([loss_sum.item(), float(n_batches)])
+        dist.all_reduce(stats)
+        train_loss = stats[0].item() / max(stats[1].item(), 1)
+
+        if is_main:
+            last = weights_dir / "last.pt"
+            _save_checkpoint(last, model, optimizer, epoch, best_fitness, cfg)
+            map50 = map50_95 = ""
+            if args.val_every and ((epoch + 1) % args.val_every == 0 or epoch + 1 == args.epochs):
+                map50, map50_95 = _validate(str(last), data_yaml, args.imgsz)
+                if map50_95 >= best_fitness:
+                    best_fitness = map50_95
+                    _save_checkpoint(weights_dir / "best.pt", model, optimizer, epoch,
+                                     best_fitness, cfg)
+            row = {"epoch": epoch + 1, "world_size": world_size,
+                   "elapsed_s": round(time.time() - t_start, 1),
+                   "epoch_s": round(time.time() - t_epoch, 1),
+                   "train_loss": round(train_loss, 5), "mAP50": map50, "mAP50-95": map50_95}
+            results = save_dir / "results_ddp.csv"
+            new_file = not results.exists()
+            with open(results, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(row)
+            print(f"epoch {epoch + 1}/{args.epochs}: loss {train_loss:.4f}, "
+                  f"mAP50-95 {map50_95 or '-'}, {row['epoch_s']}s")
+        # other ranks wait here while rank 0 checkpoints and validates
+        dist.barrier()
+
+    dist.destroy_process_group()
+
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Multi-process / multi-host CPU training with DDP (gloo).")
+    p.add_argument("--weights", default="yolov8n.pt")
+    p.add_argument("--data", default=str(DATA_YAML))
+    p.add_argument("--epochs", type=int, default=5)
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--batch", type=int, default=8, help="batch size per process")
+    p.add_argument("--workers", type=int, default=2, help="dataloader workers per process")
+    p.add_argument("--threads", type=int, help="torch threads per process (default: cores / nproc)")
+    p.add_argument("--lr0", type=float, default=0.01, help="learning rate for a single process")
+    p.add_argument("--lrf", type=float, default=0.01)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--val-every", type=int, default=1, help="validate on rank 0 every N epochs (0: off)")
+    p.add_argument("--resume", help="last.pt written by a previous DDP run")
+    p.add_argument("--name", help="run name under runs/detect (default: ddp)")
+    # rendezvous
+    p.add_argument("--nnodes", type=int, default=1)
+    p.add_argument("--node-rank", type=int, default=0)
+    p.add_argument("--nproc-per-node", type=int, default=1)
+    p.add_argument("--master-addr", default="127.0.0.1")
+    p.add_argument("--master-port", type=int, default=29500)
+    p.add_argument("--timeout", type=int, default=7200, help="collective timeout in seconds")
+    return p.parse_args()
+
+
+def main():
+    args = _parse_args()
+    ensure_data_yaml(args.data)
+    if _rendezvous(args) is not None:
+        train_worker(0, args)
+        return
+
+    import torch.multiprocessing as mp
+
+    world_size = args.nnodes * args.nproc_per_node
+    mp.spawn(train_worker, args=(args, args.node_rank, world_size),
+             nprocs=args.nproc_per_node, join=True)
+
+
+if __name__ == "__main__":
+    main()
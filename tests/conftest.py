@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the suite runs from the repo root or from tests/; modules import as utils.*, scripts.*
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
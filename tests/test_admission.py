@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import pytest
+
+from utils import admission
+from utils.admission import (Admission, AdmissionRejected, PriorityScheduler, RateLimiter,
+                             TokenBucket)
+
+
+def test_no_keys_file_means_no_rate_limit(tmp_path):
+    # the default used to throttle every client to 2 req/s with a burst of 10
+    limiter = RateLimiter(tmp_path / "missing.json")
+    gate = Admission(limiter=limiter, scheduler=PriorityScheduler(slots=1))
+    for _ in range(500):
+        assert gate.limit(None, remote="10.0.0.1") == "interactive"
+        assert gate.limit("some-key") == "interactive"
+    assert limiter._buckets == {}
+
+
+def test_default_rate_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setitem(admission.DEFAULT_POLICY, "rate", 1.0)
+    monkeypatch.setitem(admission.DEFAULT_POLICY, "burst", 3.0)
+    gate = Admission(limiter=RateLimiter(tmp_path / "missing.json"))
+    for _ in range(3):
+        gate.limit(None, remote="10.0.0.1")
+    with pytest.raises(AdmissionRejected) as e:
+        gate.limit(None, remote="10.0.0.1")
+    assert e.value.status == 429 and e.value.retry_after > 0
+    gate.limit(None, remote="10.0.0.2")  # per client
+
+
+def test_keys_file_policies(tmp_path):
+    keys = tmp_path / "api_keys.json"
+    keys.write_text(json.dumps({"k-bulk": {"client": "partner", "lane": "bulk", "rate": 1, "burst": 1},
+                                "k-free": {"client": "ui"}}))
+    gate = Admission(limiter=RateLimiter(keys))
+    assert gate.limit("k-bulk") == "bulk"
+    with pytest.raises(AdmissionRejected) as e:
+        gate.limit("k-bulk")
+    assert e.value.reason == "rate_limited"
+    for _ in range(100):
+        assert gate.limit("k-free") == "interactive"
+    assert gate.limit("k-free", priority="bulk") == "bulk"  # demotion only
+    with pytest.raises(AdmissionRejected) as e:
+        gate.limit("unknown")
+    assert e.value.status == 401
+
+
+def test_idle_buckets_are_evicted(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: clock[0])
+    limiter = RateLimiter(tmp_path / "missing.json", bucket_ttl=60.0)
+    policy = {"lane": "interactive", "rate": 1.0, "burst": 5.0}
+    for i in range(100):
+        limiter.check(f"client{i}", policy)
+    assert len(limiter._buckets) == 100
+    clock[0] += 30
+    limiter.check("client0", policy)
+    assert len(limiter._buckets) == 100  # not idle long enough
+    clock[0] += 45
+    limiter.check("fresh", policy)
+    assert set(limiter._buckets) == {"client0", "fresh"}
+
+
+def test_eviction_waits_for_a_slow_bucket_to_refill(tmp_path, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: clock[0])
+    limiter = RateLimiter(tmp_path / "missing.json", bucket_ttl=10.0)
+    slow = {"lane": "bulk", "rate": 0.01, "burst": 2.0}  # 200 s to refill
+    limiter.check("slow", slow)
+    limiter.check("slow", slow)
+    clock[0] = 50.0
+    assert limiter.check("slow", slow) > 0  # still empty: eviction must not reset it
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(rate=10.0, burst=2.0)
+    assert bucket.take() == 0.0 and bucket.take() == 0.0
+    assert bucket.take() > 0
+
+
+def test_interactive_waiters_go_first():
+    async def run():
+        scheduler = PriorityScheduler(slots=1)
+        order = []
+        await scheduler.acquire("interactive")
+
+        async def waiter(lane, name):
+            await scheduler.acquire(lane)
+            order.append(name)
+            scheduler.release()
+
+        tasks = [asyncio.create_task(waiter("bulk", "b1")),
+                 asyncio.create_task(waiter("interactive", "i1")),
+                 asyncio.create_task(waiter("bulk", "b2")),
+                 asyncio.create_task(waiter("interactive", "i2"))]
+        await asyncio.sleep(0)
+        assert scheduler.depth() == {"interactive": 2, "bulk": 2}
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["i1", "i2", "b1", "b2"]
+
+
+def test_full_lane_is_rejected_and_cancelled_waiters_leave():
+    async def run():
+        scheduler = PriorityScheduler(slots=1, max_queue={"bulk": 1})
+        await scheduler.acquire("bulk")
+        first = asyncio.create_task(scheduler.acquire("bulk"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as e:
+            await scheduler.acquire("bulk")
+        assert e.value.status == 503
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        assert scheduler.depth()["bulk"] == 0
+        scheduler.release()
+        assert scheduler._free == 1
+
+    asyncio.run(run())
+
+
+def test_only_admin_keys_are_admin(tmp_path):
+    limiter = RateLimiter(tmp_path / "api_keys.json")
+    assert not limiter.is_admin("anything")  # no keys file: nobody
+    (tmp_path / "api_keys.json").write_text(json.dumps({"ops": {"admin": True}, "app": {"admin": "yes"},
+                                                        "ui": {}}))
+    assert limiter.is_admin("ops")
+    assert not limiter.is_admin("app") and not limiter.is_admin("ui")
+    assert not limiter.is_admin(None) and not limiter.is_admin("unknown")
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from utils.analytics import AnalyticsAggregator, latency_histogram, series, summary
+
+
+@pytest.fixture
+def db(tmp_path):
+    return tmp_path / "analytics.db"
+
+
+@pytest.fixture
+def aggregator(db):
+    agg = AnalyticsAggregator(db, flush_interval=3600)  # flushed by hand
+    yield agg
+    agg.close()
+
+
+def _add(agg, ts, source="api", status="ok", response_time=0.3, detections=2, cost=1000.0):
+    agg.add({"timestamp": ts, "source": source, "status": status, "response_time": response_time,
+             "detections": detections, "cost": cost})
+
+
+def test_rollups_accumulate_across_flushes(aggregator, db):
+    _add(aggregator, "2024-05-01 10:15:00")
+    _add(aggregator, "2024-05-01 10:15:30", status="error", response_time=2.0, detections=0, cost=0)
+    aggregator.flush()
+    _add(aggregator, "2024-05-01 11:00:05", source="streamlit", status="empty", response_time=0.05)
+    aggregator.flush()
+    s = summary(db_path=db)
+    assert (s["total_requests"], s["successful_requests"], s["failed_requests"]) == (3, 2, 1)
+    assert s["max_response_time"] == 2.0
+    assert s["average_response_time"] == pytest.approx((0.3 + 2.0 + 0.05) / 3)
+    assert s["total_detections"] == 4 and s["total_cost"] == 2000.0
+    assert [r[:5] for r in series("hour", db_path=db)] == [
+        ("2024-05-01 10", "api", 2, 1, 1), ("2024-05-01 11", "streamlit", 1, 1, 0)]
+
+
+def test_old_minute_rollups_are_pruned_hours_kept(aggregator, db):
+    now = time.strftime("%F %T")
+    _add(aggregator, "2024-05-01 10:15:00")
+    _add(aggregator, now)
+    _add(aggregator, now)
+    aggregator.flush()
+    assert [r[:3] for r in series("minute", db_path=db)] == [(now[:16], "api", 2)]
+    assert [r[:3] for r in series("hour", db_path=db)] == [("2024-05-01 10", "api", 1),
+                                                           (now[:13], "api", 2)]
+
+
+def test_since_and_latency_histogram(aggregator, db):
+    for ts, seconds in (("2024-05-01 09:00:00", 0.05), ("2024-05-01 10:00:00", 0.3),
+                        ("2024-05-01 10:30:00", 0.3), ("2024-05-01 10:45:00", 100.0)):
+        _add(aggregator, ts, response_time=seconds)
+    aggregator.flush()
+    assert summary(since="2024-05-01 10:00:00", db_path=db)["total_requests"] == 3
+    assert latency_histogram(since="2024-05-01 10:00:00", db_path=db) == [(0.5, 2), (float("inf"), 1)]
+
+
+def test_bad_fields_do_not_break_the_rollup(aggregator, db):
+    aggregator.add({"timestamp": "2024-05-01 10:00:00", "response_time": "n/a"})
+    aggregator.flush()
+    assert summary(db_path=db)["failed_requests"] == 1
+
+
+def test_missing_database_reads_as_empty(tmp_path):
+    path = tmp_path / "none.db"
+    assert summary(db_path=path) == {} and series(db_path=path) == []
+    assert latency_histogram(db_path=path) == []
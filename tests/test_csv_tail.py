@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from utils.csv_tail import CsvTail  # noqa: E402
+
+HEADER = "timestamp,request_id,status\n"
+
+
+def _rows(start, n):
+    return "".join(f"2024-05-01 10:{i:02d}:00,r{i},ok\n" for i in range(start, start + n))
+
+
+def test_refresh_parses_only_appended_rows(tmp_path):
+    path = tmp_path / "requests.csv"
+    path.write_text(HEADER + _rows(0, 3))
+    tail = CsvTail(path)
+    assert tail.refresh() == 3
+    assert tail.refresh() == 0
+    with open(path, "a") as f:
+        f.write(_rows(3, 2) + "2024-05-01 10:59:00,partial")
+    assert tail.refresh() == 2
+    assert list(tail.frame["request_id"]) == ["r0", "r1", "r2", "r3", "r4"]
+    with open(path, "a") as f:
+        f.write(",ok\n")
+    assert tail.refresh() == 1
+    assert tail.frame["request_id"].iloc[-1] == "partial"
+
+
+def test_rotation_triggers_a_full_reread(tmp_path):
+    path = tmp_path / "requests.csv"
+    path.write_text(HEADER + _rows(0, 5))
+    tail = CsvTail(path)
+    tail.refresh()
+    os.replace(path, tmp_path / "requests.csv.1")
+    path.write_text(HEADER + _rows(10, 1))
+    assert tail.refresh() == 1
+    assert list(tail.frame["request_id"]) == ["r10"]
+
+
+def test_since_and_max_rows(tmp_path):
+    path = tmp_path / "requests.csv"
+    path.write_text(HEADER + _rows(0, 10))
+    tail = CsvTail(path, max_rows=6)
+    tail.refresh()
+    assert len(tail.frame) == 6
+    assert list(tail.since("2024-05-01 10:07:00")["request_id"]) == ["r7", "r8", "r9"]
+    assert len(tail.since(None)) == 6
+
+
+def test_missing_file_reads_as_empty(tmp_path):
+    tail = CsvTail(tmp_path / "nope.csv")
+    assert tail.refresh() == 0 and tail.frame.empty
@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+
+import pytest
+
+import utils.request_log
+from utils.feedback_store import FeedbackStore, connect_reader
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = FeedbackStore(tmp_path / "feedback.db", flush_interval=0.01)
+    yield s
+    s.close()
+
+
+def _ratings(store):
+    conn = connect_reader(store.db_path)
+    try:
+        return conn.execute("SELECT rating, request_id FROM feedback ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def test_submit_then_flush_commits_in_order(store):
+    for i in range(250):
+        store.submit("Good" if i % 2 else "Confusing", request_id=f"r{i}")
+    store.flush()
+    rows = _ratings(store)
+    assert len(rows) == 250
+    assert rows[0] == ("Confusing", "r0") and rows[-1] == ("Good", "r249")
+
+
+def test_failed_batch_is_dropped_and_writer_survives(store, monkeypatch):
+    errors = []
+    monkeypatch.setattr(utils.request_log, "log_error", lambda msg, exc_info=None: errors.append(msg))
+    original = FeedbackStore._write
+
+    def broken(conn, batch):
+        raise sqlite3.IntegrityError("boom")
+
+    monkeypatch.setattr(FeedbackStore, "_write", staticmethod(broken))
+    store.submit("Good", request_id="lost")
+    # a dead writer thread would leave this join() hanging forever
+    done = threading.Thread(target=store.flush, daemon=True)
+    done.start()
+    done.join(5)
+    assert not done.is_alive()
+    assert errors and store._thread.is_alive()
+
+    monkeypatch.setattr(FeedbackStore, "_write", staticmethod(original))
+    store.submit("Neutral", request_id="kept")
+    store.flush()
+    assert _ratings(store) == [("Neutral", "kept")]
+
+
+def test_close_returns_after_a_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.request_log, "log_error", lambda msg, exc_info=None: None)
+    store = FeedbackStore(tmp_path / "feedback.db", flush_interval=0.01)
+    monkeypatch.setattr(FeedbackStore, "_write", staticmethod(lambda conn, batch: 1 / 0))
+    store.submit("Good")
+    closer = threading.Thread(target=store.close, daemon=True)
+    closer.start()
+    closer.join(5)
+    assert not closer.is_alive()
+
+
+def test_migrates_databases_without_request_id(tmp_path):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE feedback (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "timestamp TEXT NOT NULL, rating TEXT NOT NULL)")
+        conn.execute("INSERT INTO feedback (timestamp, rating) VALUES ('2024-01-01 00:00:00', 'Good')")
+    store = FeedbackStore(path, flush_interval=0.01)
+    store.submit("Neutral", request_id="r1")
+    store.close()
+    assert _ratings(store) == [("Good", None), ("Neutral", "r1")]
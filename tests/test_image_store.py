@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+import utils.request_log
+from utils.image_store import ImageStore
+
+JPEG = b"\xff\xd8\xff\xe0" + b"x" * 100
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = ImageStore(tmp_path / "images", tmp_path / "images" / "index.db", flush_interval=0.01, max_pending=4)
+    yield s
+    s.close()
+
+
+def _flushed(store, timeout=5):
+    # a dead writer thread would leave this join() hanging forever
+    done = threading.Thread(target=store.flush, daemon=True)
+    done.start()
+    done.join(timeout)
+    return not done.is_alive()
+
+
+def test_put_stores_once_by_content(store):
+    first = store.put(JPEG, claim_id="c1", filename="a.jpg")
+    assert store.put(bytearray(JPEG), claim_id="c1", filename="b.jpg") == first
+    store.flush()
+    assert store.find(first).read_bytes() == JPEG
+    assert store.find(first).suffix == ".jpg"
+    assert [row[3] for row in store.uploads_for_claim("c1")] == ["a.jpg", "b.jpg"]
+
+
+def test_put_blocks_beyond_max_pending(store, monkeypatch):
+    gate = threading.Event()
+    persist = store._persist
+    monkeypatch.setattr(store, "_persist", lambda sha, data: gate.wait() and persist(sha, data))
+    putter = threading.Thread(target=lambda: [store.put(JPEG + bytes([i])) for i in range(12)], daemon=True)
+    putter.start()
+    putter.join(0.5)
+    assert putter.is_alive() and store._queue.qsize() <= 4
+    gate.set()
+    putter.join(5)
+    assert not putter.is_alive() and _flushed(store)
+
+
+def test_failed_batch_is_dropped_and_writer_survives(store, monkeypatch):
+    errors = []
+    monkeypatch.setattr(utils.request_log, "log_error", lambda msg, exc_info=None: errors.append(msg))
+
+    def broken(sha, data):
+        raise ValueError("not an OSError")
+
+    monkeypatch.setattr(store, "_persist", broken)
+    lost = store.put(JPEG, claim_id="lost")
+    assert _flushed(store)
+    assert errors and store._thread.is_alive() and store.find(lost) is None
+    monkeypatch.undo()
+    kept = store.put(JPEG + b"!")
+    store.flush()
+    assert store.find(kept) is not None
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from utils import job_queue
+from utils.job_queue import JobQueue
+
+IMAGES = [(f"{i:064x}", f"car{i}.jpg") for i in range(5)]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JobQueue(tmp_path / "jobs.db", visibility_timeout=60.0, max_attempts=2)
+    yield q
+    q.close()
+
+
+def test_submit_claim_complete(queue):
+    job_id = queue.submit(IMAGES, conf=0.4)
+    assert queue.get(job_id)["status"] == "queued"
+    claimed = queue.claim("w1", limit=3)
+    assert [(r[1], r[4]) for r in claimed] == [(0, 0.4), (1, 0.4), (2, 0.4)]
+    assert queue.get(job_id)["status"] == "running"
+    queue.complete("w1", {(job_id, r[1]): {"cost": r[1]} for r in claimed})
+    rest = queue.claim("w2", limit=10)
+    assert [r[1] for r in rest] == [3, 4]
+    queue.complete("w2", {(job_id, r[1]): {"cost": r[1]} for r in rest})
+    job = queue.get(job_id)
+    assert job["status"] == "done" and job["counts"] == {"done": 5}
+    assert [i["result"]["cost"] for i in job["items"]] == [0, 1, 2, 3, 4]
+
+
+def test_leased_items_are_invisible_until_the_lease_expires(queue, monkeypatch):
+    job_id = queue.submit(IMAGES[:1])
+    assert len(queue.claim("w1")) == 1
+    assert queue.claim("w2") == []
+    later = time.time() + 61
+    monkeypatch.setattr(job_queue.time, "time", lambda: later)
+    assert [r[0] for r in queue.claim("w2")] == [job_id]  # w1 died; w2 takes over
+    # w1's late result is ignored, w2's is kept
+    queue.complete("w1", {(job_id, 0): {"by": "w1"}})
+    queue.complete("w2", {(job_id, 0): {"by": "w2"}})
+    assert queue.get(job_id)["items"][0]["result"] == {"by": "w2"}
+
+
+def test_failures_back_off_then_fail_for_good(queue, monkeypatch):
+    job_id = queue.submit(IMAGES[:1])
+    queue.claim("w1")
+    queue.fail("w1", job_id, 0, "decode error")
+    assert queue.claim("w1") == []  # backing off
+    later = time.time() + job_queue.RETRY_BACKOFF + 1
+    monkeypatch.setattr(job_queue.time, "time", lambda: later)
+    assert len(queue.claim("w1")) == 1
+    queue.fail("w1", job_id, 0, "decode error")
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["items"][0]["error"] == "decode error"
+    assert job["items"][0]["attempts"] == 2
+
+
+def test_unknown_job_and_depth(queue):
+    assert queue.get("nope") is None
+    queue.submit(IMAGES)
+    queue.claim("w1", limit=2)
+    assert queue.depth() == {"queued": 3, "running": 2}
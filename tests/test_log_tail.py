@@ -0,0 +1,51 @@
+import pytest
+
+from utils.log_tail import follow, make_filter, tail
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / "error.log"
+    path.write_text("".join(f"2024-05-01 10:00:{i % 60:02d} {'ERROR' if i % 3 == 0 else 'INFO'} "
+                            f"line {i}\n" for i in range(1000)))
+    return path
+
+
+def test_tail_reads_the_last_lines_across_blocks(log):
+    lines, size = tail(log, n=5, block_size=64)
+    assert [l.split()[-1] for l in lines] == ["995", "996", "997", "998", "999"]
+    assert size == log.stat().st_size
+    everything, _ = tail(log, n=5000, block_size=100)
+    assert len(everything) == 1000 and everything[0].endswith("line 0")
+
+
+def test_tail_with_a_filter(log):
+    lines, _ = tail(log, n=3, keep=make_filter(["ERROR"], r"line 9\d\d$"), block_size=128)
+    assert [l.split()[-1] for l in lines] == ["993", "996", "999"]
+
+
+def test_tail_stops_scanning_at_the_limit(log):
+    lines, _ = tail(log, n=10, keep=make_filter(pattern="never"), block_size=64, max_scan_bytes=256)
+    assert lines == []
+
+
+def test_make_filter_matches_levels_as_words():
+    keep = make_filter(["ERROR", "WARNING"])
+    assert keep("x ERROR y") and keep("x WARNING y")
+    assert not keep("x ERRORS y") and not keep("x INFO y")
+    assert make_filter()("anything")
+
+
+def test_follow_returns_whole_new_lines_and_handles_rotation(log):
+    _, offset = tail(log, n=1)
+    assert follow(log, offset) == ([], offset)
+    with open(log, "a") as f:
+        f.write("new ERROR one\nnew INFO two\npartial")
+    lines, offset = follow(log, offset)
+    assert lines == ["new ERROR one", "new INFO two"]
+    with open(log, "a") as f:
+        f.write(" line\n")
+    lines, offset = follow(log, offset, keep=make_filter(pattern="partial"))
+    assert lines == ["partial line"]
+    log.write_text("rotated\n")  # smaller than the offset: read from the start
+    assert follow(log, offset)[0] == ["rotated"]
@@ -0,0 +1,57 @@
+import threading
+
+from utils.metrics import REGISTRY, Counter, Gauge, Histogram, _escape, render
+
+
+def _lines(metric):
+    return metric.render()
+
+
+def test_counter_sums_the_shards_of_every_thread():
+    c = Counter("t_requests_total", "Requests.", ("route",))
+
+    def work():
+        for _ in range(1000):
+            c.labels(route="/predict").inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    c.labels(route="/jobs").inc(2.5)
+    assert _lines(c) == ["# HELP t_requests_total Requests.", "# TYPE t_requests_total counter",
+                         't_requests_total{route="/jobs"} 2.5',
+                         't_requests_total{route="/predict"} 8000']
+
+
+def test_gauge_track_and_callback():
+    g = Gauge("t_in_flight", "In flight.")
+    with g.track():
+        with g.track():
+            assert _lines(g)[-1] == "t_in_flight 2"
+    assert _lines(g)[-1] == "t_in_flight 0"
+    assert _lines(Gauge("t_rss", "RSS.", fn=lambda: 1234))[-1] == "t_rss 1234"
+
+
+def test_histogram_is_cumulative_with_inf_count_and_sum():
+    h = Histogram("t_seconds", "Latency.", buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v)
+    assert _lines(h)[2:] == ['t_seconds_bucket{le="0.1"} 2', 't_seconds_bucket{le="1"} 3',
+                             't_seconds_bucket{le="+Inf"} 4', "t_seconds_count 4",
+                             "t_seconds_sum 3.65"]
+
+
+def test_labelled_histogram_and_escaping():
+    h = Histogram("t_stage_seconds", "Stages.", ("stage",), buckets=(1.0,))
+    h.labels(stage='de"code\n').observe(0.5)
+    assert 't_stage_seconds_bucket{stage="de\\"code\\n",le="1"} 1' in _lines(h)
+    assert _escape("a\\b") == "a\\\\b"
+
+
+def test_registry_renders_every_metric():
+    text = render()
+    assert text.endswith("\n")
+    for metric in REGISTRY:
+        assert f"# TYPE {metric.name} {metric.kind}" in text
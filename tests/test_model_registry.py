@@ -0,0 +1,188 @@
+import threading
+
+import pytest
+
+from utils.model_registry import ModelRegistry, ModelRouter, ModelWarming, run_metrics, version_of
+
+
+class FakeLoader:
+    """Stands in for load_model: counts loads and returns a token per weights file."""
+
+    def __init__(self):
+        self.loads = []
+
+    def __call__(self, path):
+        self.loads.append(path)
+        return f"model:{path}"
+
+
+@pytest.fixture
+def registry(tmp_path):
+    reg = ModelRegistry(tmp_path / "models.db")
+    for i in range(1, 5):
+        weights = tmp_path / f"run{i}" / "weights" / "best.pt"
+        weights.parent.mkdir(parents=True)
+        weights.write_bytes(f"weights {i}".encode())
+        reg.register(weights, metrics={"mAP50-95": i / 10})
+    yield reg
+    reg.close()
+
+
+@pytest.fixture
+def loader():
+    return FakeLoader()
+
+
+def _router(registry, loader, **kwargs):
+    return ModelRouter(registry, loader=loader, poll=3600, **kwargs)
+
+
+def test_register_is_idempotent_per_file(registry, tmp_path):
+    path = tmp_path / "run2" / "weights" / "best.pt"
+    assert registry.register(path) == 2
+    assert [m["version"] for m in registry.list()] == [1, 2, 3, 4]
+    assert registry.get(3)["metrics"] == {"mAP50-95": 0.3}
+    with pytest.raises(KeyError):
+        registry.set_routes({9: 100})
+
+
+def test_run_metrics_reads_the_best_row(tmp_path):
+    run = tmp_path / "train"
+    (run / "weights").mkdir(parents=True)
+    (run / "results.csv").write_text(
+        "epoch, metrics/mAP50(B), metrics/mAP50-95(B)\n0, 0.5, 0.2\n1, 0.6, 0.3\n2, 0.55, 0.25\n")
+    assert run_metrics(run / "weights" / "best.pt") == {"mAP50": 0.6, "mAP50-95": 0.3}
+    assert run_metrics(tmp_path / "nowhere" / "weights" / "best.pt") is None
+
+
+def test_routes_swap_and_sticky_keys(registry, loader):
+    router = _router(registry, loader)
+    with router.acquire(key="k") as (label, model):
+        assert (label, model) == (None, None)
+    registry.set_routes({1: 50, 2: 50})
+    assert router.refresh() and not router.refresh()
+    seen = set()
+    for i in range(200):
+        with router.acquire(key=f"user{i}") as (label, _):
+            seen.add(version_of(label))
+        with router.acquire(key=f"user{i}") as (again, _):
+            assert version_of(again) == version_of(label)
+    assert seen == {1, 2}
+    assert len(loader.loads) == 2
+
+
+def test_retired_version_is_freed_after_its_last_request(registry, loader):
+    router = _router(registry, loader)
+    registry.set_routes({1: 100})
+    router.refresh()
+    with router.acquire() as (label, model):
+        registry.set_routes({2: 100})
+        router.refresh()
+        assert model == f"model:{loader.loads[0]}"  # still usable mid-request
+        assert [s["version"] for s in router.status()["loaded"]] == [2]
+    with router.acquire() as (label, _):
+        assert version_of(label) == 2
+
+
+def test_acquire_never_loads_a_pinned_version(registry, loader):
+    router = _router(registry, loader)
+    with pytest.raises(ModelWarming):
+        with router.acquire(version=3):
+            pass
+    assert loader.loads == []  # loading happens on the router's thread
+    assert router.status()["warming"] == [3]
+    router.warm()
+    with router.acquire(version=3) as (label, model):
+        assert version_of(label) == 3 and model.endswith("run3/weights/best.pt")
+    with pytest.raises(KeyError):
+        with router.acquire(version=99):
+            pass
+
+
+def test_alternating_pins_do_not_thrash(registry, loader):
+    router = _router(registry, loader, max_pinned=2)
+    for version in (3, 4):
+        with pytest.raises(ModelWarming):
+            with router.acquire(version=version):
+                pass
+    router.warm()
+    for _ in range(50):  # two sessions on two picks, interleaved
+        for version in (3, 4):
+            with router.acquire(version=version) as (label, _):
+                assert version_of(label) == version
+    assert len(loader.loads) == 2
+
+
+def test_least_recently_used_pin_is_evicted_once_idle(registry, loader):
+    router = _router(registry, loader, max_pinned=1)
+    for version in (2, 3):
+        with pytest.raises(ModelWarming):
+            with router.acquire(version=version):
+                pass
+    router.warm()  # 2 then 3: 2 is evicted
+    assert [s["version"] for s in router.status()["loaded"]] == [3]
+    with router.acquire(version=3) as (_, held):
+        with pytest.raises(ModelWarming):
+            with router.acquire(version=2):
+                pass
+        router.warm()  # evicts 3 while a request still holds it
+        assert held is not None
+    assert [s["version"] for s in router.status()["loaded"]] == [2]
+
+
+def test_pinning_a_routed_version_reuses_it(registry, loader):
+    router = _router(registry, loader)
+    registry.set_routes({1: 100})
+    router.refresh()
+    with router.acquire(version=1) as (label, _):
+        assert version_of(label) == 1
+    registry.set_routes({2: 100})
+    router.refresh()
+    with router.acquire(version=1) as (label, _):  # still pinned, so still loaded
+        assert version_of(label) == 1
+    assert len(loader.loads) == 2
+
+
+def test_background_thread_warms_pins(registry, loader):
+    router = _router(registry, loader).start()
+    try:
+        with pytest.raises(ModelWarming):
+            with router.acquire(version=4):
+                pass
+        ready = threading.Event()
+        for _ in range(200):
+            if router.status()["loaded"]:
+                ready.set()
+                break
+            threading.Event().wait(0.01)
+        assert ready.is_set()
+        with router.acquire(version=4) as (label, _):
+            assert version_of(label) == 4
+    finally:
+        router.stop()
+
+
+def test_version_of():
+    assert version_of("autodamage-v12-0123456789ab") == 12
+    assert version_of("best-0123456789ab") is None
+    assert version_of("../../etc") is None
+    assert version_of(None) is None
+
+
+def test_resolve_weights_stays_under_the_allowed_roots(tmp_path):
+    from utils.model_registry import resolve_weights
+
+    runs, models, other = tmp_path / "runs", tmp_path / "models", tmp_path / "elsewhere"
+    for d in (runs / "detect" / "t1" / "weights", models, other):
+        d.mkdir(parents=True)
+    good = runs / "detect" / "t1" / "weights" / "best.pt"
+    good.write_bytes(b"w")
+    (models / "notes.txt").write_text("x")
+    (other / "evil.pt").write_bytes(b"w")
+    (models / "link.pt").symlink_to(other / "evil.pt")
+    roots = (runs, models)
+    assert resolve_weights(good, roots) == good.resolve()
+    for bad in (other / "evil.pt", models / "link.pt", runs / ".." / "elsewhere" / "evil.pt",
+                models / "notes.txt", runs / "missing.pt"):
+        with pytest.raises(ValueError):
+            resolve_weights(bad, roots)
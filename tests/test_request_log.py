@@ -0,0 +1,60 @@
+import csv
+import logging
+import os
+import time
+
+from utils import request_log
+from utils.request_log import FIELDS, RotatingCsvHandler, log_files, process_tag, prune_stale
+
+
+def _record(**fields):
+    record = logging.LogRecord("autodamage.requests", logging.INFO, __file__, 0, "", None, None)
+    record.fields = fields
+    return record
+
+
+def test_each_file_starts_with_the_header_and_rotates_by_size(tmp_path):
+    path = tmp_path / "requests.1.csv"
+    handler = RotatingCsvHandler(path, max_bytes=300, rotate_seconds=0, backup_count=3)
+    for i in range(20):
+        handler.emit(_record(request_id=f"r{i}", source="api", status="ok"))
+    handler.close()
+    files = sorted(tmp_path.glob("requests.1.csv*"))
+    assert len(files) > 1
+    ids = []
+    for f in files:
+        with open(f, newline="") as fh:
+            rows = list(csv.reader(fh))
+        assert rows[0] == FIELDS
+        ids += [r[1] for r in rows[1:]]
+    assert "r19" in ids  # the newest rows are in the current file
+
+
+def test_process_tag_defaults_to_the_pid(monkeypatch):
+    monkeypatch.delenv("AUTODAMAGE_LOG_TAG", raising=False)
+    assert process_tag() == str(os.getpid())
+    monkeypatch.setenv("AUTODAMAGE_LOG_TAG", "worker-3")
+    assert process_tag() == "worker-3"
+    assert str(request_log.REQUESTS_FILE).format(tag="worker-3").endswith("requests.worker-3.csv")
+
+
+def test_log_files_lists_current_files_of_every_process(tmp_path):
+    for name in ("requests.csv", "requests.11.csv", "requests.12.csv", "requests.11.csv.1",
+                 "error.11.log", "error.11.log.2", "notes.txt"):
+        (tmp_path / name).write_text("x")
+    os.utime(tmp_path / "requests.12.csv", (time.time() + 10,) * 2)
+    assert [p.name for p in log_files("requests", tmp_path)][0] == "requests.12.csv"
+    assert {p.name for p in log_files("requests", tmp_path)} == {"requests.csv", "requests.11.csv",
+                                                                 "requests.12.csv"}
+    assert [p.name for p in log_files("error", tmp_path)] == ["error.11.log"]
+
+
+def test_prune_stale_removes_old_process_files_only(tmp_path):
+    old, new = time.time() - 1000, time.time()
+    for name, mtime in (("requests.1.csv", old), ("requests.1.csv.1", old), ("error.1.log", old),
+                        ("requests.2.csv", new), ("requests.csv", old)):
+        (tmp_path / name).write_text("x")
+        os.utime(tmp_path / name, (mtime, mtime))
+    removed = prune_stale(tmp_path, max_age=500)
+    assert {p.name for p in removed} == {"requests.1.csv", "requests.1.csv.1", "error.1.log"}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["requests.2.csv", "requests.csv"]
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from utils import serialization
+from utils.serialization import JSON, MSGPACK, dumps_json, encode, negotiate, to_columnar
+
+DETECTIONS = [
+    {"class": "Dent", "severity": "moderate", "confidence": 0.91, "cost": 3200.0, "box": [1.0, 2.0, 30.0, 40.0]},
+    {"class": "Scratch", "severity": "minor", "confidence": 0.42, "cost": 1500.0, "box": [5.0, 6.0, 7.0, 8.0]},
+    {"class": "Dent", "severity": None, "confidence": 0.3, "cost": 0.0},
+]
+PAYLOAD = {"request_id": "abc", "detections": DETECTIONS, "estimated_cost": 4700.0}
+
+
+def test_to_columnar_uses_parallel_arrays():
+    cols = to_columnar(DETECTIONS)
+    assert cols["names"] == ["Dent", "Scratch"]
+    assert cols["class_id"] == [0, 1, 0]
+    assert cols["score"] == [0.91, 0.42, 0.3]
+    assert cols["cost"] == [3200.0, 1500.0, 0.0]
+    assert cols["box"] == [1.0, 2.0, 30.0, 40.0, 5.0, 6.0, 7.0, 8.0, 0.0, 0.0, 0.0, 0.0]
+    # unknown severities are appended after the fixed ones
+    assert cols["severities"][:3] == ["minor", "moderate", "severe"]
+    assert [cols["severities"][i] for i in cols["severity_id"]] == ["moderate", "minor", None]
+
+
+def test_to_columnar_keeps_model_class_ids():
+    cols = to_columnar(DETECTIONS, names=["Broken part", "Scratch", "Dent"])
+    assert cols["class_id"] == [2, 1, 2]
+    assert cols["names"] == ["Broken part", "Scratch", "Dent"]
+
+
+def test_negotiate(monkeypatch):
+    monkeypatch.setattr(serialization, "msgpack", object())
+    assert negotiate(None) == JSON
+    assert negotiate("*/*") == JSON
+    assert negotiate("application/msgpack") == MSGPACK
+    assert negotiate("application/json;q=0.5, application/x-msgpack") == MSGPACK
+    assert negotiate("application/msgpack;q=0.2, application/json") == JSON
+    assert negotiate("application/msgpack;q=0, application/*") == JSON
+    assert negotiate("text/html") is None
+    assert negotiate("application/json;q=oops") is None
+
+
+def test_negotiate_without_msgpack_falls_back(monkeypatch):
+    monkeypatch.setattr(serialization, "msgpack", None)
+    assert negotiate("application/msgpack, */*;q=0.1") == JSON
+    assert negotiate("application/msgpack") is None
+
+
+def test_dumps_json_round_trips():
+    payload = {"name": "Kratzer ä", "values": [1, 2.5, None]}
+    assert json.loads(dumps_json(payload)) == payload
+
+
+def test_encode_json_rows_and_columnar():
+    assert json.loads(encode(PAYLOAD, JSON)) == PAYLOAD
+    body = json.loads(encode(PAYLOAD, JSON, columnar=True))
+    assert body["detections"] == to_columnar(DETECTIONS)
+    assert body["estimated_cost"] == 4700.0
+    assert PAYLOAD["detections"] is DETECTIONS  # the input is not modified
+
+
+def test_encode_msgpack_is_columnar_by_default():
+    msgpack = pytest.importorskip("msgpack")
+    body = msgpack.unpackb(encode(PAYLOAD, MSGPACK), raw=False)
+    assert body["detections"] == to_columnar(DETECTIONS)
+    rows = msgpack.unpackb(encode(PAYLOAD, MSGPACK, columnar=False), raw=False)
+    assert rows["detections"] == DETECTIONS
@@ -0,0 +1,44 @@
+from utils.video import merge_tracks
+
+
+def _frames(*boxes_per_frame, cls="Dent"):
+    return [(k, k * 0.5, [(cls, 0.5 + 0.1 * k, box) for box in boxes])
+            for k, boxes in enumerate(boxes_per_frame)]
+
+
+def test_pan_is_merged_once_the_camera_motion_is_applied():
+    # the damage slides left by 0.3 per keyframe as the camera pans right
+    per_frame = _frames([[0.6, 0.4, 0.8, 0.6]], [[0.3, 0.4, 0.5, 0.6]], [[0.0, 0.4, 0.2, 0.6]])
+    shifts = [None, (-0.3, 0.0), (-0.3, 0.0)]
+    tracks = merge_tracks(per_frame, shifts)
+    assert len(tracks) == 1
+    assert tracks[0]["frames"] == 3 and tracks[0]["best_k"] == 2
+    # compared in place, the same boxes never overlap
+    assert len(merge_tracks(per_frame)) == 3
+
+
+def test_same_place_after_a_pan_is_a_different_damage():
+    per_frame = _frames([[0.4, 0.4, 0.6, 0.6]], [[0.4, 0.4, 0.6, 0.6]])
+    assert len(merge_tracks(per_frame, [None, (-0.3, 0.0)])) == 2
+
+
+def test_unknown_motion_never_merges():
+    per_frame = _frames([[0.4, 0.4, 0.6, 0.6]], [[0.4, 0.4, 0.6, 0.6]])
+    assert len(merge_tracks(per_frame, [None, None])) == 2
+
+
+def test_different_appearance_is_not_merged():
+    a, b = [1.0, 0.0, -1.0, 0.0], [-1.0, 0.0, 1.0, 0.0]
+    per_frame = [(0, 0.0, [("Dent", 0.9, [0.4, 0.4, 0.6, 0.6], a)]),
+                 (1, 0.5, [("Dent", 0.8, [0.4, 0.4, 0.6, 0.6], b)])]
+    assert len(merge_tracks(per_frame, [None, (0.0, 0.0)])) == 2
+    per_frame[1] = (1, 0.5, [("Dent", 0.8, [0.4, 0.4, 0.6, 0.6], a)])
+    assert len(merge_tracks(per_frame, [None, (0.0, 0.0)])) == 1
+
+
+def test_class_and_gap_limits():
+    per_frame = [(0, 0.0, [("Dent", 0.9, [0.4, 0.4, 0.6, 0.6])]),
+                 (1, 0.5, [("Scratch", 0.9, [0.4, 0.4, 0.6, 0.6])]),
+                 (4, 2.0, [("Dent", 0.9, [0.4, 0.4, 0.6, 0.6])])]
+    tracks = merge_tracks(per_frame, [(0.0, 0.0)] * 5, max_gap=2)
+    assert [t["class"] for t in tracks] == ["Dent", "Scratch", "Dent"]
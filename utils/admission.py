@@ -0,0 +1,268 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from utils.metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED, ADMISSION_WAIT, LANE_LATENCY
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+API_KEYS_FILE = Path(os.environ.get("AUTODAMAGE_API_KEYS", PROJECT_ROOT / "database" / "api_keys.json"))
+
+LANES = ("interactive", "bulk")  # highest priority first
+
+# concurrent model calls; every path shares one YOLO instance, which is not
+# safe to call from several threads at once, so keep this at 1 unless each
+# slot gets its own model
+INFER_SLOTS = int(os.environ.get("AUTODAMAGE_INFER_SLOTS", 1))
+MAX_QUEUE = {"interactive": int(os.environ.get("AUTODAMAGE_MAX_QUEUE_INTERACTIVE", 32)),
+             "bulk": int(os.environ.get("AUTODAMAGE_MAX_QUEUE_BULK", 256))}
+# a bulk request waiting this long is served next, so bulk is slowed, never starved
+STARVATION_AFTER = float(os.environ.get("AUTODAMAGE_BULK_STARVATION_SECONDS", 30.0))
+
+# Policy for requests without a key, for any key while no api_keys.json exists,
+# and the fallback for fields an entry leaves out. Rate limits are opt-in: a
+# rate of None means unlimited (only the scheduler's queue bounds apply).
+_DEFAULT_RATE = os.environ.get("AUTODAMAGE_DEFAULT_RATE")
+DEFAULT_POLICY = {"lane": "interactive",
+                  "rate": float(_DEFAULT_RATE) if _DEFAULT_RATE else None,
+                  "burst": float(os.environ.get("AUTODAMAGE_DEFAULT_BURST", 10.0))}
+# an idle client's bucket is dropped after this long (it would be full again by then anyway)
+BUCKET_TTL = float(os.environ.get("AUTODAMAGE_BUCKET_TTL_SECONDS", 600.0))
+
+
+class AdmissionRejected(Exception):
+    """A request refused before it reached the model; the API turns it into an HTTP error."""
+
+    def __init__(self, status, reason, lane, retry_after=None):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """``rate`` requests per second on average, bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self, n=1.0):
+        """Take ``n`` tokens: 0.0 if granted, else the seconds until they will be there."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return 0.0
+        return (n - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class RateLimiter:
+    """Per-client token buckets, with policies from ``api_keys.json``.
+
+    The file maps each key to ``{"client": ..., "lane": "interactive"|"bulk",
+    "rate": req/s, "burst": n, "admin": bool}``; a missing or null rate is
+    unlimited, and only ``admin`` keys may change the model registry. While
+    it does not exist, keys are not enforced and every key (or address,
+    without one) gets ``DEFAULT_POLICY``, which does not limit unless
+    AUTODAMAGE_DEFAULT_RATE is set. Once it does, unknown keys are refused.
+    Edits are picked up without a restart. Buckets of clients idle for
+    ``bucket_ttl`` are evicted, so memory follows the active clients.
+    """
+
+    def __init__(self, keys_file=API_KEYS_FILE, bucket_ttl=BUCKET_TTL):
+        self.keys_file = Path(keys_file)
+        self.bucket_ttl = bucket_ttl
+        self._keys = None
+        self._mtime = None
+        self._buckets = {}
+        self._next_sweep = time.monotonic() + bucket_ttl
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            mtime = self.keys_file.stat().st_mtime
+        except FileNotFoundError:
+            self._keys, self._mtime = None, None
+            return
+        if mtime != self._mtime:
+            with open(self.keys_file, encoding="utf-8") as f:
+                self._keys = json.load(f)
+            self._mtime = mtime
+            self._buckets.clear()  # limits may have changed
+
+    def policy(self, api_key, remote=None):
+        """(client, policy) for a request; raises AdmissionRejected(401) for a bad key."""
+        with self._lock:
+            self._load()
+            keys = self._keys
+        if not api_key:
+            # an optional "" entry sets the policy for requests without a key
+            policy = dict(DEFAULT_POLICY, **(keys or {}).get("", {}))
+            return f"anonymous:{remote}", policy
+        if keys is None:
+            return f"key:{api_key[:8]}", DEFAULT_POLICY
+        entry = keys.get(api_key)
+        if entry is None:
+            raise AdmissionRejected(401, "unknown_key", DEFAULT_POLICY["lane"])
+        return entry.get("client") or f"key:{api_key[:8]}", dict(DEFAULT_POLICY, **entry)
+
+    def is_admin(self, api_key):
+        """True for a key whose entry has ``"admin": true``; never without a keys file."""
+        with self._lock:
+            self._load()
+            keys = self._keys
+        return bool(api_key and keys and (keys.get(api_key) or {}).get("admin") is True)
+
+    def check(self, client, policy, cost=1.0):
+        """0.0 if ``client`` may proceed, else the seconds to wait (Retry-After)."""
+        if policy.get("rate") is None:
+            return 0.0
+        with self._lock:
+            if time.monotonic() >= self._next_sweep:
+                self._sweep()
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(policy["rate"], policy["burst"])
+            return bucket.take(cost)
+
+    def _sweep(self):
+        now = time.monotonic()
+        for client, bucket in list(self._buckets.items()):
+            # not before it has refilled, so eviction never hands out extra tokens
+            refill = bucket.burst / bucket.rate if bucket.rate > 0 else float("inf")
+            if now - bucket.updated >= max(self.bucket_ttl, refill):
+                del self._buckets[client]
+        self._next_sweep = now + self.bucket_ttl
+
+
+class PriorityScheduler:
+    """Hands out ``slots`` model slots, interactive waiters first.
+
+    Lives on the server's event loop. A freed slot goes straight to the next
+    waiter (so nothing can jump the queue between release and wake-up); within
+    a lane requests are served in arrival order. Each lane's queue is bounded.
+    """
+
+    def __init__(self, slots=INFER_SLOTS, max_queue=None, starvation_after=STARVATION_AFTER):
+        self.slots = slots
+        self.max_queue = dict(MAX_QUEUE, **(max_queue or {}))
+        self.starvation_after = starvation_after
+        self._free = slots
+        self._waiters = {lane: deque() for lane in LANES}
+
+    def depth(self):
+        return {lane: len(q) for lane, q in self._waiters.items()}
+
+    async def acquire(self, lane):
+        """Wait for a slot; returns the seconds spent queued."""
+        if self._free > 0 and not any(self._waiters.values()):
+            self._free -= 1
+            ADMISSION_WAIT.labels(lane=lane).observe(0.0)
+            return 0.0
+        queue = self._waiters[lane]
+        if len(queue) >= self.max_queue[lane]:
+            raise AdmissionRejected(503, "queue_full", lane, retry_after=1.0)
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, time.monotonic())
+        queue.append(entry)
+        ADMISSION_QUEUE_DEPTH.labels(lane=lane).inc()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # granted just as the client went away: pass it on
+            elif entry in queue:
+                queue.remove(entry)
+            raise
+        finally:
+            ADMISSION_QUEUE_DEPTH.labels(lane=lane).dec()
+        waited = time.monotonic() - entry[1]
+        ADMISSION_WAIT.labels(lane=lane).observe(waited)
+        return waited
+
+    def release(self):
+        entry = self._next()
+        while entry is not None and entry[0].done():  # cancelled, not yet unlinked
+            entry = self._next()
+        if entry is None:
+            self._free += 1
+        else:
+            entry[0].set_result(None)  # the slot moves to the waiter
+
+    def _next(self):
+        bulk = self._waiters["bulk"]
+        if bulk and time.monotonic() - bulk[0][1] >= self.starvation_after:
+            return bulk.popleft()
+        for lane in LANES:
+            if self._waiters[lane]:
+                return self._waiters[lane].popleft()
+        return None
+
+    @asynccontextmanager
+    async def slot(self, lane):
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class Admission:
+    """Rate limit, then priority-queue, each model-bound API request."""
+
+    def __init__(self, limiter=None, scheduler=None):
+        self.limiter = limiter or RateLimiter()
+        self.scheduler = scheduler or PriorityScheduler()
+
+    def limit(self, api_key, remote=None, priority=None):
+        """Rate-limit one request and return its lane; raises AdmissionRejected."""
+        try:
+            client, policy = self.limiter.policy(api_key, remote)
+            lane = policy["lane"] if policy["lane"] in LANES else "bulk"
+            if priority == "bulk":  # clients may demote themselves, never promote
+                lane = "bulk"
+            retry_after = self.limiter.check(client, policy)
+            if retry_after:
+                raise AdmissionRejected(429, "rate_limited", lane, retry_after=retry_after)
+        except AdmissionRejected as e:
+            ADMISSION_REJECTED.labels(lane=e.lane, reason=e.reason).inc()
+            raise
+        return lane
+
+    @asynccontextmanager
+    async def admit(self, api_key, remote=None, priority=None):
+        """Rate limit, wait for a model slot, and yield the lane while holding it."""
+        start = time.monotonic()
+        lane = self.limit(api_key, remote, priority)
+        try:
+            await self.scheduler.acquire(lane)
+        except AdmissionRejected as e:
+            ADMISSION_REJECTED.labels(lane=e.lane, reason=e.reason).inc()
+            raise
+        try:
+            yield lane
+        finally:
+            self.scheduler.release()
+            LANE_LATENCY.labels(lane=lane).observe(time.monotonic() - start)
+
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def get_admission():
+    """Process-wide admission control for the API."""
+    global _admission
+    with _admission_lock:
+        if _admission is None:
+            _admission = Admission()
+        return _admission
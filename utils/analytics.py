@@ -0,0 +1,218 @@
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ANALYTICS_DB = PROJECT_ROOT / "logs" / "analytics.db"
+
+# upper bounds (seconds) of the response-time histogram buckets; the last is +inf
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, float("inf"))
+# rollup table → length of the timestamp prefix that identifies its bucket
+GRANULARITIES = {"minute": 16, "hour": 13}
+MINUTE_RETENTION_DAYS = 7
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_{g} (
+    bucket      TEXT NOT NULL,
+    source      TEXT NOT NULL,
+    requests    INTEGER NOT NULL DEFAULT 0,
+    successes   INTEGER NOT NULL DEFAULT 0,
+    errors      INTEGER NOT NULL DEFAULT 0,
+    latency_sum REAL    NOT NULL DEFAULT 0,
+    latency_max REAL    NOT NULL DEFAULT 0,
+    detections  INTEGER NOT NULL DEFAULT 0,
+    cost        REAL    NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, source)
+);
+CREATE TABLE IF NOT EXISTS latency_{g} (
+    bucket TEXT NOT NULL,
+    le     REAL NOT NULL,
+    count  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, le)
+);
+"""
+
+
+def connect(db_path=ANALYTICS_DB, readonly=False):
+    if readonly:
+        return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5.0)
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for g in GRANULARITIES:
+        conn.executescript(_SCHEMA.format(g=g))
+    return conn
+
+
+def _bucket_le(seconds):
+    return next(b for b in LATENCY_BUCKETS if seconds <= b)
+
+
+class AnalyticsAggregator:
+    """Keeps minute and hour rollups of request records up to date in SQLite.
+
+    Records are folded into in-memory deltas and upserted at most once per
+    ``flush_interval``, so the cost per request is a few dict updates.
+    """
+
+    def __init__(self, db_path=ANALYTICS_DB, flush_interval=1.0):
+        self.conn = connect(db_path)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._rollups = {}   # (g, bucket, source) → [requests, ok, errors, lat_sum, lat_max, det, cost]
+        self._hist = {}      # (g, bucket, le) → count
+        self._last_prune = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="analytics-flush", daemon=True)
+        self._thread.start()
+
+    def add(self, fields):
+        ts = str(fields.get("timestamp") or time.strftime("%F %T"))
+        source = str(fields.get("source") or "")
+        ok = fields.get("status") in ("ok", "empty")
+        try:
+            latency = float(fields.get("response_time") or 0.0)
+        except ValueError:
+            latency = 0.0
+        detections = int(fields.get("detections") or 0)
+        cost = float(fields.get("cost") or 0.0)
+        le = _bucket_le(latency)
+        with self._lock:
+            for g, width in GRANULARITIES.items():
+                bucket = ts[:width]
+                r = self._rollups.setdefault((g, bucket, source), [0, 0, 0, 0.0, 0.0, 0, 0.0])
+                r[0] += 1
+                r[1 if ok else 2] += 1
+                r[3] += latency
+                r[4] = max(r[4], latency)
+                r[5] += detections
+                r[6] += cost
+                key = (g, bucket, le)
+                self._hist[key] = self._hist.get(key, 0) + 1
+
+    def flush(self):
+        with self._lock:
+            rollups, hist = self._rollups, self._hist
+            self._rollups, self._hist = {}, {}
+        if not rollups:
+            return
+        with self.conn:
+            for (g, bucket, source), r in rollups.items():
+                self.conn.execute(f"""
+                    INSERT INTO rollup_{g} (bucket, source, requests, successes, errors,
+                                            latency_sum, latency_max, detections, cost)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (bucket, source) DO UPDATE SET
+                        requests    = requests + excluded.requests,
+                        successes   = successes + excluded.successes,
+                        errors      = errors + excluded.errors,
+                        latency_sum = latency_sum + excluded.latency_sum,
+                        latency_max = MAX(latency_max, excluded.latency_max),
+                        detections  = detections + excluded.detections,
+                        cost        = cost + excluded.cost
+                """, (bucket, source, *r))
+            for (g, bucket, le), count in hist.items():
+                self.conn.execute(f"""
+                    INSERT INTO latency_{g} (bucket, le, count) VALUES (?, ?, ?)
+                    ON CONFLICT (bucket, le) DO UPDATE SET count = count + excluded.count
+                """, (bucket, le, count))
+        if time.time() - self._last_prune > 3600:
+            self._prune()
+
+    def _prune(self):
+        self._last_prune = time.time()
+        cutoff = time.strftime("%Y-%m-%d %H:%M", time.localtime(time.time() - MINUTE_RETENTION_DAYS * 86400))
+        with self.conn:
+            self.conn.execute("DELETE FROM rollup_minute WHERE bucket < ?", (cutoff,))
+            self.conn.execute("DELETE FROM latency_minute WHERE bucket < ?", (cutoff,))
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"⚠  analytics flush failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        self.conn.close()
+
+
+class AnalyticsHandler(logging.Handler):
+    """Feeds request-log records into an aggregator (runs on the log listener thread)."""
+
+    def __init__(self, aggregator):
+        super().__init__()
+        self.aggregator = aggregator
+
+    def emit(self, record):
+        try:
+            self.aggregator.add(record.fields)
+        except Exception:
+            self.handleError(record)
+
+
+# ── dashboard queries (read only the rollups) ───────────────────────
+def _since_clause(since, width):
+    if since is None:
+        return "", ()
+    return " WHERE bucket >= ?", (str(since)[:width],)
+
+
+def summary(since=None, db_path=ANALYTICS_DB):
+    """Totals since ``since`` (a timestamp or '%F %T' string; None for all time)."""
+    if not Path(db_path).exists():
+        return {}
+    where, args = _since_clause(since, GRANULARITIES["hour"])
+    conn = connect(db_path, readonly=True)
+    try:
+        requests, ok, errors, lat_sum, lat_max, det, cost = conn.execute(
+            "SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(successes), 0), COALESCE(SUM(errors), 0), "
+            "COALESCE(SUM(latency_sum), 0), COALESCE(MAX(latency_max), 0), "
+            f"COALESCE(SUM(detections), 0), COALESCE(SUM(cost), 0) FROM rollup_hour{where}", args,
+        ).fetchone()
+    finally:
+        conn.close()
+    return {
+        "total_requests": requests,
+        "successful_requests": ok,
+        "failed_requests": errors,
+        "average_response_time": lat_sum / requests if requests else 0.0,
+        "max_response_time": lat_max,
+        "total_detections": det,
+        "total_cost": cost,
+    }
+
+
+def series(granularity="hour", since=None, db_path=ANALYTICS_DB):
+    """Rows of (bucket, source, requests, successes, errors, avg_latency) per bucket."""
+    if not Path(db_path).exists():
+        return []
+    where, args = _since_clause(since, GRANULARITIES[granularity])
+    conn = connect(db_path, readonly=True)
+    try:
+        return conn.execute(
+            "SELECT bucket, source, requests, successes, errors, latency_sum / requests "
+            f"FROM rollup_{granularity}{where} ORDER BY bucket", args,
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def latency_histogram(since=None, db_path=ANALYTICS_DB):
+    """[(upper_bound_seconds, count)] across the selected hours."""
+    if not Path(db_path).exists():
+        return []
+    where, args = _since_clause(since, GRANULARITIES["hour"])
+    conn = connect(db_path, readonly=True)
+    try:
+        return conn.execute(
+            f"SELECT le, SUM(count) FROM latency_hour{where} GROUP BY le ORDER BY le", args,
+        ).fetchall()
+    finally:
+        conn.close()
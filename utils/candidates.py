@@ -0,0 +1,67 @@
+from dataclasses import dataclass
+
+from utils.pricing import part_cost, price, severity_for
+
+# inference runs once at this confidence; any higher threshold is a filter
+FLOOR_CONF = 0.05
+
+
+@dataclass
+class Candidates:
+    detections: list   # priced detection dicts at the floor threshold
+    boxes: object      # float32 array (N, 6): x1, y1, x2, y2 normalized to 0-1, score, class id
+    names: dict        # class id -> name, for drawing
+
+
+def detect_candidates(image, floor=FLOOR_CONF, model=None, scale=(1.0, 1.0)):
+    """Every detection at or above ``floor``, from a single model pass.
+
+    Only small arrays are kept (no image), so the result is cheap to cache;
+    ``plot_at`` draws the boxes for any threshold onto any copy of the image.
+    ``model`` defaults to the serving model; ``scale`` maps boxes to original pixels.
+    """
+    if model is None:
+        from scripts.infer import _get_model
+        model = _get_model()
+    result = model.predict(image, conf=floor, save=False, verbose=False)[0].cpu()
+    boxes = result.boxes
+    data = boxes.data.numpy().astype("float32")
+    data[:, :4] = boxes.xyxyn.numpy()
+    return Candidates(to_detections(result, scale), data, dict(result.names))
+
+
+def apply_threshold(detections, conf):
+    """Detections at or above ``conf`` and their total cost."""
+    kept = [d for d in detections if d["confidence"] >= conf]
+    return kept, price(kept)
+
+
+def plot_at(image_bgr, boxes, names, conf):
+    """BGR overlay of ``image_bgr`` with only the ``boxes`` at or above ``conf``."""
+    import torch
+    from ultralytics.engine.results import Results
+
+    h, w = image_bgr.shape[:2]
+    kept = boxes[boxes[:, 4] >= conf].copy()
+    kept[:, [0, 2]] *= w
+    kept[:, [1, 3]] *= h
+    return Results(image_bgr, path="", names=names, boxes=torch.from_numpy(kept)).plot()
+
+
+def to_detections(result, scale=(1.0, 1.0)):
+    """Priced detection dicts from a YOLO ``Results`` object.
+
+    This is the one place detections get a severity and a cost (``utils.pricing``),
+    for every serving path. Boxes are multiplied by ``scale`` (see ``utils.ingest``)
+    to land in original pixels.
+    """
+    sx, sy = scale
+    detections = []
+    for cls, score, (x1, y1, x2, y2) in zip(result.boxes.cls, result.boxes.conf, result.boxes.xyxy):
+        name = result.names[int(cls)]
+        severity = severity_for(name)
+        detections.append({"class": name, "severity": severity,
+                           "confidence": round(float(score), 3),
+                           "cost": part_cost(name, severity),
+                           "box": [round(float(v), 1) for v in (x1 * sx, y1 * sy, x2 * sx, y2 * sy)]})
+    return detections
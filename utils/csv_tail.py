@@ -0,0 +1,75 @@
+import io
+import os
+import threading
+
+import pandas as pd
+
+
+class CsvTail:
+    """A DataFrame view of an append-only CSV that only parses bytes added since the last read.
+
+    Rotation or truncation (new inode, or the file got shorter) triggers a full
+    re-read. At most ``max_rows`` of the newest rows are kept in memory.
+    """
+
+    def __init__(self, path, parse_dates=("timestamp",), max_rows=2_000_000):
+        self.path = str(path)
+        self.parse_dates = list(parse_dates)
+        self.max_rows = max_rows
+        self.frame = pd.DataFrame()
+        self._header = None
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self.frame = pd.DataFrame()
+        self._header = None
+        self._offset = 0
+
+    def refresh(self):
+        """Parse newly appended rows; returns the number of rows added."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                self._inode = None
+                return 0
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                self._reset()
+                self._inode = st.st_ino
+            if st.st_size == self._offset:
+                return 0
+
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read(st.st_size - self._offset)
+            end = chunk.rfind(b"\n")
+            if end < 0:  # no complete line yet
+                return 0
+            chunk = chunk[:end + 1]
+            self._offset += len(chunk)
+
+            text = chunk.decode("utf-8", errors="replace")
+            if self._header is None:
+                self._header, _, text = text.partition("\n")
+                self._header += "\n"
+            if not text.strip():
+                return 0
+            new = pd.read_csv(io.StringIO(self._header + text))
+            for col in self.parse_dates:
+                if col in new:
+                    new[col] = pd.to_datetime(new[col], errors="coerce")
+            self.frame = pd.concat([self.frame, new], ignore_index=True) if len(self.frame) else new
+            if len(self.frame) > self.max_rows:
+                self.frame = self.frame.iloc[-self.max_rows:].reset_index(drop=True)
+            return len(new)
+
+    def since(self, start, column="timestamp"):
+        """Rows at or after ``start``; rows are appended in time order, so this is a binary search."""
+        with self._lock:
+            frame = self.frame
+        if start is None or frame.empty or column not in frame:
+            return frame
+        return frame.iloc[frame[column].searchsorted(pd.Timestamp(start)):]
@@ -0,0 +1,79 @@
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DERIVATIVES_DIR = PROJECT_ROOT / "database" / "derivatives"
+
+# name → (longest side in px or None for original size, format, quality)
+VARIANTS = {
+    "thumb": (256, "webp", 70),
+    "preview": (1024, "webp", 80),
+    "full": (None, "jpg", 90),
+}
+MEDIA_TYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+
+
+@lru_cache(maxsize=8)
+def _weights_version(path, mtime):
+    from utils.helper import file_sha256
+
+    return f"{Path(path).stem}-{file_sha256(path)[:12]}"
+
+
+def model_version(model):
+    """Short, stable id of the weights a YOLO model was loaded from."""
+    path = getattr(model, "ckpt_path", None) or getattr(model, "model_name", None)
+    if path and os.path.exists(path):
+        return _weights_version(str(path), os.path.getmtime(path))
+    return str(path or "unknown")
+
+
+def derivative_path(image_hash, model_version, conf, variant):
+    _, fmt, _ = VARIANTS[variant]
+    name = f"{image_hash}_c{round(conf * 100):03d}_{variant}.{fmt}"
+    return DERIVATIVES_DIR / model_version / image_hash[:2] / name
+
+
+def cached_derivatives(image_hash, model_version, conf):
+    """Paths of every variant if all are already on disk, else None."""
+    paths = {v: derivative_path(image_hash, model_version, conf, v) for v in VARIANTS}
+    return paths if all(p.exists() for p in paths.values()) else None
+
+
+def _encode(image_bgr, max_side, fmt, quality):
+    import cv2
+
+    h, w = image_bgr.shape[:2]
+    if max_side and max(h, w) > max_side:
+        scale = max_side / max(h, w)
+        image_bgr = cv2.resize(image_bgr, (round(w * scale), round(h * scale)),
+                               interpolation=cv2.INTER_AREA)
+    params = ([cv2.IMWRITE_WEBP_QUALITY, quality] if fmt == "webp"
+              else [cv2.IMWRITE_JPEG_QUALITY, quality])
+    ok, buf = cv2.imencode(f".{fmt}", image_bgr, params)
+    if not ok:
+        raise ValueError(f"could not encode {fmt} derivative")
+    return buf.tobytes()
+
+
+def encode_derivatives(overlay_bgr, image_hash, model_version, conf):
+    """Encode an annotated overlay (BGR array, as from ``Results.plot()``) once per variant.
+
+    Returns ``{variant: path}``; variants already on disk are not re-encoded.
+    """
+    paths = {}
+    for variant, (max_side, fmt, quality) in VARIANTS.items():
+        path = derivative_path(image_hash, model_version, conf, variant)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(_encode(overlay_bgr, max_side, fmt, quality))
+            os.replace(tmp, path)
+        paths[variant] = path
+    return paths
+
+
+def media_type(variant):
+    return MEDIA_TYPES[VARIANTS[variant][1]]
@@ -0,0 +1,143 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DB_PATH = PROJECT_ROOT / "database" / "feedback.db"
+
+_STOP = object()
+
+
+def _migrate(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS feedback (
+        id         INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp  TEXT    NOT NULL,
+        rating     TEXT    NOT NULL,
+        request_id TEXT
+    );
+    """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(feedback)")}
+    if "request_id" not in columns:  # databases created before ratings were linked
+        conn.execute("ALTER TABLE feedback ADD COLUMN request_id TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_request_id ON feedback (request_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp)")
+    conn.commit()
+
+
+def connect_reader(db_path=DB_PATH):
+    """A read-only connection for dashboards; WAL lets it read while the writer commits."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5.0)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+class FeedbackStore:
+    """Owns all writes to the feedback table through one background writer thread.
+
+    ``submit`` only enqueues, so UI callbacks never wait on SQLite. The writer
+    drains the queue in batches and commits each batch in a single transaction.
+    A batch that fails is logged and dropped; the writer keeps running, so
+    ``flush`` and ``close`` always return.
+    """
+
+    def __init__(self, db_path=DB_PATH, batch_size=100, flush_interval=0.25):
+        self.db_path = str(db_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            _migrate(conn)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, rating, request_id=None, timestamp=None):
+        self._queue.put((timestamp or time.strftime("%F %T"), rating, request_id))
+
+    def flush(self):
+        """Block until every submitted rating is committed."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _run(self):
+        conn = None
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch, taken = [], 1
+            if item is _STOP:
+                stopping = True
+            else:
+                batch.append(item)
+            # collect whatever else arrives within the flush window
+            deadline = time.monotonic() + self.flush_interval
+            while not stopping and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+            try:
+                if batch:
+                    conn = conn or self._connect()
+                    self._write(conn, batch)
+            except Exception as e:
+                # anything else (disk full, schema, bad row): drop this batch, keep the writer
+                from utils.request_log import log_error
+
+                print(f"⚠  dropped {len(batch)} feedback rows: {e!r}")
+                log_error(f"feedback writer dropped {len(batch)} rows", exc_info=True)
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+        if conn is not None:
+            conn.close()
+
+    @staticmethod
+    def _write(conn, batch):
+        for attempt in range(5):
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO feedback (timestamp, rating, request_id) VALUES (?, ?, ?)",
+                        batch,
+                    )
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == 4:
+                    print(f"⚠  dropped {len(batch)} feedback rows: {e}")
+                    return
+                time.sleep(0.1 * 2 ** attempt)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(db_path=DB_PATH):
+    """Process-wide store; Streamlit reruns and sessions all share one writer."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FeedbackStore(db_path)
+            atexit.register(_store.close)
+        return _store
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import statistics
+import time
+from pathlib import Path
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def split_images(data_yaml, split="val", limit=None):
+    """List the image files of a dataset split, resolved the way ultralytics does."""
+    from ultralytics.data.utils import check_det_dataset
+
+    data = check_det_dataset(str(data_yaml))
+    if not data.get(split):
+        return []
+    roots = data[split] if isinstance(data[split], list) else [data[split]]
+    images = []
+    for root in roots:
+        for dirpath, _, files in os.walk(root):
+            images.extend(os.path.join(dirpath, f) for f in sorted(files)
+                          if f.lower().endswith(IMAGE_EXTS))
+    images.sort()
+    return images[:limit] if limit else images
+
+
+def measure_latency(model, images, imgsz=640, conf=0.25, warmup=3):
+    """Per-image CPU latency at serving settings (batch 1), in milliseconds.
+
+    ``model`` is a YOLO instance or a weights path.
+    """
+    if isinstance(model, (str, Path)):
+        from ultralytics import YOLO
+        model = YOLO(str(model))
+    images = list(images)
+    if not images:
+        return {"p50_ms": None, "p95_ms": None, "mean_ms": None, "n": 0}
+
+    for img in images[:warmup]:
+        model.predict(img, imgsz=imgsz, conf=conf, device="cpu", verbose=False)
+    times = []
+    for img in images:
+        start = time.perf_counter()
+        model.predict(img, imgsz=imgsz, conf=conf, device="cpu", verbose=False)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {
+        "p50_ms": round(statistics.median(times), 2),
+        "p95_ms": round(times[min(len(times) - 1, int(0.95 * len(times)))], 2),
+        "mean_ms": round(statistics.fmean(times), 2),
+        "n": len(times),
+    }
+
+
+def val_metrics(model, data_yaml, imgsz=640, split="val", batch=16):
+    """Box metrics of ``model`` (YOLO instance or weights path) on a dataset split."""
+    if isinstance(model, (str, Path)):
+        from ultralytics import YOLO
+        model = YOLO(str(model))
+    metrics = model.val(data=str(data_yaml), imgsz=imgsz, split=split, batch=batch,
+                        device="cpu", plots=False, verbose=False)
+    return {
+        "mAP50": round(float(metrics.box.map50), 5),
+        "mAP50-95": round(float(metrics.box.map), 5),
+        "precision": round(float(metrics.box.mp), 5),
+        "recall": round(float(metrics.box.mr), 5),
+    }
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
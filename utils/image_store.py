@@ -0,0 +1,186 @@
+import atexit
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from utils.metrics import CACHE_LOOKUPS
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+STORE_DIR = PROJECT_ROOT / "database" / "processed_images"
+INDEX_PATH = STORE_DIR / "index.db"
+# uploads waiting for the writer; ``put`` blocks beyond this, so a slow disk
+# slows uploads down instead of holding every pending image in memory
+MAX_PENDING = int(os.environ.get("AUTODAMAGE_IMAGE_STORE_MAX_PENDING", 64))
+
+_STOP = object()
+
+
+def sniff_ext(data):
+    if data[:3] == b"\xff\xd8\xff":
+        return ".jpg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return ".png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return ".bin"
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def find_stored(sha256, root=STORE_DIR):
+    """Path of a stored image by hash, whatever its extension, or None."""
+    shard = Path(root) / sha256[:2] / sha256[2:4]
+    for ext in (".jpg", ".png", ".webp", ".bin"):
+        if (shard / f"{sha256}{ext}").exists():
+            return shard / f"{sha256}{ext}"
+    return None
+
+
+class ImageStore:
+    """Content-addressed image store: ``<root>/ab/cd/<sha256><ext>``.
+
+    ``put`` hashes the bytes and returns immediately; a background thread
+    writes new content (identical uploads are stored once) and records every
+    upload in the SQLite index, batching index commits. At most ``max_pending``
+    uploads wait in memory; past that ``put`` blocks until the writer catches up.
+    A batch that fails is logged and dropped, and the writer keeps running.
+    """
+
+    def __init__(self, root=STORE_DIR, index_path=INDEX_PATH, batch_size=200, flush_interval=0.25,
+                 max_pending=MAX_PENDING):
+        self.root = Path(root)
+        self.index_path = str(index_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.root.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(self.index_path)) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+            CREATE TABLE IF NOT EXISTS images (
+                sha256     TEXT PRIMARY KEY,
+                ext        TEXT NOT NULL,
+                size       INTEGER NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS uploads (
+                id        INTEGER PRIMARY KEY AUTOINCREMENT,
+                sha256    TEXT NOT NULL,
+                claim_id  TEXT,
+                filename  TEXT,
+                timestamp TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_uploads_claim ON uploads (claim_id);
+            CREATE INDEX IF NOT EXISTS idx_uploads_sha256 ON uploads (sha256);
+            """)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="image-store-writer", daemon=True)
+        self._thread.start()
+
+    # ── paths ──
+    def path_for(self, sha256, ext):
+        """Where content with this hash and extension is stored; ``find`` locates existing images."""
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}{ext}"
+
+    def find(self, sha256):
+        return find_stored(sha256, self.root)
+
+    # ── writes ──
+    def put(self, data, claim_id=None, filename=None):
+        """Queue ``data`` for storage and return its content hash; blocks while the queue is full."""
+        data = bytes(data)
+        sha256 = content_hash(data)
+        self._queue.put((sha256, data, claim_id, filename, time.strftime("%F %T")))
+        return sha256
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _persist(self, sha256, data):
+        ext = sniff_ext(data)
+        path = self.path_for(sha256, ext)
+        if path.exists():
+            return None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return ext
+
+    def _run(self):
+        conn = sqlite3.connect(self.index_path, timeout=30.0)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        stopping = False
+        while not stopping:
+            new_images, uploads, taken, deadline = [], [], 0, None
+            try:
+                while taken < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=None if deadline is None
+                                               else max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    taken += 1
+                    deadline = deadline or time.monotonic() + self.flush_interval
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    # written as soon as it is taken, so only index rows wait for the commit
+                    sha256, data, claim_id, filename, ts = item
+                    ext = self._persist(sha256, data)
+                    if ext is not None:
+                        new_images.append((sha256, ext, len(data), ts))
+                    CACHE_LOOKUPS.labels(cache="image_store", result="miss" if ext else "hit").inc()
+                    uploads.append((sha256, claim_id, filename, ts))
+                with conn:
+                    conn.executemany("INSERT OR IGNORE INTO images (sha256, ext, size, created_at) "
+                                     "VALUES (?, ?, ?, ?)", new_images)
+                    conn.executemany("INSERT INTO uploads (sha256, claim_id, filename, timestamp) "
+                                     "VALUES (?, ?, ?, ?)", uploads)
+            except Exception as e:
+                # disk full, schema, bad item: drop this batch, keep the writer (flush must return)
+                from utils.request_log import log_error
+
+                print(f"⚠  image store write failed after {taken} uploads: {e!r}")
+                log_error(f"image store writer dropped a batch of {taken} uploads", exc_info=True)
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+        conn.close()
+
+    # ── reads ──
+    def uploads_for_claim(self, claim_id):
+        conn = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True)
+        try:
+            return conn.execute(
+                "SELECT u.sha256, i.ext, i.size, u.filename, u.timestamp FROM uploads u "
+                "LEFT JOIN images i ON i.sha256 = u.sha256 WHERE u.claim_id = ? ORDER BY u.id",
+                (claim_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_image_store():
+    """Process-wide store shared by every Streamlit session and API request."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ImageStore()
+            atexit.register(_store.close)
+        return _store
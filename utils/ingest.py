@@ -0,0 +1,68 @@
+import io
+import os
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+
+# serving input size; decodes aim for the smallest DCT scale that still covers it
+SERVING_IMGSZ = int(os.environ.get("AUTODAMAGE_IMGSZ", 640))
+
+# EXIF orientations that swap width and height
+_TRANSPOSED = {5, 6, 7, 8}
+
+
+@dataclass
+class Ingested:
+    image: object      # RGB PIL image handed to the model (decoded once, never re-encoded)
+    orig_size: tuple   # (w, h) of the upload, after EXIF orientation
+    size: tuple        # (w, h) of ``image``
+    scale: tuple       # (sx, sy) model-space x/y times these = original pixels
+
+
+def read_header(data):
+    """(format, width, height) from the image header; pixel data is not decoded."""
+    with Image.open(io.BytesIO(data)) as im:
+        w, h = im.size
+        orientation = im.getexif().get(0x0112, 1)
+        return im.format, *((h, w) if orientation in _TRANSPOSED else (w, h))
+
+
+def decode_scaled(data, imgsz=SERVING_IMGSZ):
+    """RGB image decoded at reduced resolution plus the original (w, h).
+
+    For JPEGs, ``draft`` makes libjpeg decode at 1/2, 1/4 or 1/8 scale (in the
+    DCT), picking the smallest scale that is still at least ``imgsz`` on both
+    sides, so the model's letterbox never upsamples. Other formats, or any
+    image when ``imgsz`` is None, are decoded at full size.
+    """
+    im = Image.open(io.BytesIO(data))
+    orientation = im.getexif().get(0x0112, 1)
+    w, h = im.size
+    orig_size = (h, w) if orientation in _TRANSPOSED else (w, h)
+    if im.format == "JPEG" and imgsz:
+        im.draft("RGB", (imgsz, imgsz))
+    im = ImageOps.exif_transpose(im.convert("RGB"))
+    return im, orig_size
+
+
+def prepare(data, imgsz=SERVING_IMGSZ):
+    """Decode ``data`` once for the model and return its ``Ingested`` record.
+
+    JPEGs large enough to gain from it are DCT-scaled toward ``imgsz``; anything
+    else, or any upload when ``imgsz`` is None (full-resolution consumers such
+    as tiling), is decoded at full size. Callers pass ``ingested.image`` straight
+    to ``predict`` and map boxes back with ``ingested.scale``.
+    """
+    fmt, w, h = read_header(data)
+    if imgsz is None or fmt != "JPEG" or min(w, h) < 2 * imgsz:
+        imgsz = None
+    im, orig_size = decode_scaled(data, imgsz)
+    size = im.size
+    return Ingested(im, orig_size, size, (orig_size[0] / size[0], orig_size[1] / size[1]))
+
+
+def to_bgr(image):
+    """BGR array of an RGB PIL image, the layout cv2 and ``predict`` expect for arrays."""
+    import numpy as np
+
+    return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
@@ -0,0 +1,171 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+JOBS_DB = PROJECT_ROOT / "database" / "jobs.db"
+
+VISIBILITY_TIMEOUT = 120.0  # seconds a claimed item stays invisible to other workers
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 5.0         # seconds before a failed item is retried, doubled per attempt
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id         TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    conf       REAL NOT NULL,
+    client     TEXT,
+    n_items    INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id       TEXT    NOT NULL,
+    idx          INTEGER NOT NULL,
+    image_hash   TEXT    NOT NULL,
+    filename     TEXT,
+    status       TEXT    NOT NULL DEFAULT 'queued',   -- queued | running | done | failed
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    available_at REAL    NOT NULL,                    -- not claimable before this time
+    worker       TEXT,
+    result       TEXT,
+    error        TEXT,
+    updated_at   REAL    NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_items_claimable ON job_items (status, available_at);
+"""
+
+
+class JobQueue:
+    """Durable work queue in SQLite (WAL) shared by the API and worker processes.
+
+    A job is one submission of N images; workers claim individual items in
+    batches. A claimed item is leased for ``visibility_timeout`` seconds: if
+    the worker dies, the item becomes claimable again once the lease expires.
+    Failed items are retried with exponential backoff up to ``max_attempts``.
+    """
+
+    def __init__(self, db_path=JOBS_DB, visibility_timeout=VISIBILITY_TIMEOUT,
+                 max_attempts=MAX_ATTEMPTS):
+        self.db_path = str(db_path)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _tx(self):
+        """One write transaction; IMMEDIATE takes the write lock up front so claims never race."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    # ── producer side ──
+    def submit(self, images, conf=0.25, client=None, job_id=None):
+        """Queue one job for ``images`` ([(image_hash, filename)]) and return its id."""
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._tx() as conn:
+            conn.execute("INSERT INTO jobs (id, created_at, conf, client, n_items) "
+                         "VALUES (?, ?, ?, ?, ?)", (job_id, now, conf, client, len(images)))
+            conn.executemany(
+                "INSERT INTO job_items (job_id, idx, image_hash, filename, available_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, i, h, name, now, now) for i, (h, name) in enumerate(images)])
+        return job_id
+
+    def get(self, job_id):
+        """Job status with per-item results, or None for an unknown id."""
+        with self._lock:
+            job = self.conn.execute("SELECT created_at, conf, n_items FROM jobs WHERE id = ?",
+                                    (job_id,)).fetchone()
+            if job is None:
+                return None
+            items = self.conn.execute(
+                "SELECT idx, image_hash, filename, status, attempts, result, error "
+                "FROM job_items WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+        counts = {}
+        for item in items:
+            counts[item[3]] = counts.get(item[3], 0) + 1
+        finished = counts.get("done", 0) + counts.get("failed", 0)
+        if finished == job[2]:
+            status = "failed" if counts.get("done", 0) == 0 and job[2] else "done"
+        else:
+            status = "running" if counts.get("running", 0) or finished else "queued"
+        return {
+            "id": job_id,
+            "status": status,
+            "created_at": time.strftime("%F %T", time.localtime(job[0])),
+            "conf": job[1],
+            "counts": counts,
+            "items": [{"index": i, "image_hash": h, "filename": f, "status": s, "attempts": a,
+                       "result": json.loads(r) if r else None, "error": e}
+                      for i, h, f, s, a, r, e in items],
+        }
+
+    # ── worker side ──
+    def claim(self, worker, limit=8):
+        """Lease up to ``limit`` claimable items: [(job_id, idx, image_hash, filename, conf)]."""
+        now = time.time()
+        with self._tx() as conn:
+            # a lease that expired on the last attempt ends the item
+            conn.execute(
+                "UPDATE job_items SET status = 'failed', error = 'lease expired', updated_at = ? "
+                "WHERE status = 'running' AND available_at <= ? AND attempts >= ?",
+                (now, now, self.max_attempts))
+            # other running items whose lease ran out are claimable again (their worker died)
+            rows = conn.execute(
+                "SELECT i.job_id, i.idx, i.image_hash, i.filename, j.conf FROM job_items i "
+                "JOIN jobs j ON j.id = i.job_id "
+                "WHERE i.status IN ('queued', 'running') AND i.available_at <= ? "
+                "ORDER BY i.available_at LIMIT ?", (now, limit)).fetchall()
+            conn.executemany(
+                "UPDATE job_items SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "available_at = ?, updated_at = ? WHERE job_id = ? AND idx = ?",
+                [(worker, now + self.visibility_timeout, now, r[0], r[1]) for r in rows])
+        return rows
+
+    def complete(self, worker, results):
+        """Store ``results`` ({(job_id, idx): result}); ignored for items whose lease was lost."""
+        now = time.time()
+        with self._tx() as conn:
+            conn.executemany(
+                "UPDATE job_items SET status = 'done', result = ?, error = NULL, updated_at = ? "
+                "WHERE job_id = ? AND idx = ? AND status = 'running' AND worker = ?",
+                [(json.dumps(r), now, job_id, idx, worker) for (job_id, idx), r in results.items()])
+
+    def fail(self, worker, job_id, idx, error):
+        """Schedule a retry with backoff, or mark the item failed after the last attempt."""
+        now = time.time()
+        with self._tx() as conn:
+            row = conn.execute("SELECT attempts FROM job_items WHERE job_id = ? AND idx = ? "
+                               "AND status = 'running' AND worker = ?",
+                               (job_id, idx, worker)).fetchone()
+            if row is not None:
+                final = row[0] >= self.max_attempts
+                conn.execute(
+                    "UPDATE job_items SET status = ?, error = ?, available_at = ?, updated_at = ? "
+                    "WHERE job_id = ? AND idx = ?",
+                    ("failed" if final else "queued", str(error)[:500],
+                     now + RETRY_BACKOFF * 2 ** (row[0] - 1), now, job_id, idx))
+
+    def depth(self):
+        """Items per status, for monitoring."""
+        with self._lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM job_items GROUP BY status"))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,72 @@
+import os
+import re
+
+BLOCK_SIZE = 64 * 1024
+MAX_SCAN_BYTES = 64 * 2**20
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+
+def make_filter(levels=None, pattern=None):
+    """Predicate for log lines: any of ``levels`` as a word, and ``pattern`` (regex) if given."""
+    level_re = re.compile(r"\b(" + "|".join(map(re.escape, levels)) + r")\b") if levels else None
+    pattern_re = re.compile(pattern) if pattern else None
+
+    def keep(line):
+        if level_re is not None and not level_re.search(line):
+            return False
+        return pattern_re is None or bool(pattern_re.search(line))
+    return keep
+
+
+def tail(path, n=100, keep=None, block_size=BLOCK_SIZE, max_scan_bytes=MAX_SCAN_BYTES):
+    """Last ``n`` matching lines of ``path`` (oldest first) and the file size they were read at.
+
+    Reads backwards from the end in fixed-size blocks, so the cost depends on
+    ``n`` and the filter, not on the size of the file. At most
+    ``max_scan_bytes`` are scanned when the filter rarely matches.
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos, scanned = end, 0
+        carry = b""
+        found = []
+        while pos > 0 and len(found) < n and scanned < max_scan_bytes:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step) + carry
+            scanned += step
+            lines = block.split(b"\n")
+            # the first piece may be the tail of a line that starts in the previous block
+            carry = lines.pop(0) if pos > 0 else b""
+            for raw in reversed(lines):
+                line = raw.decode("utf-8", errors="replace").rstrip("\r")
+                if line and (keep is None or keep(line)):
+                    found.append(line)
+                    if len(found) >= n:
+                        break
+    found.reverse()
+    return found, end
+
+
+def follow(path, offset, keep=None, max_bytes=4 * 2**20):
+    """Lines appended after ``offset``; returns (lines, new_offset).
+
+    Only whole lines are consumed. A file smaller than ``offset`` was rotated
+    or truncated, so reading restarts from its beginning.
+    """
+    size = os.path.getsize(path)
+    if size < offset:
+        offset = 0
+    if size == offset:
+        return [], offset
+    with open(path, "rb") as f:
+        # after a long pause, skip ahead rather than replaying a huge backlog
+        f.seek(max(offset, size - max_bytes))
+        chunk = f.read(size - f.tell())
+    cut = chunk.rfind(b"\n")
+    if cut < 0:
+        return [], offset
+    new_offset = size - len(chunk) + cut + 1
+    lines = [l.decode("utf-8", errors="replace").rstrip("\r") for l in chunk[:cut].split(b"\n")]
+    return [l for l in lines if l and (keep is None or keep(l))], new_offset
@@ -0,0 +1,281 @@
+import math
+import os
+import threading
+import time
+
+# default latency buckets in seconds; the +Inf bucket is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class _Sharded:
+    """Values split into one shard per thread, summed only when scraped.
+
+    A thread only ever writes its own shard, so updates take no lock; the
+    registry lock is held once per thread, when its shard is created.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = [0.0] * self._size
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def totals(self):
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(col) for col in zip(*shards)] if shards else [0.0] * self._size
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._child()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._child())
+        return child
+
+    def _label_str(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _CounterChild(_Sharded):
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1.0):
+        self.shard()[0] += amount
+
+    def value(self):
+        return self.totals()[0]
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _child = _CounterChild
+
+    def inc(self, amount=1.0):
+        self._children[()].inc(amount)
+
+    def _render_child(self, key, child):
+        yield f"{self.name}{self._label_str(key)} {_fmt(child.value())}"
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount=1.0):
+        self.shard()[0] -= amount
+
+
+class Gauge(Counter):
+    """Up/down value; per-thread shards still sum to the right total."""
+    kind = "gauge"
+    _child = _GaugeChild
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        super().__init__(name, help, labelnames)
+        self.fn = fn  # callback evaluated at scrape time instead of stored shards
+
+    def dec(self, amount=1.0):
+        self._children[()].dec(amount)
+
+    def track(self):
+        """Context manager counting the callers currently inside the block."""
+        return _Tracked(self._children[()])
+
+    def _render_child(self, key, child):
+        value = self.fn() if self.fn is not None else child.value()
+        yield f"{self.name}{self._label_str(key)} {_fmt(value)}"
+
+
+class _Tracked:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.child.inc()
+
+    def __exit__(self, *exc):
+        self.child.dec()
+        return False
+
+
+class _HistogramChild(_Sharded):
+    def __init__(self, buckets):
+        # per shard: one count per bucket, then +Inf, then the sum
+        super().__init__(len(buckets) + 2)
+        self.buckets = buckets
+
+    def observe(self, seconds):
+        shard = self.shard()
+        i = 0
+        for i, upper in enumerate(self.buckets):
+            if seconds <= upper:
+                break
+        else:
+            i = len(self.buckets)
+        shard[i] += 1
+        shard[-1] += seconds
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, seconds):
+        self._children[()].observe(seconds)
+
+    def time(self):
+        return _Timer(self._children[()])
+
+    def _render_child(self, key, child):
+        totals = child.totals()
+        cumulative = 0
+        for upper, count in zip(self.buckets + (math.inf,), totals[:-1]):
+            cumulative += count
+            le = "+Inf" if upper == math.inf else _fmt(upper)
+            yield f"{self.name}_bucket{self._label_str(key, [('le', le)])} {_fmt(cumulative)}"
+        yield f"{self.name}_count{self._label_str(key)} {_fmt(cumulative)}"
+        yield f"{self.name}_sum{self._label_str(key)} {_fmt(totals[-1])}"
+
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self._start)
+        return False
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _fmt(value):
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def process_rss_bytes():
+    """Resident set size of this process, from /proc where available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        import resource  # ru_maxrss (peak, KiB on Linux) as a fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# ── process-wide registry ─────────────────────────────────────────────
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUESTS = register(Counter(
+    "autodamage_http_requests_total", "HTTP requests by route, method and status code.",
+    ("route", "method", "status")))
+HTTP_IN_FLIGHT = register(Gauge(
+    "autodamage_http_requests_in_flight", "HTTP requests currently being served."))
+HTTP_LATENCY = register(Histogram(
+    "autodamage_http_request_duration_seconds", "End-to-end HTTP request latency.", ("route",)))
+STAGE_LATENCY = register(Histogram(
+    "autodamage_stage_duration_seconds",
+    "Time per pipeline stage (decode, yolo, cost, infer, overlay, llm).", ("stage",)))
+CACHE_LOOKUPS = register(Counter(
+    "autodamage_cache_lookups_total", "Cache lookups by cache and result (hit/miss).",
+    ("cache", "result")))
+PROCESS_RSS = register(Gauge(
+    "autodamage_process_resident_memory_bytes", "Resident memory of the serving process.",
+    fn=process_rss_bytes))
+ADMISSION_QUEUE_DEPTH = register(Gauge(
+    "autodamage_admission_queue_depth", "Requests waiting for a model slot, by lane.", ("lane",)))
+ADMISSION_WAIT = register(Histogram(
+    "autodamage_admission_wait_seconds", "Time queued before a model slot, by lane.", ("lane",)))
+ADMISSION_REJECTED = register(Counter(
+    "autodamage_admission_rejected_total",
+    "Requests refused by admission control, by lane and reason (rate_limited, queue_full, unknown_key).",
+    ("lane", "reason")))
+LANE_LATENCY = register(Histogram(
+    "autodamage_lane_request_duration_seconds", "Admission-to-response latency, by lane.", ("lane",)))
+
+
+# ── YOLO forward time ─────────────────────────────────────────────────
+_yolo = threading.local()
+
+
+def _on_predict_batch_end(predictor):
+    # Results.speed holds per-image preprocess/inference/postprocess ms for the batch
+    results = predictor.results or []
+    ms = sum(v for v in results[0].speed.values() if v) * len(results) if results else 0.0
+    _yolo.ms = getattr(_yolo, "ms", 0.0) + ms
+
+
+def instrument_model(model):
+    """Record YOLO forward time per calling thread; safe to call more than once."""
+    if not getattr(model, "_autodamage_metrics", False):
+        model.add_callback("on_predict_batch_end", _on_predict_batch_end)
+        model._autodamage_metrics = True
+    return model
+
+
+def take_yolo_seconds():
+    """YOLO time accumulated on this thread since the last call, then reset."""
+    ms = getattr(_yolo, "ms", 0.0)
+    _yolo.ms = 0.0
+    return ms / 1000
@@ -0,0 +1,439 @@
+import atexit
+import csv
+import gc
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+REGISTRY_DB = PROJECT_ROOT / "database" / "models.db"
+RUNS_DIR = PROJECT_ROOT / "runs" / "detect"
+# the API only registers weights below these (the CLI takes any path)
+WEIGHTS_ROOTS = (PROJECT_ROOT / "runs", PROJECT_ROOT / "models")
+
+DEFAULT_NAME = os.environ.get("AUTODAMAGE_MODEL_NAME", "autodamage")
+ROUTES_POLL = float(os.environ.get("AUTODAMAGE_ROUTES_POLL", 5.0))  # seconds between route checks
+WARMUP_IMGSZ = int(os.environ.get("AUTODAMAGE_IMGSZ", 640))
+MAX_PINNED = int(os.environ.get("AUTODAMAGE_MAX_PINNED", 2))  # hand-picked versions kept loaded
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    name          TEXT    NOT NULL,
+    version       INTEGER NOT NULL,
+    path          TEXT    NOT NULL,
+    sha256        TEXT    NOT NULL,
+    metrics       TEXT,
+    registered_at REAL    NOT NULL,
+    PRIMARY KEY (name, version)
+);
+CREATE TABLE IF NOT EXISTS routes (
+    name    TEXT    NOT NULL,
+    version INTEGER NOT NULL,
+    weight  REAL    NOT NULL,
+    PRIMARY KEY (name, version)
+);
+"""
+
+
+def resolve_weights(path, roots=WEIGHTS_ROOTS):
+    """``path`` (relative to the project root) as an existing ``.pt`` file under one of ``roots``.
+
+    Symlinks and ``..`` are resolved first; raises ValueError otherwise.
+    """
+    resolved = (PROJECT_ROOT / path).resolve()
+    if resolved.suffix != ".pt" or not resolved.is_file():
+        raise ValueError(f"not a weights file: {path}")
+    if not any(resolved.is_relative_to(Path(root).resolve()) for root in roots):
+        raise ValueError(f"weights must be under {', '.join(Path(r).name + '/' for r in roots)}: {path}")
+    return resolved
+
+
+def run_metrics(weights):
+    """Best val metrics of the training run ``weights`` came from (``runs/.../results.csv``)."""
+    results = Path(weights).parent.parent / "results.csv"
+    if not results.exists():
+        return None
+    with open(results) as f:
+        rows = [{k.strip(): v for k, v in r.items()} for r in csv.DictReader(f)]
+    if not rows:
+        return None
+    best = max(rows, key=lambda r: float(r.get("metrics/mAP50-95(B)") or 0))
+    keys = {"mAP50": "metrics/mAP50(B)", "mAP50-95": "metrics/mAP50-95(B)",
+            "precision": "metrics/precision(B)", "recall": "metrics/recall(B)"}
+    return {k: round(float(best[v]), 5) for k, v in keys.items() if best.get(v)}
+
+
+class ModelRegistry:
+    """Registered weights (name, version, path, sha256, metrics) and their traffic split.
+
+    Lives in SQLite so Streamlit, uvicorn and the job workers all see the same
+    routes; a version's weight in ``routes`` is its share of requests.
+    """
+
+    def __init__(self, db_path=REGISTRY_DB):
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def register(self, path, name=DEFAULT_NAME, metrics=None):
+        """Add ``path`` as the next version of ``name``; the same file twice is one version."""
+        from utils.helper import file_sha256
+
+        path = Path(path).resolve()
+        sha = file_sha256(path)
+        if metrics is None:
+            metrics = run_metrics(path)
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT version FROM models WHERE name = ? AND sha256 = ?",
+                                    (name, sha)).fetchone()
+            if row is not None:
+                return row[0]
+            version = self.conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM models "
+                                        "WHERE name = ?", (name,)).fetchone()[0]
+            self.conn.execute("INSERT INTO models VALUES (?, ?, ?, ?, ?, ?)",
+                              (name, version, str(path), sha, json.dumps(metrics) if metrics else None,
+                               time.time()))
+        return version
+
+    def discover(self, runs_dir=RUNS_DIR, name=DEFAULT_NAME):
+        """Register every ``<run>/weights/best.pt`` under ``runs_dir``; returns the versions."""
+        return [self.register(p, name) for p in sorted(glob.glob(os.path.join(runs_dir, "*", "weights",
+                                                                              "best.pt")))]
+
+    def get(self, version, name=DEFAULT_NAME):
+        rows = self.list(name, version)
+        return rows[0] if rows else None
+
+    def list(self, name=DEFAULT_NAME, version=None):
+        query = ("SELECT m.name, m.version, m.path, m.sha256, m.metrics, m.registered_at, r.weight "
+                 "FROM models m LEFT JOIN routes r ON r.name = m.name AND r.version = m.version "
+                 "WHERE m.name = ?")
+        args = [name]
+        if version is not None:
+            query += " AND m.version = ?"
+            args.append(int(version))
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY m.version", args).fetchall()
+        return [{"name": n, "version": v, "path": p, "sha256": s,
+                 "metrics": json.loads(m) if m else None,
+                 "registered_at": time.strftime("%F %T", time.localtime(t)), "weight": w or 0.0}
+                for n, v, p, s, m, t, w in rows]
+
+    def routes(self, name=DEFAULT_NAME):
+        """{version: weight} of the versions currently taking traffic."""
+        with self._lock:
+            return dict(self.conn.execute("SELECT version, weight FROM routes "
+                                          "WHERE name = ? AND weight > 0", (name,)))
+
+    def set_routes(self, weights, name=DEFAULT_NAME):
+        """Replace the traffic split, e.g. ``{3: 90, 4: 10}``; ``{}`` falls back to the default model."""
+        weights = {int(v): float(w) for v, w in weights.items() if float(w) > 0}
+        with self._lock:
+            known = {v for (v,) in self.conn.execute("SELECT version FROM models WHERE name = ?",
+                                                     (name,))}
+            missing = set(weights) - known
+            if missing:
+                raise KeyError(f"unknown {name} version(s): {sorted(missing)}")
+            with self.conn:
+                self.conn.execute("DELETE FROM routes WHERE name = ?", (name,))
+                self.conn.executemany("INSERT INTO routes VALUES (?, ?, ?)",
+                                      [(name, v, w) for v, w in weights.items()])
+        return weights
+
+    def close(self):
+        self.conn.close()
+
+
+def version_of(label, name=DEFAULT_NAME):
+    """Registry version in a serving label (``<name>-v<version>-<sha>``), or None."""
+    match = re.fullmatch(rf"{re.escape(name)}-v(\d+)-[0-9a-f]{{12}}", label or "")
+    return int(match.group(1)) if match else None
+
+
+def load_model(path):
+    """YOLO from ``path``, instrumented for metrics and warmed with one dummy inference."""
+    import numpy as np
+    from ultralytics import YOLO
+
+    from utils.metrics import instrument_model
+
+    model = instrument_model(YOLO(str(path)))
+    model.predict(np.zeros((WARMUP_IMGSZ, WARMUP_IMGSZ, 3), dtype=np.uint8), imgsz=WARMUP_IMGSZ,
+                  verbose=False)  # first call builds the graph and allocates buffers
+    return model
+
+
+class ModelWarming(LookupError):
+    """A pinned version is not loaded yet; the router is warming it in the background."""
+
+    def __init__(self, version):
+        super().__init__(f"model version {version} is warming up")
+        self.version = version
+
+
+class _Slot:
+    def __init__(self, entry, model):
+        self.entry = entry
+        self.model = model
+        self.refs = 0
+        self.retired = False
+
+    @property
+    def label(self):
+        return f"{self.entry['name']}-v{self.entry['version']}-{self.entry['sha256'][:12]}"
+
+
+class ModelRouter:
+    """Serves the versions routed in the registry, swapping without dropping requests.
+
+    Versions are loaded and warmed on a background thread; the routing table
+    is replaced in one assignment once all of them are ready, so a request
+    (or a worker batch) sees either the old table or the new one. Versions
+    picked by hand (Streamlit "Select Model", overlays of a given model) are
+    kept in up to ``max_pinned`` extra slots, least recently used evicted
+    first, and are also loaded on that thread. Requests hold their model for
+    their whole run, and a version that lost its route or pin is freed when
+    the last of them finishes.
+    """
+
+    def __init__(self, registry=None, name=DEFAULT_NAME, loader=load_model, poll=ROUTES_POLL,
+                 max_pinned=MAX_PINNED):
+        self.registry = registry or ModelRegistry()
+        self.name = name
+        self.loader = loader
+        self.poll = poll
+        self.max_pinned = max_pinned
+        self._table = ()              # ((cumulative weight, _Slot), ...), replaced atomically
+        self._slots = {}              # version -> _Slot, routed
+        self._pinned = OrderedDict()  # version -> _Slot picked by hand, least recently used first
+        self._warming = set()         # pinned versions waiting for the background thread
+        self._routes = None
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._watcher = None
+
+    # ── routing ──
+    def active(self):
+        """True once at least one routed version is loaded and taking traffic."""
+        return bool(self._table)
+
+    def _pick(self, key):
+        table = self._table
+        if not table:
+            return None
+        total = table[-1][0]
+        if key is None:
+            point = random.random() * total
+        else:  # sticky: the same key always lands on the same version
+            digest = hashlib.sha256(str(key).encode()).digest()
+            point = int.from_bytes(digest[:8], "big") / 2**64 * total
+        for cumulative, slot in table:
+            if point < cumulative:
+                return slot
+        return table[-1][1]
+
+    @contextmanager
+    def acquire(self, key=None, version=None):
+        """Yield ``(label, model)`` for one request or batch; (None, None) without routes.
+
+        ``version`` pins a registered version. It is never loaded here: until
+        the router's thread has it ready this raises ModelWarming (KeyError for
+        an unknown version), and the caller decides what to serve instead.
+        Otherwise the version is drawn by weight, deterministically per ``key``.
+        """
+        if version is not None:
+            slot = self._hold_pinned(int(version))
+        else:
+            with self._lock:
+                slot = self._pick(key)
+                if slot is not None:
+                    slot.refs += 1
+        if slot is None:
+            yield None, None
+            return
+        try:
+            yield slot.label, slot.model
+        finally:
+            with self._lock:
+                slot.refs -= 1
+                drained = slot.retired and slot.refs == 0
+            if drained:
+                self._free(slot)
+
+    def _hold_pinned(self, version):
+        with self._lock:
+            slot = self._pinned.get(version) or self._slots.get(version)
+            if slot is not None:
+                slot.refs += 1
+                self._pinned[version] = slot
+                self._pinned.move_to_end(version)
+                drained = self._evict()
+        if slot is not None:
+            for old in drained:
+                self._free(old)
+            return slot
+        if self.registry.get(version, self.name) is None:
+            raise KeyError(f"unknown {self.name} version: {version}")
+        with self._lock:
+            self._warming.add(version)
+        self._wake.set()
+        raise ModelWarming(version)
+
+    def _evict(self):
+        """Drop least recently used pins beyond ``max_pinned`` (lock held); returns drained slots."""
+        evicted = []
+        while len(self._pinned) > self.max_pinned:
+            version, slot = self._pinned.popitem(last=False)
+            if self._slots.get(version) is not slot:  # still routed: stays loaded
+                evicted.append(slot)
+        return self._retire(evicted)
+
+    @staticmethod
+    def _retire(slots):
+        """Mark ``slots`` retired (lock held); returns those no request holds, to be freed."""
+        drained = []
+        for slot in slots:
+            slot.retired = True
+            if slot.refs == 0:
+                drained.append(slot)
+        return drained
+
+    def _load(self, entry):
+        started = time.perf_counter()
+        slot = _Slot(entry, self.loader(entry["path"]))
+        print(f"🔥 {slot.label} loaded and warmed in {time.perf_counter() - started:.1f}s")
+        return slot
+
+    # ── hot swap ──
+    def refresh(self):
+        """Load newly routed versions, then swap the routing table; returns True if it changed."""
+        routes = self.registry.routes(self.name)
+        if routes == self._routes:
+            return False
+        with self._loading:
+            slots = {}
+            for version in routes:
+                with self._lock:
+                    slot = self._slots.get(version) or self._pinned.get(version)
+                slots[version] = slot or self._load(self.registry.get(version, self.name))
+            table, cumulative = [], 0.0
+            for version, weight in sorted(routes.items()):
+                cumulative += weight
+                table.append((cumulative, slots[version]))
+            with self._lock:
+                old, self._slots = self._slots, slots
+                self._table = tuple(table)
+                self._routes = routes
+                drained = self._retire([s for v, s in old.items()
+                                        if v not in slots and self._pinned.get(v) is not s])
+        for slot in drained:
+            self._free(slot)
+        if routes or old:
+            print(f"🔀 {self.name} routes: "
+                  + (", ".join(f"v{v}={w:g}" for v, w in sorted(routes.items())) or "default model"))
+        return True
+
+    def warm(self):
+        """Load the pinned versions requested since the last call; runs on the router's thread."""
+        with self._lock:
+            wanted = sorted(self._warming)
+        for version in wanted:
+            try:
+                entry = self.registry.get(version, self.name)
+                with self._loading:
+                    with self._lock:
+                        slot = self._slots.get(version) or self._pinned.get(version)
+                    if slot is None and entry is not None:
+                        slot = self._load(entry)
+            except Exception as e:  # requested again by the next acquire
+                print(f"⚠  {self.name} v{version} not loaded: {e}")
+                slot = None
+            with self._lock:
+                self._warming.discard(version)
+                if slot is None:
+                    continue
+                self._pinned[version] = slot
+                self._pinned.move_to_end(version)
+                drained = self._evict()
+            for old in drained:
+                self._free(old)
+
+    def wake(self):
+        """Check the routes and pending pins now instead of at the next poll."""
+        self._wake.set()
+
+    def _free(self, slot):
+        slot.model = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        print(f"🧹 {slot.label} drained and freed")
+
+    def start(self):
+        """Apply the current routes now, then follow registry changes on a daemon thread."""
+        if self._watcher is not None:
+            return self
+        try:
+            self.refresh()
+        except Exception as e:  # keep serving the default model
+            print(f"⚠  model routes not applied: {e}")
+
+        def watch():
+            while not self._stop.is_set():
+                self._wake.wait(self.poll)
+                self._wake.clear()
+                if self._stop.is_set():
+                    break
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"⚠  model routes not applied: {e}")
+                self.warm()
+
+        self._watcher = threading.Thread(target=watch, name="model-router", daemon=True)
+        self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def status(self):
+        with self._lock:
+            loaded = {**self._pinned, **self._slots}
+            return {"routes": {f"v{v}": w for v, w in sorted((self._routes or {}).items())},
+                    "loaded": [{"version": v, "label": s.label, "in_flight": s.refs,
+                                "pinned": v in self._pinned} for v, s in sorted(loaded.items())],
+                    "warming": sorted(self._warming)}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Process-wide router, following the registry's routes from the first call on."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter().start()
+            atexit.register(_router.stop)
+        return _router
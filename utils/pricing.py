@@ -0,0 +1,54 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PARTS_DB = PROJECT_ROOT / "database" / "parts_costs.db"
+
+# The severity/cost rule of every serving path (``utils.candidates.to_detections``),
+# in place of the one inside ``scripts.infer.infer``: these classes mean the part
+# is replaced ("severe", replace_cost); anything else is repaired ("moderate", repair_cost)
+STRUCTURAL_DAMAGE = {"Missing part", "Broken part", "Cracked"}
+
+_costs = {}
+_costs_lock = threading.Lock()
+
+
+def load_costs(db_path=PARTS_DB):
+    """{part_name: (repair_cost, replace_cost)} from parts_costs.db, read once per process."""
+    key = str(db_path)
+    with _costs_lock:
+        if key not in _costs:
+            table = {}
+            if Path(db_path).exists():
+                conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+                try:
+                    for name, repair, replace in conn.execute(
+                            "SELECT part_name, repair_cost, replace_cost FROM parts"):
+                        table[name] = (float(repair or 0.0), float(replace or 0.0))
+                finally:
+                    conn.close()
+            _costs[key] = table
+        return _costs[key]
+
+
+def severity_for(class_name):
+    """Severity of a detected class; shared by every serving path via ``to_detections``."""
+    return "severe" if class_name in STRUCTURAL_DAMAGE else "moderate"
+
+
+def part_cost(class_name, severity, db_path=PARTS_DB):
+    """Repair cost for moderate damage, replacement cost otherwise; 0 for unknown parts."""
+    costs = load_costs(db_path)
+    row = costs.get(class_name)
+    if row is None:  # labels and table rows differ in case ("hood" / "Hood")
+        row = next((v for k, v in costs.items() if k.lower() == str(class_name).lower()), None)
+    if row is None:
+        return 0.0
+    return row[0] if severity == "moderate" else row[1]
+
+
+def price(detections, db_path=PARTS_DB):
+    """Total cost of ``detections`` (dicts with ``class`` and ``severity``)."""
+    return sum(part_cost(d["class"], d.get("severity") or severity_for(d["class"]), db_path)
+               for d in detections)
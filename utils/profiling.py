@@ -0,0 +1,114 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PROFILES_DIR = PROJECT_ROOT / "logs" / "profiles"
+
+# fraction of requests profiled without being asked to (0 disables sampling)
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0) or 0)
+
+
+class RequestProfile:
+    """Wall-clock profile of one request, written to ``logs/profiles/<request_id>.*``.
+
+    Uses pyinstrument (a sampling profiler with readable call trees) when it is
+    installed, otherwise cProfile. pyinstrument only samples the thread that
+    started it; cProfile does too before Python 3.12, but from 3.12 on it hooks
+    the process-wide ``sys.monitoring``, so calls made by other threads while it
+    runs end up in the report as well (and a second profile anywhere fails to start).
+    """
+
+    def __init__(self, request_id, source, reason="forced"):
+        self.request_id = request_id
+        self.source = source
+        self.reason = reason
+        self.engine = None
+        self._profiler = None
+        self._started = None
+
+    def start(self):
+        try:
+            from pyinstrument import Profiler
+            self._profiler = Profiler(interval=0.001, async_mode="disabled")
+            self.engine = "pyinstrument"
+        except ImportError:
+            self._profiler = cProfile.Profile(time.perf_counter)
+            self.engine = "cprofile"
+        try:
+            self._profiler.start() if self.engine == "pyinstrument" else self._profiler.enable()
+        except (RuntimeError, ValueError) as e:  # another profiler already owns this thread
+            print(f"⚠  profiling skipped for {self.request_id}: {e}")
+            self._profiler = None
+        self._started = time.time()
+        return self
+
+    def stop(self):
+        """Stop profiling and write the report; returns its metadata (None if nothing ran)."""
+        if self._profiler is None:
+            return None
+        profiler, self._profiler = self._profiler, None
+        duration = time.time() - self._started
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        base = PROFILES_DIR / self.request_id
+        if self.engine == "pyinstrument":
+            profiler.stop()
+            base.with_suffix(".html").write_text(profiler.output_html(), encoding="utf-8")
+            text = profiler.output_text(unicode=True, color=False)
+        else:
+            profiler.disable()
+            profiler.dump_stats(str(base.with_suffix(".prof")))
+            buf = io.StringIO()
+            pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(60)
+            text = buf.getvalue()
+        base.with_suffix(".txt").write_text(text, encoding="utf-8")
+        meta = {
+            "request_id": self.request_id,
+            "source": self.source,
+            "reason": self.reason,
+            "engine": self.engine,
+            "started": time.strftime("%F %T", time.localtime(self._started)),
+            "duration_s": round(duration, 4),
+        }
+        base.with_suffix(".json").write_text(json.dumps(meta), encoding="utf-8")
+        return meta
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def maybe_profile(request_id, source, forced=False):
+    """A started profile if ``forced`` or sampled in, else None (one float compare when off)."""
+    if forced:
+        return RequestProfile(request_id, source).start()
+    if SAMPLE_RATE and random.random() < SAMPLE_RATE:
+        return RequestProfile(request_id, source, reason="sampled").start()
+    return None
+
+
+def list_profiles(limit=200):
+    """Metadata of the newest stored profiles, newest first."""
+    if not PROFILES_DIR.exists():
+        return []
+    metas = sorted(PROFILES_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    out = []
+    for path in metas[:limit]:
+        try:
+            out.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def profile_files(request_id):
+    """{suffix: path} of the stored report files for ``request_id``."""
+    return {p.suffix: p for p in PROFILES_DIR.glob(f"{request_id}.*") if p.suffix != ".json"}
@@ -0,0 +1,214 @@
+import atexit
+import csv
+import io
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils.analytics import AnalyticsAggregator, AnalyticsHandler
+from utils.metrics import STAGE_LATENCY
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+LOGS_DIR = PROJECT_ROOT / "logs"
+# One requests/error file per process: Streamlit, every uvicorn worker and the
+# job workers all log, and rotating one shared file from several processes
+# loses or interleaves records. Readers merge them with ``log_files``.
+REQUESTS_FILE = LOGS_DIR / "requests.{tag}.csv"
+ERROR_LOG = LOGS_DIR / "error.{tag}.log"
+
+STAGES = ("decode", "infer", "overlay", "llm")
+FIELDS = (["timestamp", "request_id", "source", "model", "status", "response_time"]
+          + [f"{s}_ms" for s in STAGES] + ["detections", "cost", "error"])
+
+MAX_BYTES = int(os.environ.get("REQUEST_LOG_MAX_BYTES", 50 * 2**20))
+ROTATE_SECONDS = int(os.environ.get("REQUEST_LOG_ROTATE_SECONDS", 24 * 3600))
+BACKUP_COUNT = int(os.environ.get("REQUEST_LOG_BACKUPS", 14))
+# files of processes that stopped writing this long ago (and their backups) are removed
+RETENTION_SECONDS = ROTATE_SECONDS * (BACKUP_COUNT + 1)
+
+
+def process_tag():
+    """This process's log file suffix: ``AUTODAMAGE_LOG_TAG`` or the pid."""
+    return os.environ.get("AUTODAMAGE_LOG_TAG") or str(os.getpid())
+
+
+def log_files(kind, logs_dir=None):
+    """Current (not rotated) "requests" or "error" files of every process, newest first.
+
+    Includes the shared ``requests.csv`` / ``error.log`` of older versions.
+    """
+    pattern = {"requests": "requests*.csv", "error": "error*.log"}[kind]
+    files = [p for p in Path(logs_dir or LOGS_DIR).glob(pattern) if p.is_file()]
+    return sorted(files, key=lambda p: p.stat().st_mtime, reverse=True)
+
+
+def prune_stale(logs_dir=None, max_age=RETENTION_SECONDS, now=None):
+    """Delete per-process logs (and their backups) untouched for ``max_age`` seconds."""
+    cutoff = (now or time.time()) - max_age
+    removed = []
+    for pattern in ("requests.*.csv*", "error.*.log*"):
+        for path in Path(logs_dir or LOGS_DIR).glob(pattern):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed.append(path)
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+class CsvFormatter(logging.Formatter):
+    def format(self, record):
+        buf = io.StringIO()
+        csv.DictWriter(buf, fieldnames=FIELDS, extrasaction="ignore",
+                       lineterminator="").writerow(record.fields)
+        return buf.getvalue()
+
+
+class RotatingCsvHandler(logging.handlers.RotatingFileHandler):
+    """Rolls over on size or age, whichever comes first, and starts each file with the header."""
+
+    def __init__(self, filename, max_bytes=MAX_BYTES, rotate_seconds=ROTATE_SECONDS,
+                 backup_count=BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.rotate_seconds = rotate_seconds
+        self._next_rollover = time.time() + rotate_seconds
+        self.setFormatter(CsvFormatter())
+
+    def shouldRollover(self, record):
+        if self.rotate_seconds and time.time() >= self._next_rollover:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._next_rollover = time.time() + self.rotate_seconds
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() == 0:
+                self.stream.write(",".join(FIELDS) + self.terminator)
+            logging.FileHandler.emit(self, record)
+        except Exception:
+            self.handleError(record)
+
+
+_listener = None
+_lock = threading.Lock()
+
+
+def _setup():
+    """Route request and error records through one queue; a listener thread does the disk I/O."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        LOGS_DIR.mkdir(parents=True, exist_ok=True)
+        prune_stale()
+        q = queue.SimpleQueue()
+
+        tag = process_tag()
+        requests_handler = RotatingCsvHandler(str(REQUESTS_FILE).format(tag=tag))
+        requests_handler.addFilter(logging.Filter("autodamage.requests"))
+        error_handler = logging.handlers.RotatingFileHandler(
+            str(ERROR_LOG).format(tag=tag), maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT,
+            encoding="utf-8")
+        error_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        error_handler.addFilter(logging.Filter("autodamage.errors"))
+
+        for name, level in (("autodamage.requests", logging.INFO), ("autodamage.errors", logging.WARNING)):
+            logger = logging.getLogger(name)
+            logger.setLevel(level)
+            logger.propagate = False
+            logger.addHandler(logging.handlers.QueueHandler(q))
+
+        # rolling counters for the dashboard, updated from the same listener thread
+        aggregator = AnalyticsAggregator()
+        analytics_handler = AnalyticsHandler(aggregator)
+        analytics_handler.addFilter(logging.Filter("autodamage.requests"))
+
+        _listener = logging.handlers.QueueListener(q, requests_handler, error_handler,
+                                                   analytics_handler, respect_handler_level=True)
+        _listener.start()
+        # registered first so it runs last: the listener drains before the final flush
+        atexit.register(aggregator.close)
+        atexit.register(_listener.stop)
+
+
+def log_request(**fields):
+    """Queue one request record; never touches the disk on the caller's thread."""
+    _setup()
+    fields.setdefault("timestamp", time.strftime("%F %T"))
+    logging.getLogger("autodamage.requests").info("", extra={"fields": fields})
+
+
+def log_error(message, exc_info=None):
+    _setup()
+    logging.getLogger("autodamage.errors").error(message, exc_info=exc_info)
+
+
+class RequestTrace:
+    """Collects per-stage timings for one request and logs them once, on ``finish``.
+
+    Also usable as a context manager: an exception marks the request as an
+    error, sends the traceback to error.log and is re-raised.
+    """
+
+    def __init__(self, source, model=None, request_id=None):
+        self.source = source
+        self.model = model
+        self.request_id = request_id or uuid.uuid4().hex
+        self.stages = {}
+        self._start = time.perf_counter()
+        self._finished = False
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        """Add ``seconds`` to a stage measured elsewhere (e.g. the YOLO part of ``infer``)."""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds * 1000
+        STAGE_LATENCY.labels(stage=name).observe(seconds)
+
+    def finish(self, status="ok", detections=0, cost=0.0, error=""):
+        if self._finished:
+            return
+        self._finished = True
+        fields = {
+            "request_id": self.request_id,
+            "source": self.source,
+            "model": self.model or "",
+            "status": status,
+            "response_time": round(time.perf_counter() - self._start, 4),
+            "detections": detections,
+            "cost": round(float(cost or 0.0), 2),
+            "error": error,
+        }
+        for s in STAGES:
+            fields[f"{s}_ms"] = round(self.stages[s], 2) if s in self.stages else ""
+        log_request(**fields)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            log_error(f"{self.source} request {self.request_id} failed: {exc!r}",
+                      exc_info=(exc_type, exc, tb))
+            self.finish(status="error", error=type(exc).__name__)
+        return False
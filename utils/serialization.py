@@ -0,0 +1,88 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+_MSGPACK_ALIASES = {MSGPACK, "application/x-msgpack", "application/vnd.msgpack"}
+
+# bodies accepted by POST /predict/raw
+RAW_IMAGE_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp", "application/octet-stream"}
+
+SEVERITIES = ["minor", "moderate", "severe"]
+
+
+def dumps_json(payload):
+    """UTF-8 JSON bytes; orjson when installed (several times faster), else the stdlib."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def to_columnar(detections, names=None):
+    """Parallel arrays instead of one dict per detection.
+
+    ``class_id`` indexes ``names`` (the model's class list when given, so ids are
+    stable across responses) and ``severity_id`` indexes ``severities``;
+    ``box`` is flat: x1, y1, x2, y2 of detection 0, then detection 1, ...
+    """
+    names = {n: i for i, n in enumerate(names or [])}
+    severities = {s: i for i, s in enumerate(SEVERITIES)}
+    class_ids, severity_ids, boxes = [], [], []
+    for d in detections:
+        class_ids.append(names.setdefault(d["class"], len(names)))
+        severity_ids.append(severities.setdefault(d.get("severity"), len(severities)))
+        boxes.extend(d.get("box") or (0.0, 0.0, 0.0, 0.0))
+    return {"names": list(names), "severities": list(severities), "class_id": class_ids,
+            "score": [d["confidence"] for d in detections], "severity_id": severity_ids,
+            "cost": [d["cost"] for d in detections], "box": boxes}
+
+
+def negotiate(accept):
+    """Response media type for an ``Accept`` header: MSGPACK or JSON (the default).
+
+    Returns None when the client accepts neither, so the caller can answer 406.
+    """
+    if not accept:
+        return JSON
+    offers = []
+    for i, part in enumerate(accept.split(",")):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            offers.append((-q, i, media.lower()))
+    for _, _, media in sorted(offers):
+        if media in _MSGPACK_ALIASES and msgpack is not None:
+            return MSGPACK
+        if media in (JSON, "application/*", "*/*"):
+            return JSON
+    return None
+
+
+def encode(payload, media_type, columnar=None, names=None):
+    """Response body bytes for ``payload`` (a /predict dict) in ``media_type``.
+
+    MessagePack responses use the columnar layout unless ``columnar`` is False;
+    JSON keeps per-detection dicts unless ``columnar`` is True.
+    """
+    if columnar is None:
+        columnar = media_type == MSGPACK
+    if columnar:
+        payload = dict(payload, detections=to_columnar(payload["detections"], names))
+    if media_type == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return dumps_json(payload)
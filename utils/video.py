@@ -0,0 +1,251 @@
+import math
+import os
+import time
+
+from utils.pricing import part_cost, severity_for
+
+VIDEO_TYPES = ["mp4", "mov", "avi", "mkv", "webm"]
+
+SAMPLE_EVERY_S = 0.2      # frames scored per second of video = 1 / SAMPLE_EVERY_S
+SCORE_SIDE = 160          # keyframe scoring runs on small grayscale thumbnails
+MOTION_THRESHOLD = 18.0   # mean abs. pixel difference that counts as a new viewpoint
+MIN_SHARPNESS = 40.0      # variance of the Laplacian below this is treated as motion blur
+MAX_KEYFRAMES = 16
+KEEP_SIDE = int(os.environ.get("AUTODAMAGE_IMGSZ", 640))  # keyframes are kept at the model input size
+MIN_MOTION_RESPONSE = 0.05  # phase-correlation peak below this: the camera motion is unknown
+MIN_APPEARANCE = 0.3        # correlation two crops of one damage must reach to be merged
+
+
+def iter_frames(path, every_s=SAMPLE_EVERY_S):
+    """Yield (frame_index, seconds, BGR frame) for one frame every ``every_s`` seconds.
+
+    Frames in between are only ``grab``bed (demuxed and decoded, never converted
+    or copied), and at most one frame is held in memory at a time.
+    """
+    import cv2
+
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise ValueError(f"cannot open video {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, round(fps * every_s))
+    index = 0
+    try:
+        while cap.grab():
+            if index % step == 0:
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                yield index, index / fps, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def _thumb(frame):
+    import cv2
+
+    h, w = frame.shape[:2]
+    scale = SCORE_SIDE / max(h, w)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def _shrink(frame, side):
+    import cv2
+
+    h, w = frame.shape[:2]
+    if not side or max(h, w) <= side:
+        return frame
+    scale = side / max(h, w)
+    return cv2.resize(frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def select_keyframes(frames, motion_threshold=MOTION_THRESHOLD, min_sharpness=MIN_SHARPNESS,
+                     max_keyframes=MAX_KEYFRAMES, keep_side=KEEP_SIDE):
+    """Pick the sharpest frame of each stretch of video between viewpoint changes.
+
+    A stretch ends once the scene has moved ``motion_threshold`` away from the
+    last keyframe; blurred frames (Laplacian variance below ``min_sharpness``)
+    are never picked. Returns [(frame_index, seconds, BGR frame)] plus the
+    number of frames scored. Picked frames are downscaled to ``keep_side``
+    (what the model sees anyway), so memory does not grow with the video's
+    resolution: one full-size frame plus at most ``2 * max_keyframes`` small ones.
+    """
+    import cv2
+
+    keyframes, scored = [], 0
+    anchor = None          # thumbnail of the last keyframe
+    best = None            # (sharpness, index, seconds, frame) of the current stretch
+    for index, seconds, frame in frames:
+        scored += 1
+        thumb = _thumb(frame)
+        sharpness = cv2.Laplacian(thumb, cv2.CV_64F).var()
+        if sharpness >= min_sharpness and (best is None or sharpness > best[0]):
+            best = (sharpness, index, seconds, frame)
+        moved = anchor is None or cv2.absdiff(thumb, anchor).mean() >= motion_threshold
+        if moved and best is not None:
+            keyframes.append((best[1], best[2], _shrink(best[3], keep_side)))
+            # the next stretch is measured from where the camera is now
+            anchor, best = thumb, None
+            if len(keyframes) > 2 * max_keyframes:
+                keyframes = keyframes[::2]  # bound memory on long videos
+    if best is not None:  # the final stretch
+        keyframes.append((best[1], best[2], _shrink(best[3], keep_side)))
+    if len(keyframes) > max_keyframes:
+        # keep an even spread over the walk-around
+        step = len(keyframes) / max_keyframes
+        keyframes = [keyframes[int(i * step)] for i in range(max_keyframes)]
+    return keyframes, scored
+
+
+def _iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def camera_shifts(frames, min_response=MIN_MOTION_RESPONSE):
+    """Image motion from each keyframe to the next, as normalised (dx, dy).
+
+    One global translation per step, by phase correlation of grayscale
+    thumbnails: a walk-around is mostly a pan, so it predicts where a damage
+    seen in one keyframe shows up in the next. The first entry, and any step
+    whose correlation peak is weaker than ``min_response``, is None (unknown).
+    """
+    import cv2
+    import numpy as np
+
+    thumbs = [np.float32(_thumb(frame)) for frame in frames]
+    shifts = [None]
+    for prev, cur in zip(thumbs, thumbs[1:]):
+        if prev.shape != cur.shape:
+            shifts.append(None)
+            continue
+        (dx, dy), response = cv2.phaseCorrelate(prev, cur)
+        h, w = cur.shape
+        shifts.append((dx / w, dy / h) if response >= min_response else None)
+    return shifts
+
+
+def appearance(frame, box, side=16):
+    """Zero-mean, unit-norm grayscale patch of ``box`` (normalised xyxy), or None if too small."""
+    import cv2
+    import numpy as np
+
+    h, w = frame.shape[:2]
+    x1, y1 = max(0, int(box[0] * w)), max(0, int(box[1] * h))
+    x2, y2 = min(w, math.ceil(box[2] * w)), min(h, math.ceil(box[3] * h))
+    if x2 - x1 < 4 or y2 - y1 < 4:
+        return None
+    gray = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+    patch = cv2.resize(gray, (side, side), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    patch -= patch.mean()
+    norm = float(np.linalg.norm(patch))
+    return patch / norm if norm > 0 else None
+
+
+def _carried(track, k, shifts):
+    """The track's last box moved with the camera up to keyframe ``k``; None if the motion is unknown."""
+    if shifts is None:
+        return track["box"]
+    dx = dy = 0.0
+    for step in shifts[track["last_k"] + 1:k + 1]:
+        if step is None:
+            return None
+        dx, dy = dx + step[0], dy + step[1]
+    x1, y1, x2, y2 = track["box"]
+    return [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+
+
+def _similarity(a, b):
+    return float(sum(x * y for x, y in zip(a, b)))
+
+
+def merge_tracks(per_frame, shifts=None, iou_threshold=0.3, max_gap=2, min_appearance=MIN_APPEARANCE):
+    """Merge repeated detections of the same damage across keyframes.
+
+    ``per_frame`` is [(keyframe_no, seconds, [(class, confidence, normalised xyxy[, patch])])]
+    and ``shifts`` the camera motion into each keyframe (``camera_shifts``).
+    A detection joins a track of the same class seen at most ``max_gap``
+    keyframes earlier whose box, moved with the camera, overlaps it by
+    ``iou_threshold`` and, when both have an ``appearance`` patch, whose
+    patch correlates with it by ``min_appearance``. Across a step of unknown
+    motion nothing is merged. Without ``shifts`` boxes are compared in place,
+    which only merges repeats of one view (a camera held still).
+    """
+    tracks = []
+    for k, seconds, detections in per_frame:
+        for cls, conf, box, *rest in sorted(detections, key=lambda d: -d[1]):
+            patch = rest[0] if rest else None
+            best, best_iou = None, iou_threshold
+            for t in tracks:
+                if t["class"] != cls or t["last_k"] == k or k - t["last_k"] > max_gap:
+                    continue
+                carried = _carried(t, k, shifts)
+                if carried is None:
+                    continue
+                iou = _iou(carried, box)
+                if iou < best_iou:
+                    continue
+                if (patch is not None and t["patch"] is not None
+                        and _similarity(patch, t["patch"]) < min_appearance):
+                    continue
+                best, best_iou = t, iou
+            if best is None:
+                best = {"class": cls, "confidence": 0.0, "frames": 0, "first_s": seconds,
+                        "best_k": k}
+                tracks.append(best)
+            best["frames"] += 1
+            best["last_k"], best["last_s"], best["box"], best["patch"] = k, seconds, box, patch
+            if conf > best["confidence"]:
+                best["confidence"], best["best_k"] = conf, k
+    return tracks
+
+
+def analyze_video(path, model, conf=0.25, batch=8, every_s=SAMPLE_EVERY_S):
+    """Keyframes, merged detections and timings for one walk-around video.
+
+    Returns ``{"keyframes": [(index, seconds, Results)], "detections": [...],
+    "cost": float, "stats": {...}}``; each detection is one physical damage,
+    however many keyframes it appears in.
+    """
+    start = time.perf_counter()
+    keyframes, scored = select_keyframes(iter_frames(path, every_s))
+    select_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(keyframes), batch):
+        frames = [frame for _, _, frame in keyframes[i:i + batch]]
+        results.extend(r.cpu() for r in model.predict(frames, conf=conf, save=False, verbose=False))
+    infer_ms = (time.perf_counter() - start) * 1000
+
+    per_frame = []
+    for k, ((_, seconds, frame), result) in enumerate(zip(keyframes, results)):
+        names = result.names
+        detections = []
+        for c, s, box in zip(result.boxes.cls, result.boxes.conf, result.boxes.xyxyn):
+            box = [float(v) for v in box]
+            detections.append((names[int(c)], float(s), box, appearance(frame, box)))
+        per_frame.append((k, seconds, detections))
+    tracks = merge_tracks(per_frame, camera_shifts([frame for _, _, frame in keyframes]))
+    detections = []
+    for t in tracks:
+        severity = severity_for(t["class"])
+        detections.append({
+            "class": t["class"], "severity": severity, "confidence": round(t["confidence"], 3),
+            "cost": part_cost(t["class"], severity), "frames": t["frames"],
+            "first_s": round(t["first_s"], 1), "last_s": round(t["last_s"], 1),
+            "best_keyframe": t["best_k"],
+        })
+    return {
+        "keyframes": [(index, seconds, r) for (index, seconds, _), r in zip(keyframes, results)],
+        "detections": detections,
+        "cost": sum(d["cost"] for d in detections),
+        "stats": {"frames_scored": scored, "keyframes": len(keyframes),
+                  "select_ms": round(select_ms, 1), "infer_ms": round(infer_ms, 1)},
+    }